@@ -1,6 +1,5 @@
 import streamlit as st
 import requests
-import json
 import os
 import random
 import sqlite3
@@ -14,6 +13,8 @@ from src.help import *
 from src.notes import *
 from src.settings import *
 from src.models_list import *
+from src.llm_client import get_llm_client
+from src.context_budget import context_budget
 # from src.chat import *
 # from src.app import * # latest chat
 
@@ -21,6 +22,8 @@ from src.models_list import *
 # Configuration
 DATABASE_FILE = "user_data.db"
 OLLAMA_API_URL = "http://localhost:11434"
+# Keeps the model, and with it the conversation's KV cache, loaded between turns.
+CHAT_KEEP_ALIVE = "30m"
 HISTORY_DIR = "chat_history"
 EMOJI_LIST = ["😀", "🎉", "🤖", "🌟", "🧠", "📚", "💬", "🚀", "📝", "🎨", "✨"]
 
@@ -50,6 +53,8 @@ def init_session_state():
         "current_chat_file": None,
         "session_emoji": random.choice(EMOJI_LIST),
         "stop_generation": False,
+        "active_generation": None,
+        "history_start": 0,  # first chat message still sent to the model
         "is_logged_in": False,
         "current_user": None,
     }
@@ -132,6 +137,7 @@ def add_sidebar():
     st.sidebar.header("🗂️ Chat Management")
     if st.sidebar.button("➕ Start New Chat"):
         st.session_state.chat_history = []
+        st.session_state.history_start = 0
         st.session_state.current_chat_file = None
         st.session_state.session_emoji = random.choice(EMOJI_LIST)
 
@@ -149,23 +155,55 @@ def add_sidebar():
     return selected_model, temperature
 
 # Chat and Image Functions
-def generate_response(model, prompt, temperature):
+def chat_messages(history):
+    """The chat history as ``/api/chat`` messages, skipping empty (failed) answers."""
+    return [{"role": msg["role"], "content": msg["message"]} for msg in history if msg["message"]]
+
+
+def generate_response(model, messages, temperature):
+    """
+    Start a cancellable reply to the conversation ``messages`` (see ``src.llm_client.Generation``).
+
+    The conversation is sent every turn, but Ollama reuses the KV cache of
+    the longest prefix it has already processed. As long as earlier messages
+    are sent back unchanged, each turn only prefills the new one. History
+    that no longer fits the context budget is dropped from the front, several
+    turns at a time (see ``src.context_budget``).
+    """
+    plan = context_budget(load_config()).pack(
+        messages[-1]["content"], history=messages[:-1], history_start=st.session_state.history_start
+    )
+    st.session_state.history_start = plan["history_start"]
+    messages = plan["history"] + [{**messages[-1], "content": plan["question"]}]
+    options = {"temperature": temperature, "num_ctx": plan["num_ctx"], "num_predict": plan["num_predict"]}
+    return get_llm_client(OLLAMA_API_URL).chat_stream(model, messages, options=options, keep_alive=CHAT_KEEP_ALIVE)
+
+
+def stream_response(placeholder, generation):
+    """
+    Render ``generation`` into ``placeholder`` and add the answer to the chat history.
+
+    The generation is the session's active one until it ends, so the Stop
+    button can cancel it from the rerun it triggers. If this run is
+    interrupted (Stop, a new message, the user leaving) the generation is
+    cancelled on the way out and the text received so far is kept as the
+    answer.
+    """
+    st.session_state.stop_generation = False
+    st.session_state.active_generation = generation
     try:
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            json={"model": model, "prompt": prompt, "temperature": temperature, "num_ctx": 8000},
-            stream=True
-        )
-        response.raise_for_status()
-        for chunk in response.iter_lines():
-            if st.session_state.stop_generation:
-                break
-            if chunk:
-                chunk_data = json.loads(chunk.decode("utf-8"))
-                if "response" in chunk_data:
-                    yield chunk_data["response"]
+        with generation:
+            for _ in generation:
+                if st.session_state.stop_generation:
+                    generation.cancel()
+                    break
+                placeholder.markdown(generation.text)
     except requests.RequestException as e:
         st.error(f"⚠️ Error during generation: {e}")
+    finally:
+        st.session_state.active_generation = None
+        st.session_state.chat_history.append({"role": "assistant", "message": generation.text})
+        save_chat_history()
 
 def download_image(prompt):
     try:
@@ -196,6 +234,7 @@ def load_chat_history(file_name):
                 {"role": "user", "message": line.replace("**User:**", "").strip()} if "**User:**" in line else
                 {"role": "assistant", "message": line.replace("**Assistant:**", "").strip()} for line in file
             ]
+            st.session_state.history_start = 0
 
 # Main Chat
 def ra_chat():
@@ -219,6 +258,8 @@ def ra_chat():
 
     if stop_button:
         st.session_state.stop_generation = True
+        if st.session_state.active_generation is not None:
+            st.session_state.active_generation.cancel()
 
     if regenerate_button and st.session_state.chat_history:
         last_user_prompt = next(
@@ -229,13 +270,7 @@ def ra_chat():
             st.session_state.chat_history.pop()  # Remove last user message
             st.session_state.chat_history.append({"role": "user", "message": last_user_prompt})
             with st.chat_message("assistant"):
-                response_placeholder = st.empty()
-                response = ""
-                for chunk in generate_response(selected_model, last_user_prompt, temperature):
-                    response += chunk
-                    response_placeholder.markdown(response)
-                st.session_state.chat_history.append({"role": "assistant", "message": response})
-            save_chat_history()
+                stream_response(st.empty(), generate_response(selected_model, chat_messages(st.session_state.chat_history), temperature))
 
     if prompt:
         if prompt.startswith("/gen "):
@@ -246,13 +281,7 @@ def ra_chat():
         else:
             st.session_state.chat_history.append({"role": "user", "message": prompt})
             with st.chat_message("assistant"):
-                response_placeholder = st.empty()
-                response = ""
-                for chunk in generate_response(selected_model, prompt, temperature):
-                    response += chunk
-                    response_placeholder.markdown(response)
-                st.session_state.chat_history.append({"role": "assistant", "message": response})
-            save_chat_history()
+                stream_response(st.empty(), generate_response(selected_model, chat_messages(st.session_state.chat_history), temperature))
 
 
 # Main app with tabs
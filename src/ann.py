@@ -0,0 +1,147 @@
+"""
+Approximate nearest-neighbour (HNSW) backends for large indices.
+
+An ANN graph is built when an index is written and saved next to its
+``embeddings.npy``. Small indices skip it and keep using the exact
+brute-force scan in ``src.retrieval``, which is already fast below a few
+tens of thousands of rows. Both backends score by inner product, which is
+cosine similarity for the normalized embeddings stored by ``src.index_store``.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional at runtime
+    faiss = None
+
+try:
+    import hnswlib
+except ImportError:  # provided by chroma-hnswlib
+    hnswlib = None
+
+DEFAULT_ANN_CONFIG = {
+    "ann_backend": "auto",  # Options: auto, faiss, hnswlib, brute
+    "ann_min_rows": 20000,
+    "ann_hnsw_m": 32,
+    "ann_ef_construction": 200,
+    "ann_ef_search": 128,
+}
+
+ANN_FILES = {"faiss": "ann.faiss", "hnswlib": "ann.hnsw"}
+
+# Rows handed to the graph builder at a time, to keep memmapped indices paged.
+_BUILD_BATCH = 8192
+
+
+def available_backends():
+    """Return the ANN backends that can be imported in this environment."""
+    return [name for name, module in (("faiss", faiss), ("hnswlib", hnswlib)) if module is not None]
+
+
+def resolve_backend(config, rows):
+    """Pick the backend to build for an index of ``rows`` rows, or None for brute force."""
+    config = {**DEFAULT_ANN_CONFIG, **(config or {})}
+    backend = config["ann_backend"]
+    if backend == "brute" or rows < config["ann_min_rows"]:
+        return None
+    available = available_backends()
+    if backend == "auto":
+        return available[0] if available else None
+    if backend not in available:
+        raise ValueError(f"ANN backend '{backend}' is not installed")
+    return backend
+
+
+def build_ann(embeddings, index_dir, config=None):
+    """
+    Build and save an ANN graph for ``embeddings`` inside ``index_dir``.
+
+    Returns:
+        dict or None: The ANN description stored in the index ``meta.json``,
+        or None when the index stays on brute force.
+    """
+    config = {**DEFAULT_ANN_CONFIG, **(config or {})}
+    rows, dim = embeddings.shape
+    backend = resolve_backend(config, rows)
+    if backend is None:
+        return None
+
+    m = int(config["ann_hnsw_m"])
+    ef_construction = int(config["ann_ef_construction"])
+    path = os.path.join(index_dir, ANN_FILES[backend])
+    if backend == "faiss":
+        index = faiss.IndexHNSWFlat(dim, m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        for start in range(0, rows, _BUILD_BATCH):
+            index.add(np.ascontiguousarray(embeddings[start:start + _BUILD_BATCH], dtype=np.float32))
+        faiss.write_index(index, path)
+    else:
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.init_index(max_elements=rows, ef_construction=ef_construction, M=m)
+        for start in range(0, rows, _BUILD_BATCH):
+            batch = np.ascontiguousarray(embeddings[start:start + _BUILD_BATCH], dtype=np.float32)
+            index.add_items(batch, np.arange(start, start + len(batch)))
+        index.save_index(path)
+
+    return {
+        "backend": backend,
+        "file": ANN_FILES[backend],
+        "m": m,
+        "ef_construction": ef_construction,
+        "ef_search": int(config["ann_ef_search"]),
+    }
+
+
+class AnnIndex:
+    """
+    A loaded ANN graph; ``search`` returns (rows, scores) best first.
+
+    Loaded graphs are shared between sessions by ``src.index_cache``, so
+    ``search`` is safe to call from several threads: faiss gets its
+    ``efSearch`` per call, and hnswlib, which only has an index-wide ``ef``,
+    sets it and queries under a lock.
+    """
+
+    def __init__(self, index_dir, ann_info, dim, ef_search=None):
+        self.backend = ann_info["backend"]
+        self.ef_search = int(ef_search or ann_info["ef_search"])
+        path = os.path.join(index_dir, ann_info["file"])
+        self.nbytes = os.path.getsize(path)
+        if self.backend == "faiss":
+            if faiss is None:
+                raise ImportError("faiss is required to open this index")
+            self._index = faiss.read_index(path)
+            self._index.hnsw.efSearch = self.ef_search
+        else:
+            if hnswlib is None:
+                raise ImportError("hnswlib is required to open this index")
+            self._index = hnswlib.Index(space="ip", dim=dim)
+            self._index.load_index(path)
+            self._index.set_ef(self.ef_search)
+            self._lock = threading.Lock()
+
+    def search(self, query, k):
+        query = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+        if self.backend == "faiss":
+            # efSearch must be at least k for HNSW to return k neighbours
+            params = faiss.SearchParametersHNSW(efSearch=max(self.ef_search, k))
+            scores, rows = self._index.search(query, k, params=params)
+            keep = rows[0] >= 0
+            return rows[0][keep].astype(np.int64), scores[0][keep]
+        k = min(k, self._index.get_current_count())
+        with self._lock:
+            self._index.set_ef(max(self.ef_search, k))
+            rows, distances = self._index.knn_query(query, k=k)
+        return rows[0].astype(np.int64), 1.0 - distances[0]
+
+
+def load_ann(index_dir, info, ef_search=None):
+    """Load the ANN graph described in ``info``, or return None if the index has none."""
+    ann_info = info.get("ann")
+    if not ann_info:
+        return None
+    return AnnIndex(index_dir, ann_info, info["dim"], ef_search)
@@ -0,0 +1,129 @@
+"""
+Okapi BM25 inverted index stored next to each index segment.
+
+The lexical side of hybrid retrieval: it catches exact identifiers, error
+messages and function names that embeddings tend to blur. Identifiers are
+indexed whole and split into their camelCase / snake_case parts, so both
+``getUserName`` and ``user`` match. Postings are stored term-major (CSR) in
+``.npy`` files and memory-mapped when the segment is opened.
+"""
+
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+VOCAB_FILE = "bm25_vocab.json"
+INDPTR_FILE = "bm25_indptr.npy"
+ROWS_FILE = "bm25_rows.npy"
+TF_FILE = "bm25_tf.npy"
+DOC_LEN_FILE = "bm25_doc_len.npy"
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+_TOKEN_RE = re.compile(r"[^\W\d]\w*|\d+")
+_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def tokenize(text):
+    """Lower-cased word tokens, plus the camelCase / snake_case parts of identifiers."""
+    tokens = []
+    for word in _TOKEN_RE.findall(text):
+        tokens.append(word.lower())
+        parts = [part.lower() for piece in word.split("_") for part in _PART_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Builder:
+    """Accumulate term frequencies row by row and write the postings on ``save``."""
+
+    def __init__(self):
+        self.vocab = {}
+        self._terms = array("i")
+        self._rows = array("i")
+        self._tfs = array("i")
+        self._doc_len = array("i")
+
+    def add(self, texts):
+        for text in texts:
+            row = len(self._doc_len)
+            counts = Counter(tokenize(text))
+            self._doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._terms.append(self.vocab.setdefault(term, len(self.vocab)))
+                self._rows.append(row)
+                self._tfs.append(tf)
+
+    def save(self, path):
+        terms = np.asarray(self._terms, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=indptr[1:])
+        np.save(os.path.join(path, INDPTR_FILE), indptr)
+        np.save(os.path.join(path, ROWS_FILE), np.asarray(self._rows, dtype=np.int32)[order])
+        np.save(os.path.join(path, TF_FILE), np.asarray(self._tfs, dtype=np.float32)[order])
+        np.save(os.path.join(path, DOC_LEN_FILE), np.asarray(self._doc_len, dtype=np.float32))
+        with open(os.path.join(path, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(list(self.vocab), f)
+        return {"terms": len(self.vocab), "postings": len(terms)}
+
+
+class BM25Index:
+    """A loaded BM25 index; ``search`` returns (rows, scores) best first."""
+
+    def __init__(self, path, k1=DEFAULT_K1, b=DEFAULT_B):
+        with open(os.path.join(path, VOCAB_FILE), "r", encoding="utf-8") as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        self.indptr = np.load(os.path.join(path, INDPTR_FILE))
+        self.rows = np.load(os.path.join(path, ROWS_FILE), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, TF_FILE), mmap_mode="r")
+        self.doc_len = np.load(os.path.join(path, DOC_LEN_FILE))
+        self.avg_doc_len = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+        self.k1 = k1
+        self.b = b
+        self.nbytes = (
+            self.indptr.nbytes + self.rows.nbytes + self.tfs.nbytes + self.doc_len.nbytes
+            + os.path.getsize(os.path.join(path, VOCAB_FILE)) * 4
+        )
+
+    def scores(self, query_text):
+        """BM25 score of every row for ``query_text`` (zero for rows without a match)."""
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        if not self.avg_doc_len:
+            return scores
+        n = len(self.doc_len)
+        for term in set(tokenize(query_text)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            rows, tf = self.rows[start:end], self.tfs[start:end]
+            df = end - start
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[rows] / self.avg_doc_len)
+            scores[rows] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+    def search(self, query_text, k, deleted=None):
+        scores = self.scores(query_text)
+        if deleted is not None:
+            scores[deleted] = 0.0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return matched.astype(np.int64), scores[matched]
+
+
+def load_bm25(path, info):
+    """Load the BM25 index of a segment, or return None if it was written without one."""
+    if not info.get("bm25"):
+        return None
+    return BM25Index(path)
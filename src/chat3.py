@@ -1,9 +1,9 @@
 import streamlit as st
 import requests
-import json
 import uuid
 import os
 import random
+from src.llm_client import get_llm_client
 
 OLLAMA_API_URL = "http://localhost:11434"
 GENERATION_MODEL = "qwen2.5:0.5b"
@@ -34,22 +34,10 @@ def generate_response(prompt):
     Yields:
         str: The generated response in chunks.
     """
-    response = requests.post(
-        f"{OLLAMA_API_URL}/api/generate",
-        json={"model": GENERATION_MODEL, "prompt": prompt},
-        stream=True
-    )
-    if response.status_code == 200:
-        for chunk in response.iter_lines():
-            if chunk:
-                try:
-                    chunk_data = json.loads(chunk.decode("utf-8"))
-                    if "response" in chunk_data:
-                        yield chunk_data["response"]
-                except json.JSONDecodeError:
-                    st.error("Error parsing response chunk.")
-    else:
-        st.error(f"Error generating response: {response.text}")
+    try:
+        yield from get_llm_client(OLLAMA_API_URL).generate_stream(GENERATION_MODEL, prompt)
+    except requests.RequestException as e:
+        st.error(f"Error generating response: {e}")
         yield ""
 
 
@@ -0,0 +1,78 @@
+"""
+Split documents into overlapping, token-bounded chunks before embedding.
+
+Token counts use tiktoken's ``cl100k_base`` encoding when it is available and
+fall back to a word/punctuation tokenizer otherwise. Every chunk keeps the
+character offsets of its span in the source document.
+"""
+
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_CHUNK_SIZE = 300
+DEFAULT_CHUNK_OVERLAP = 50
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # the BPE file cannot be downloaded (offline)
+            _encoding = False
+    return _encoding or None
+
+
+def token_spans(text):
+    """Return the (start, end) character span of every token in ``text``."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return [(m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+    tokens = encoding.encode(text, disallowed_special=())
+    decoded, starts = encoding.decode_with_offsets(tokens)
+    if decoded != text:  # invalid UTF-8 round trip, offsets would be wrong
+        return [(m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+    return list(zip(starts, starts[1:] + [len(text)]))
+
+
+def count_tokens(text):
+    """Number of tokens in ``text`` using the same tokenizer as the chunker."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(_WORD_RE.findall(text))
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def chunk_text(text, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Split ``text`` into chunks of at most ``chunk_size`` tokens.
+
+    Consecutive chunks share ``chunk_overlap`` tokens so that passages cut at a
+    boundary can still be retrieved as a whole.
+
+    Returns:
+        list: Dicts with ``text``, ``start`` and ``end`` (character offsets
+        into ``text``) and ``chunk`` (position of the chunk in the document).
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    spans = token_spans(text)
+    chunks = []
+    step = chunk_size - chunk_overlap
+    for first in range(0, max(len(spans) - chunk_overlap, 1), step):
+        window = spans[first:first + chunk_size]
+        if not window:
+            break
+        raw = text[window[0][0]:window[-1][1]]
+        chunk = raw.strip()
+        if chunk:
+            start = window[0][0] + len(raw) - len(raw.lstrip())
+            chunks.append({"text": chunk, "start": start, "end": start + len(chunk), "chunk": len(chunks)})
+    return chunks
@@ -0,0 +1,317 @@
+"""
+Syntax-aware chunking for source files.
+
+Source files are cut at function and class boundaries instead of fixed token
+windows, so a retrieved chunk is a whole definition rather than a whole file
+or half of two functions. Python is parsed with ``ast``; C-like languages
+(``.js``, ``.java``, ``.c``, ``.cpp``, ...) use a brace scanner that skips
+strings and comments; Markdown is cut at headings; Python that does not parse
+falls back to top-level indentation. Classes too large for one chunk are
+split into their members, small neighbouring units are merged up to
+``chunk_size`` tokens, and a single definition that is still too large is
+windowed with ``src.chunking.chunk_text``.
+
+Chunks carry the ``symbol`` they cover (``Class.method``; several symbols are
+comma-separated) and their 1-based ``start_line``/``end_line``.
+"""
+
+import ast
+import bisect
+import os
+import re
+
+from src.chunking import DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE, chunk_text, count_tokens
+
+PYTHON_EXTENSIONS = {".py", ".pyi"}
+BRACE_EXTENSIONS = {".js", ".jsx", ".ts", ".tsx", ".java", ".c", ".h", ".cpp", ".cc", ".hpp", ".cs", ".go", ".rs"}
+MARKDOWN_EXTENSIONS = {".md", ".markdown"}
+
+# Outside comments and template literals; comment openers are tried before
+# string literals so a quote inside a comment does not start a string.
+_BRACE_TOKEN_RE = re.compile(r"//|/\*|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`|[{}]")
+_COMMENT_END_RE = re.compile(r"\*/")
+_TEMPLATE_END_RE = re.compile(r"(?:\\.|[^`\\])*`")
+_BRACE_SYMBOL_RES = [
+    re.compile(r"\b(?:class|interface|struct|enum|namespace|trait|impl)\s+([A-Za-z_]\w*)"),
+    re.compile(r"\bfunction\s*\*?\s*([A-Za-z_$][\w$]*)"),
+    re.compile(r"\b(?:fn|func)\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)"),
+    re.compile(r"([A-Za-z_$][\w$]*)\s*[:=]\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)"),
+    re.compile(r"([A-Za-z_~][\w:~]*)\s*\([^;]*$"),
+]
+_NOT_SYMBOLS = {"if", "for", "while", "switch", "catch", "return", "else", "do", "try", "sizeof", "new"}
+_PY_TOP_LEVEL_RE = re.compile(r"(?:async\s+def|def|class)\s+([A-Za-z_]\w*)|@")
+_MD_HEADING_RE = re.compile(r"#{1,6}\s+(.*?)\s*#*\s*$")
+
+
+def language(path):
+    """Chunking strategy for ``path``: python, brace, markdown or None for plain text."""
+    extension = os.path.splitext(path.split("?", 1)[0])[1].lower()
+    if extension in PYTHON_EXTENSIONS:
+        return "python"
+    if extension in BRACE_EXTENSIONS:
+        return "brace"
+    if extension in MARKDOWN_EXTENSIONS:
+        return "markdown"
+    return None
+
+
+class _Source:
+    """Line/character bookkeeping for one file."""
+
+    def __init__(self, text):
+        self.text = text
+        self.lines = text.split("\n")
+        self.offsets = [0]
+        for line in self.lines:
+            self.offsets.append(self.offsets[-1] + len(line) + 1)
+
+    def span(self, start_line, end_line):
+        """Character span of 1-based inclusive lines."""
+        return self.offsets[start_line - 1], min(self.offsets[end_line] - 1, len(self.text))
+
+    def segment(self, start_line, end_line):
+        start, end = self.span(start_line, end_line)
+        return self.text[start:end]
+
+    def line_at(self, offset):
+        return bisect.bisect_right(self.offsets, offset)
+
+    def tokens(self, start_line, end_line):
+        return count_tokens(self.segment(start_line, end_line))
+
+
+def _cover(units, first_line, last_line):
+    """Stretch units over the gaps between them so comments stay with the next definition."""
+    units = [unit for unit in units if unit[1] >= unit[0]]
+    if not units:
+        return [(first_line, last_line, None)]
+    covered = []
+    start = first_line
+    for i, (_, end, symbol) in enumerate(units):
+        end = last_line if i == len(units) - 1 else end
+        covered.append((start, end, symbol))
+        start = end + 1
+    return covered
+
+
+# Python
+def _python_units(source, body, first_line, last_line, prefix, chunk_size):
+    units = []
+    for node in body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+        symbol = None
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            symbol = prefix + node.name
+        units.append((start, node.end_lineno, symbol, node))
+    covered = _cover([(start, end, symbol) for start, end, symbol, _ in units], first_line, last_line)
+    result = []
+    for (start, end, symbol), (_, _, _, node) in zip(covered, units):
+        if isinstance(node, ast.ClassDef) and node.body and source.tokens(start, end) > chunk_size:
+            # The class header goes with its first member.
+            result.extend(_python_units(source, node.body, start, end, symbol + ".", chunk_size))
+        else:
+            result.append((start, end, symbol))
+    return result
+
+
+def _python_indent_units(source):
+    """Top-level definitions found by indentation, for files ``ast`` cannot parse."""
+    units = []
+    decorated = None  # first line of the decorators above the next definition
+    for number, line in enumerate(source.lines, 1):
+        match = _PY_TOP_LEVEL_RE.match(line)
+        if not match:
+            continue
+        if match.group(1) is None:
+            decorated = decorated or number
+            continue
+        start, decorated = decorated or number, None
+        if units:
+            units[-1] = (units[-1][0], start - 1, units[-1][2])
+        units.append((start, number, match.group(1)))
+    if units:
+        units[-1] = (units[-1][0], len(source.lines), units[-1][2])
+    return _cover(units, 1, len(source.lines))
+
+
+# C-like languages
+def _brace_symbol(source, start_line, end_line):
+    """Name declared by a unit and whether it is a container (class, namespace...)."""
+    for line in source.lines[start_line - 1:end_line]:
+        stripped = line.strip()
+        if not stripped or stripped.startswith(("//", "/*", "*", "#", "@")):
+            continue
+        for i, regex in enumerate(_BRACE_SYMBOL_RES):
+            for match in regex.finditer(stripped):
+                if match.group(1) not in _NOT_SYMBOLS:
+                    return match.group(1), i == 0
+        if "{" in stripped:
+            break
+    return None, False
+
+
+def _brace_tokens(line, state):
+    """
+    Braces of one line outside comments and literals.
+
+    Parameters:
+        state (str): None, or "comment" / "template" when the line starts inside
+            a block comment or a template literal left open by a previous line.
+
+    Returns:
+        tuple: The "{" and "}" tokens of the line, and the state at its end.
+    """
+    braces = []
+    pos = 0
+    while pos < len(line):
+        if state is not None:
+            end_re = _COMMENT_END_RE if state == "comment" else _TEMPLATE_END_RE
+            match = end_re.search(line, pos)
+            if match is None:
+                break
+            state, pos = None, match.end()
+            continue
+        match = _BRACE_TOKEN_RE.search(line, pos)
+        if match is None or match.group(0) == "//":
+            break
+        token, pos = match.group(0), match.end()
+        if token == "/*":
+            state = "comment"
+        elif token == "`":
+            state = "template"
+        elif token in "{}":
+            braces.append(token)
+    return braces, state
+
+
+def _brace_units(source, first_line, last_line, prefix, chunk_size):
+    units = []
+    depth = 0
+    state = None  # "comment" or "template" while one spans lines
+    start = first_line
+    opened = None  # line of the first "{" of the current unit
+    for number in range(first_line, last_line + 1):
+        line = source.lines[number - 1]
+        closed = False
+        braces, state = _brace_tokens(line, state)
+        for token in braces:
+            if token == "{":
+                if depth == 0 and opened is None:
+                    opened = number
+                depth += 1
+            else:
+                depth = max(depth - 1, 0)
+                closed = depth == 0
+        statement_end = depth == 0 and state is None and line.rstrip().endswith(";")
+        if depth == 0 and (closed or statement_end):
+            symbol, container = _brace_symbol(source, start, number)
+            units.append((start, number, prefix + symbol if symbol else None, opened if container else None))
+            start, opened = number + 1, None
+    if start <= last_line:
+        units.append((start, last_line, None, None))
+
+    covered = _cover([(start, end, symbol) for start, end, symbol, _ in units], first_line, last_line)
+    result = []
+    for (start, end, symbol), (_, unit_end, _, opened) in zip(covered, units):
+        inner_first, inner_last = (opened or 0) + 1, unit_end - 1
+        if opened and inner_first <= inner_last and source.tokens(start, end) > chunk_size:
+            # Split a large class or namespace into its members; its header and
+            # closing brace go with the first and last member.
+            inner = _brace_units(source, inner_first, inner_last, symbol + ".", chunk_size)
+            inner[0] = (start, inner[0][1], inner[0][2] or symbol)
+            inner[-1] = (inner[-1][0], end, inner[-1][2])
+            result.extend(inner)
+        else:
+            result.append((start, end, symbol))
+    return result
+
+
+# Markdown
+def _markdown_units(source):
+    units = []
+    fenced = False
+    for number, line in enumerate(source.lines, 1):
+        if line.lstrip().startswith(("```", "~~~")):
+            fenced = not fenced
+        match = None if fenced else _MD_HEADING_RE.match(line)
+        if match:
+            if units:
+                units[-1] = (units[-1][0], number - 1, units[-1][2])
+            units.append((number, number, match.group(1)))
+    if units:
+        units[-1] = (units[-1][0], len(source.lines), units[-1][2])
+    return _cover(units, 1, len(source.lines))
+
+
+def _units(source, kind, chunk_size):
+    last_line = len(source.lines)
+    if kind == "python":
+        try:
+            tree = ast.parse(source.text)
+        except (SyntaxError, ValueError):
+            return _python_indent_units(source)
+        if not tree.body:
+            return [(1, last_line, None)]
+        return _python_units(source, tree.body, 1, last_line, "", chunk_size)
+    if kind == "brace":
+        return _brace_units(source, 1, last_line, "", chunk_size)
+    return _markdown_units(source)
+
+
+def chunk_code(text, kind, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Split a source file at definition boundaries.
+
+    Parameters:
+        kind (str): ``python``, ``brace`` or ``markdown`` (see :func:`language`).
+
+    Returns:
+        list: Dicts with ``text``, ``start``, ``end`` and ``chunk`` as returned
+        by ``chunk_text``, plus ``symbol``, ``start_line`` and ``end_line``.
+    """
+    source = _Source(text)
+    chunks = []
+
+    def add(start, end, symbol):
+        raw = text[start:end]
+        stripped = raw.strip()
+        if not stripped:
+            return
+        start += len(raw) - len(raw.lstrip())
+        end = start + len(stripped)
+        chunks.append({
+            "text": stripped, "start": start, "end": end, "chunk": len(chunks), "symbol": symbol,
+            "start_line": source.line_at(start), "end_line": source.line_at(end - 1),
+        })
+
+    group, group_tokens = [], 0
+
+    def flush():
+        nonlocal group, group_tokens
+        if group:
+            symbols = ", ".join(dict.fromkeys(symbol for _, _, symbol in group if symbol)) or None
+            add(source.span(group[0][0], group[0][1])[0], source.span(group[-1][0], group[-1][1])[1], symbols)
+        group, group_tokens = [], 0
+
+    for start_line, end_line, symbol in _units(source, kind, chunk_size):
+        tokens = source.tokens(start_line, end_line)
+        if tokens > chunk_size:
+            flush()
+            offset = source.span(start_line, end_line)[0]
+            for piece in chunk_text(source.segment(start_line, end_line), chunk_size, chunk_overlap):
+                add(offset + piece["start"], offset + piece["end"], symbol)
+            continue
+        if group and group_tokens + tokens > chunk_size:
+            flush()
+        group.append((start_line, end_line, symbol))
+        group_tokens += tokens
+    flush()
+    return chunks
+
+
+def chunk_document(path, text, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP, code_aware=True):
+    """Chunk ``text`` with :func:`chunk_code` when ``path`` is a known source file, else ``chunk_text``."""
+    kind = language(path) if code_aware else None
+    if kind is None:
+        return chunk_text(text, chunk_size, chunk_overlap)
+    return chunk_code(text, kind, chunk_size, chunk_overlap)
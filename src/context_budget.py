@@ -0,0 +1,159 @@
+"""
+Fit prompts into the model's context window.
+
+Ollama silently drops the front of a prompt that exceeds ``num_ctx``, so
+the instructions, and in RAG prompts often the question, are lost, and all
+the prefill spent on the dropped part is wasted. A :class:`ContextBudget`
+counts tokens with the chunker's tokenizer and splits the window between:
+
+1. the answer (``num_predict`` is capped to the same reserve),
+2. the fixed instructions and the question,
+3. retrieved passages, best first. The first passage that does not fit is
+   cut to the remaining room and the rest are left out,
+4. conversation history, newest first, within its share of what is left
+   (all of it in plain chat, half of it next to passages). When it
+   overflows, the oldest turns are dropped until the history fills half of
+   its share. The kept prefix then stays byte-identical for the next turns
+   and the server's prompt cache keeps working.
+
+Everything is cut at token boundaries in a fixed order, so the same inputs
+always give the same prompt. ``num_ctx`` is then the smallest step of
+:data:`NUM_CTX_STEPS` that holds the prompt and the answer. Smaller windows
+prefill faster and need less KV-cache memory, while the coarse steps keep
+Ollama from reloading the model for every small change in prompt size.
+"""
+
+import math
+
+from src.chunking import count_tokens, token_spans
+
+NUM_CTX_STEPS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+DEFAULT_MAX_CTX = 8192
+DEFAULT_ANSWER_TOKENS = 1024
+SAFETY_MARGIN = 0.1  # cl100k_base counts differ from the served model's tokenizer
+HISTORY_SHARE = 0.5  # of the room left after the question, when there are passages too
+HISTORY_LOW_WATER = 0.5  # history is cut down to this part of its share at once
+MIN_PASSAGE_TOKENS = 64  # smaller remainders are not worth a truncated passage
+MESSAGE_OVERHEAD = 4  # role and template tokens around each chat message
+PASSAGE_OVERHEAD = 2  # separator between passages
+TRUNCATION_MARKER = " [...]"
+RAG_TEMPLATE = "Using this data: {data}. Respond to this prompt: {question}"
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut ``text`` to at most ``max_tokens`` tokens, the marker of the cut included."""
+    spans = token_spans(text)
+    if len(spans) <= max_tokens:
+        return text
+    keep = max_tokens - count_tokens(TRUNCATION_MARKER)
+    if keep <= 0:
+        return ""
+    return text[:spans[keep - 1][1]].rstrip() + TRUNCATION_MARKER
+
+
+def fit_num_ctx(tokens, max_ctx=DEFAULT_MAX_CTX):
+    """Smallest context window step holding ``tokens``, at most ``max_ctx``."""
+    for step in NUM_CTX_STEPS:
+        if step >= min(tokens, max_ctx):
+            return min(step, max_ctx)
+    return max_ctx
+
+
+class ContextBudget:
+    """
+    Token budget of one request.
+
+    Parameters:
+        max_ctx (int): Largest context window the server may use.
+        answer_tokens (int): Tokens reserved for the answer.
+    """
+
+    def __init__(self, max_ctx=DEFAULT_MAX_CTX, answer_tokens=DEFAULT_ANSWER_TOKENS):
+        self.max_ctx = int(max_ctx)
+        self.answer_tokens = min(int(answer_tokens), self.max_ctx // 2)
+
+    def _estimate(self, tokens):
+        return math.ceil(tokens * (1 + SAFETY_MARGIN))
+
+    def pack(self, question, instructions="", passages=(), history=(), history_start=0):
+        """
+        Choose what goes into the prompt.
+
+        Parameters:
+            question (str): The user's question or latest message.
+            instructions (str): Fixed text sent with every request (system
+                prompt, prompt template).
+            passages (list): Retrieved passages, best first.
+            history (list): Earlier chat messages (dicts with ``content``), oldest first.
+            history_start (int): Index of the first message kept last turn;
+                history before it is not sent again.
+
+        Returns:
+            dict: ``question``, ``passages`` and ``history`` to send (possibly
+            truncated), the new ``history_start``, the estimated prompt
+            ``tokens``, ``num_ctx``, ``num_predict`` and the number of
+            ``dropped_passages``.
+        """
+        room = math.floor((self.max_ctx - self.answer_tokens) / (1 + SAFETY_MARGIN))
+        used = count_tokens(instructions) + MESSAGE_OVERHEAD
+        question = truncate_tokens(question, room - used - MESSAGE_OVERHEAD)
+        used += count_tokens(question) + MESSAGE_OVERHEAD
+
+        history = list(history)
+        history_tokens = [count_tokens(message["content"]) + MESSAGE_OVERHEAD for message in history]
+        history_room = max(room - used, 0)
+        if passages:
+            history_room = int(history_room * HISTORY_SHARE)
+        start = min(max(history_start, 0), len(history))
+        if sum(history_tokens[start:]) > history_room:
+            # Drop the oldest turns in one go rather than one per turn, so the
+            # prompt prefix stays the same for a while.
+            target = history_room * HISTORY_LOW_WATER
+            while start < len(history) and sum(history_tokens[start:]) > target:
+                start += 1
+        used += sum(history_tokens[start:])
+
+        kept_passages = []
+        for passage in passages:
+            tokens = count_tokens(passage) + PASSAGE_OVERHEAD
+            if used + tokens > room:
+                if room - used - PASSAGE_OVERHEAD < MIN_PASSAGE_TOKENS:
+                    break
+                passage = truncate_tokens(passage, room - used - PASSAGE_OVERHEAD)
+                tokens = count_tokens(passage) + PASSAGE_OVERHEAD
+                kept_passages.append(passage)
+                used += tokens
+                break
+            kept_passages.append(passage)
+            used += tokens
+
+        tokens = self._estimate(used)
+        return {
+            "question": question,
+            "passages": kept_passages,
+            "history": history[start:],
+            "history_start": start,
+            "tokens": tokens,
+            "num_ctx": fit_num_ctx(tokens + self.answer_tokens, self.max_ctx),
+            "num_predict": self.answer_tokens,
+            "dropped_passages": len(passages) - len(kept_passages),
+        }
+
+
+def rag_prompt(budget, question, passages, template=RAG_TEMPLATE):
+    """
+    Build a RAG prompt from ``template`` (with ``{data}`` and ``{question}``
+    fields) holding as many of ``passages`` as the budget allows.
+
+    Returns:
+        tuple: The prompt, the packed passages (``data``) and the plan from
+        :meth:`ContextBudget.pack`.
+    """
+    plan = budget.pack(question, template.format(data="", question=""), passages)
+    data = "\n\n".join(plan["passages"])
+    return template.format(data=data, question=plan["question"]), data, plan
+
+
+def context_budget(config):
+    """Budget configured by ``context_max_tokens`` and ``max_tokens`` (the answer reserve)."""
+    return ContextBudget(int(config["context_max_tokens"]), int(config["max_tokens"]))
@@ -0,0 +1,185 @@
+"""
+Asynchronous web crawler for the GitHub & URL Chat tab.
+
+Pages are fetched by a pool of asyncio workers sharing one aiohttp session,
+so connections are kept alive and reused. The connector bounds the total
+number of connections and the connections per host, and every request has a
+timeout. Each page is downloaded once: its HTML is handed straight to
+``src.extraction.extract_html``, which returns both the text to index and the
+links to follow. Workers do not wait for a whole crawl level to finish before
+following links.
+
+With an ``src.http_cache.HttpCache``, pages fetched before are revalidated
+with conditional GETs; ``304 Not Modified`` pages reuse their cached text and
+links and are reported as ``unchanged`` so callers can skip re-indexing them.
+Only HTML responses are indexed: stylesheets, scripts, plain text and binaries
+are skipped whatever their URL looks like.
+Pages answered with 404 or 410 are reported as ``gone``, and
+:func:`unreached_pages` tells which pages of an earlier crawl to remove.
+"""
+
+import asyncio
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from src.extraction import extract_html
+from src.http_cache import HttpCache
+
+DEFAULT_CRAWL_CONFIG = {
+    "crawl_max_connections": 32,
+    "crawl_connections_per_host": 4,
+    "crawl_timeout": 20,  # seconds per request
+    "crawl_max_pages": 1000,  # 0 = unlimited
+}
+
+USER_AGENT = "RA-crawler/1.0 (+https://github.com/Akt-AI/RA)"
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+# Statuses meaning a page was removed rather than failed for now.
+GONE_STATUSES = (404, 410)
+# Links that are never worth downloading for a text index.
+SKIP_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".webp", ".mp3", ".mp4", ".webm",
+    ".zip", ".gz", ".tar", ".tgz", ".whl", ".exe", ".dmg", ".woff", ".woff2", ".ttf",
+    ".css", ".js", ".mjs", ".map",
+}
+
+
+def _skipped(url):
+    return os.path.splitext(urlsplit(url).path)[1].lower() in SKIP_EXTENSIONS
+
+
+def _decode(body, response):
+    try:
+        return body.decode(response.get_encoding(), errors="replace")
+    except (LookupError, RuntimeError):
+        return body.decode("utf-8", errors="replace")
+
+
+async def _crawl(start_urls, base_url, depth, config, follow_links, cache):
+    pages, errors, unchanged, gone = {}, {}, [], []
+    stats = {"bytes": 0, "truncated": False}
+    seen = set(start_urls)
+    max_pages = int(config["crawl_max_pages"])
+    queue = asyncio.Queue()
+    for url in start_urls:
+        queue.put_nowait((url, 0))
+
+    connector = aiohttp.TCPConnector(
+        limit=int(config["crawl_max_connections"]),
+        limit_per_host=int(config["crawl_connections_per_host"]),
+        ttl_dns_cache=300,
+    )
+    timeout = aiohttp.ClientTimeout(total=float(config["crawl_timeout"]))
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers={"User-Agent": USER_AGENT}) as session:
+
+        async def fetch(url, level):
+            entry = cache.get(url) if cache is not None else None
+            async with session.get(url, headers=HttpCache.conditional_headers(entry)) as response:
+                if response.status == 304 and entry is not None:
+                    final_url = url
+                    text, links = entry["text"], entry["links"]
+                    unchanged.append(url)
+                else:
+                    response.raise_for_status()
+                    body = await response.read()
+                    stats["bytes"] += len(body)
+                    final_url = str(response.url)
+                    validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                    text = _decode(body, response) if response.content_type in HTML_TYPES else None
+                    links = None
+            if text is None:
+                return  # stylesheets, scripts, images and other non-HTML files are not indexed
+            if links is None:
+                # Parsing is CPU-bound; keep the event loop free for other downloads.
+                text, links = await asyncio.to_thread(extract_html, text, final_url)
+                if cache is not None:
+                    cache.set(url, *validators, text, links)
+            pages[url] = text
+            seen.add(final_url)
+            if not follow_links or level + 1 >= depth:
+                return
+            for link in links:
+                if max_pages and len(seen) >= max_pages:
+                    stats["truncated"] = True
+                    break
+                if link.startswith(base_url) and link not in seen and not _skipped(link):
+                    seen.add(link)
+                    queue.put_nowait((link, level + 1))
+
+        async def worker():
+            while True:
+                url, level = await queue.get()
+                try:
+                    await fetch(url, level)
+                except Exception as e:
+                    errors[url] = str(e) or type(e).__name__
+                    if isinstance(e, aiohttp.ClientResponseError) and e.status in GONE_STATUSES:
+                        gone.append(url)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(int(config["crawl_max_connections"]))]
+        await queue.join()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return {
+        "pages": pages, "errors": errors, "unchanged": unchanged, "gone": gone,
+        "bytes": stats["bytes"], "truncated": stats["truncated"],
+    }
+
+
+def _run(start_urls, base_url, depth, config, follow_links, cache):
+    config = {**DEFAULT_CRAWL_CONFIG, **(config or {})}
+    started = time.perf_counter()
+    result = asyncio.run(_crawl(start_urls, base_url, depth, config, follow_links, cache))
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def crawl(base_url, depth=2, config=None, cache=None):
+    """
+    Crawl ``base_url`` and the pages below it, up to ``depth`` levels of links.
+
+    Parameters:
+        base_url (str): Start page; only links starting with it are followed.
+        depth (int): Number of link levels fetched; 1 fetches ``base_url`` only.
+        config (dict): Settings overriding ``DEFAULT_CRAWL_CONFIG``.
+        cache (HttpCache): Optional cache used to revalidate pages fetched before.
+
+    Returns:
+        dict: ``pages`` (URL -> extracted text), ``errors`` (URL -> message),
+        ``unchanged`` (URLs answered with 304 Not Modified), ``gone`` (URLs
+        answered with 404 or 410, also in ``errors``), ``truncated`` (whether
+        ``crawl_max_pages`` stopped it), ``bytes`` downloaded and ``seconds``
+        elapsed.
+    """
+    return _run([base_url], base_url, depth, config, True, cache)
+
+
+def unreached_pages(result, indexed, base_url):
+    """
+    Pages of an earlier crawl of ``base_url`` to remove after the crawl ``result``.
+
+    Parameters:
+        indexed (iterable): URLs currently in the index.
+
+    Returns:
+        list: URLs under ``base_url`` that are gone, and, when the crawl ran
+        to completion, those it did not reach anymore. A crawl stopped by
+        errors or by ``crawl_max_pages`` says nothing about the pages it
+        missed, so they are kept.
+    """
+    indexed = {url for url in indexed if url.startswith(base_url)}
+    gone = indexed.intersection(result["gone"])
+    if result.get("truncated") or set(result["errors"]).difference(result["gone"]):
+        return sorted(gone)
+    return sorted(gone.union(url for url in indexed if url not in result["pages"]))
+
+
+def fetch_pages(urls, config=None, cache=None):
+    """Fetch and extract a list of URLs concurrently without following links; see :func:`crawl`."""
+    return _run(list(dict.fromkeys(urls)), "", 1, config, False, cache)
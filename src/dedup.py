@@ -0,0 +1,153 @@
+"""
+Near-duplicate detection for documents about to be indexed.
+
+Documentation sites serve the same page under many URLs (query strings,
+versioned paths, print views) and repositories carry copied files. Each
+document gets a MinHash signature over its word shingles, hashed with
+``mmh3``; locality-sensitive hashing over bands of the signature finds
+candidate matches in constant time, and a candidate whose estimated Jaccard
+similarity reaches the threshold is reported as a duplicate of the first
+document seen. Identical texts are matched by a whole-text hash before any
+shingling. Only the first copy is embedded; the index records the others as
+aliases of it. The seen documents can be saved and loaded again, so a resumed
+job still finds duplicates of what it indexed before.
+"""
+
+import os
+import re
+
+import mmh3
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 5
+
+_WORD_RE = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of the documents seen so far.
+
+    Parameters:
+        threshold (float): Estimated Jaccard similarity from which two
+            documents are duplicates.
+        num_perm (int): MinHash signature length.
+        bands (int): LSH bands; ``num_perm`` must be a multiple of it.
+        shingle_size (int): Words per shingle.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+                 shingle_size=DEFAULT_SHINGLE_SIZE):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = float(threshold)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._exact = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def signature(self, words):
+        """MinHash signature of a list of words, or None if it has fewer than one shingle."""
+        size = self.shingle_size
+        if len(words) < size:
+            return None
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((mmh3.hash(shingle, signed=False) for shingle in shingles), np.uint64, len(shingles))
+        # Universal hashing (a * x + b) mod p; the product wraps in uint64 as intended.
+        with np.errstate(over="ignore"):
+            permuted = ((hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def add(self, key, text):
+        """
+        Add a document unless it duplicates one added before.
+
+        Returns:
+            The key of the document ``text`` duplicates, or None if it was added.
+        """
+        words = _WORD_RE.findall(text.lower())
+        exact = mmh3.hash_bytes(" ".join(words).encode("utf-8"))
+        if exact in self._exact:
+            # A document seen again under its own key (a retried file) is not a duplicate.
+            return self._exact[exact] if self._exact[exact] != key else None
+        signature = self.signature(words)
+        if signature is not None:
+            bands = self._bands(signature)
+            candidates = dict.fromkeys(
+                other for bucket, band in zip(self._buckets, bands) for other in bucket.get(band, ())
+            )
+            for candidate in candidates:
+                if candidate != key and np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+            self._add_signature(key, signature, bands)
+        self._exact[exact] = key
+        return None
+
+    def _bands(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _add_signature(self, key, signature, bands):
+        self._signatures[key] = signature
+        for bucket, band in zip(self._buckets, bands):
+            if key not in bucket.setdefault(band, []):
+                bucket[band].append(key)
+
+    def save(self, path):
+        """Write the documents seen so far to the ``.npz`` file ``path``, atomically."""
+        keys = list(self._signatures)
+        signatures = np.stack([self._signatures[key] for key in keys]) if keys else np.zeros((0, len(self._a)), np.uint64)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                keys=np.array(keys, dtype=str),
+                signatures=signatures,
+                exact_hashes=np.frombuffer(b"".join(self._exact), np.uint8).reshape(-1, 16),
+                exact_keys=np.array(list(self._exact.values()), dtype=str),
+            )
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """
+        Add the documents saved by :meth:`save` to ``path``, if it exists.
+
+        Returns:
+            bool: Whether the file existed.
+        """
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            if len(data["keys"]) and data["signatures"].shape[1] != len(self._a):
+                raise ValueError(f"{path} was saved with a different signature length")
+            for key, signature in zip(data["keys"].tolist(), data["signatures"]):
+                self._add_signature(key, signature, self._bands(signature))
+            for exact, key in zip(data["exact_hashes"], data["exact_keys"].tolist()):
+                self._exact[exact.tobytes()] = key
+        return True
+
+
+def dedup_documents(documents, index, duplicates):
+    """
+    Yield the (path, text) pairs of ``documents`` that are not near-duplicates.
+
+    Parameters:
+        index (NearDuplicateIndex): Documents seen so far.
+        duplicates (dict): Filled with duplicate path -> path of the kept copy.
+    """
+    for path, text in documents:
+        original = index.add(path, text)
+        if original is None:
+            yield path, text
+        else:
+            duplicates[path] = original
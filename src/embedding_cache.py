@@ -0,0 +1,88 @@
+"""
+Persistent embedding cache shared by every index.
+
+Embeddings are stored in a ``diskcache`` keyed by (embedding model, SHA-256
+of the text), so re-indexing unchanged content costs a hash lookup instead
+of a model call. The cache is bounded by size and evicts least recently
+used entries first.
+"""
+
+import hashlib
+import threading
+
+import numpy as np
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+EMBEDDING_CACHE_DIR = "embedding_cache"
+DEFAULT_SIZE_LIMIT_MB = 2048
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class EmbeddingCache:
+    """(model, content hash) -> float32 embedding store."""
+
+    def __init__(self, directory=EMBEDDING_CACHE_DIR, size_limit_mb=DEFAULT_SIZE_LIMIT_MB):
+        self._cache = diskcache.Cache(
+            directory,
+            size_limit=int(size_limit_mb) * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+
+    @staticmethod
+    def key(model, text):
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get(self, model, text):
+        value = self._cache.get(self.key(model, text))
+        return None if value is None else np.frombuffer(value, dtype=np.float32)
+
+    def set(self, model, text, embedding):
+        self._cache.set(self.key(model, text), np.asarray(embedding, dtype=np.float32).tobytes())
+
+    def close(self):
+        self._cache.close()
+
+
+def get_embedding_cache(directory=EMBEDDING_CACHE_DIR, size_limit_mb=DEFAULT_SIZE_LIMIT_MB):
+    """Return the process-wide cache for ``directory``, or None if diskcache is missing."""
+    if diskcache is None:
+        return None
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = EmbeddingCache(directory, size_limit_mb)
+        return _caches[directory]
+
+
+def embed_cached(client, texts, cache, stats=None):
+    """
+    Embed ``texts`` with ``client``, only calling the model for cache misses.
+
+    Parameters:
+        client (EmbeddingClient): Client used for the misses.
+        texts (list): Texts to embed.
+        cache (EmbeddingCache): Cache to consult; None disables caching.
+        stats (dict): Optional counter updated with ``cache_hits``/``cache_misses``.
+
+    Returns:
+        np.ndarray: float32 matrix with one row per text.
+    """
+    if cache is None:
+        return client.embed(texts)
+    found = [cache.get(client.model, text) for text in texts]
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, found) if embedding is None))
+    if stats is not None:
+        misses = sum(embedding is None for embedding in found)
+        stats["cache_hits"] = stats.get("cache_hits", 0) + len(texts) - misses
+        stats["cache_misses"] = stats.get("cache_misses", 0) + misses
+    if missing:
+        computed = dict(zip(missing, client.embed(missing)))
+        for text, embedding in computed.items():
+            cache.set(client.model, text, embedding)
+        found = [computed[text] if embedding is None else embedding for text, embedding in zip(texts, found)]
+    return np.vstack(found)
@@ -0,0 +1,87 @@
+"""
+Shared Ollama embedding client.
+
+Texts are sent to ``/api/embed`` in batches over a pooled keep-alive session,
+with a bounded number of batches in flight and automatic retries for
+transient failures (connection errors, 429 and 5xx responses).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+OLLAMA_API_URL = "http://localhost:11434"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 300
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class EmbeddingClient:
+    """Batched, pooled client for one embedding model."""
+
+    def __init__(self, model, base_url=OLLAMA_API_URL, batch_size=DEFAULT_BATCH_SIZE,
+                 concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+        self.model = model
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+
+    def _embed_batch(self, texts):
+        response = self.session.post(
+            f"{self.base_url}/api/embed",
+            json={"model": self.model, "input": texts},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return np.asarray(response.json()["embeddings"], dtype=np.float32)
+
+    def embed(self, texts):
+        """
+        Embed ``texts``, preserving order.
+
+        Returns:
+            np.ndarray: float32 matrix with one row per text.
+
+        Raises:
+            requests.RequestException: If a batch still fails after retrying.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        return np.vstack(list(self._executor.map(self._embed_batch, batches)))
+
+    def embed_one(self, text):
+        """Embed a single text and return its vector."""
+        return self._embed_batch([text])[0]
+
+
+def get_embedding_client(model, base_url=OLLAMA_API_URL, **options):
+    """Return the process-wide client for ``model``, creating it on first use."""
+    key = (model, base_url, tuple(sorted(options.items())))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = EmbeddingClient(model, base_url, **options)
+        return _clients[key]
@@ -0,0 +1,385 @@
+"""
+Text extraction for uploaded PDF, Word and text files, and crawled HTML pages.
+
+PDFs are read with PyMuPDF when it is installed, which is an order of
+magnitude faster than PyPDF2's pure-Python ``extract_text``; PyPDF2 is kept
+as a fallback, and python-docx reads Word files. Files, and page ranges of
+large PDFs, are spread over a process pool so extraction uses every core
+instead of running in the Streamlit script thread. Every file gets a report
+entry with its extraction time and pages per second.
+
+``iter_documents`` yields each file as soon as it is extracted and keeps only
+a bounded number of tasks in flight, so ingestion can chunk and embed early
+files while later ones are still being read.
+
+``extract_html`` turns a fetched page into its main text and outgoing links
+in a single lxml parse, so the crawler never downloads or parses a page
+twice. Scripts, styles, navigation, headers, footers, sidebars and similar
+boilerplate are dropped before the text is taken, so they are neither
+embedded nor stuffed into prompts. BeautifulSoup is the fallback when lxml is
+not installed.
+"""
+
+import io
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urldefrag, urljoin
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24.3
+    except ImportError:
+        fitz = None
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    from docx import Document
+except ImportError:
+    Document = None
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+DEFAULT_PAGES_PER_TASK = 32
+SUPPORTED_EXTENSIONS = ["pdf", "docx", "txt"]
+
+# Elements whose content is never page text.
+_HTML_DROP_TAGS = [
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed",
+    "nav", "aside", "form", "button", "select", "dialog",
+]
+# Page chrome, except inside an article where they hold its title or byline.
+_HTML_CHROME_TAGS = {"header", "footer"}
+_HTML_DROP_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog", "menu", "menubar"}
+_HTML_BOILERPLATE_RE = re.compile(
+    r"(?:^|[\s_-])(?:nav|navbar|menu|sidebar|footer|breadcrumbs?|cookies?|banner|advert|ads|share|social|related|comments?|popup|modal|skip-link)(?:$|[\s_-])",
+    re.I,
+)
+_HTML_BLOCK_TAGS = [
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "dl", "dt", "dd", "tr", "table",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "figure", "figcaption", "title", "td", "th",
+]
+# Elements with a boilerplate class or id are dropped below this size or above this link density.
+_HTML_HINT_MAX_CHARS = 500
+_HTML_HINT_LINK_DENSITY = 0.5
+# Main-content containers, never dropped as boilerplate on a class or id hint.
+_HTML_MAIN_TAGS = {"main", "article"}
+# The main-content container is used only if it holds this share of the page text.
+_HTML_MAIN_MIN_SHARE = 0.25
+
+
+def file_extension(name):
+    return name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+
+def _pdf_page_count(data):
+    """Return (page count, engine) for a PDF, preferring PyMuPDF."""
+    if fitz is not None:
+        try:
+            with fitz.open(stream=data, filetype="pdf") as doc:
+                return doc.page_count, "pymupdf"
+        except Exception:
+            if PdfReader is None:
+                raise
+    if PdfReader is None:
+        raise ImportError("PyMuPDF or PyPDF2 is required to read PDF files")
+    return len(PdfReader(io.BytesIO(data)).pages), "pypdf2"
+
+
+def _extract_task(name, data, engine, start, end):
+    """
+    Extract one file, or pages ``start`` to ``end`` of a PDF, in a worker process.
+
+    Returns:
+        tuple: (text parts, pages read, start time, end time); the times are
+        wall-clock, so tasks of one file run by different workers compare.
+    """
+    began = time.time()
+    parts = []
+    extension = file_extension(name)
+    if extension == "pdf" and engine == "pymupdf":
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            parts = [doc[page].get_text() for page in range(start, end)]
+    elif extension == "pdf":
+        reader = PdfReader(io.BytesIO(data))
+        parts = [reader.pages[page].extract_text() or "" for page in range(start, end)]
+    elif extension == "docx":
+        if Document is None:
+            raise ImportError("python-docx is required to read Word files")
+        parts = [paragraph.text for paragraph in Document(io.BytesIO(data)).paragraphs]
+    elif extension == "txt":
+        parts = [data.decode("utf-8", errors="replace")]
+    else:
+        raise ValueError(f"Unsupported file type: {extension}")
+    return [part for part in parts if part], end - start, began, time.time()
+
+
+def _plan(name, data, pages_per_task):
+    """Split a file into extraction tasks; returns (engine, pages, task args)."""
+    if file_extension(name) != "pdf":
+        return None, 0, [(name, data, None, 0, 0)]
+    pages, engine = _pdf_page_count(data)
+    tasks = [
+        (name, data, engine, start, min(start + pages_per_task, pages))
+        for start in range(0, pages, pages_per_task)
+    ]
+    return engine, pages, tasks
+
+
+def _new_entry(name):
+    return {"name": name, "engine": None, "pages": 0, "seconds": 0.0,
+            "pages_per_second": None, "characters": 0, "error": None}
+
+
+def _plan_entry(entry, data, pages_per_task):
+    """Fill in the engine and page count of a report entry; returns its tasks."""
+    name = entry["name"]
+    if file_extension(name) not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {file_extension(name)}")
+    entry["engine"], entry["pages"], tasks = _plan(name, data, pages_per_task)
+    if entry["engine"] is None:
+        entry["engine"] = "python-docx" if file_extension(name) == "docx" else "text"
+    return tasks
+
+
+def _finish_entry(entry, results):
+    """Join the task results of one file in page order; returns its text."""
+    parts = []
+    for text_parts, _, _, _ in results:
+        parts.extend(text_parts)
+    # Wall time from the first task starting to the last one finishing, not
+    # the sum over workers, so pages per second is the rate the file got.
+    if results:
+        entry["seconds"] = max(result[3] for result in results) - min(result[2] for result in results)
+    text = "\n".join(parts).strip()
+    entry["characters"] = len(text)
+    if entry["pages"] and entry["seconds"] > 0:
+        entry["pages_per_second"] = entry["pages"] / entry["seconds"]
+    return text
+
+
+def iter_documents(files, max_workers=None, pages_per_task=DEFAULT_PAGES_PER_TASK, report=None):
+    """
+    Extract files in parallel and yield (file name, text) in input order as they complete.
+
+    Parameters:
+        files (iterable): (file name, file bytes) pairs; consumed lazily.
+        max_workers (int): Worker processes; ``None`` or 0 uses every CPU.
+        pages_per_task (int): PDF pages handed to a worker at a time.
+        report (list): Receives one dict per file with ``name``, ``engine``,
+            ``pages``, ``seconds`` (wall time from its first page starting to
+            its last one finishing), ``pages_per_second``, ``characters`` and
+            ``error``. Files that failed or had no text are not yielded.
+    """
+    pages_per_task = max(1, int(pages_per_task))
+    workers = int(max_workers or os.cpu_count() or 1)
+    report = [] if report is None else report
+
+    if workers <= 1:
+        for name, data in files:
+            entry = _new_entry(name)
+            report.append(entry)
+            try:
+                results = [_extract_task(*task) for task in _plan_entry(entry, data, pages_per_task)]
+            except Exception as e:
+                entry["error"] = str(e)
+                continue
+            text = _finish_entry(entry, results)
+            if text:
+                yield name, text
+        return
+
+    def drain(entry, futures):
+        try:
+            results = [future.result() for future in futures]
+        except Exception as e:
+            entry["error"] = str(e)
+            return None
+        return _finish_entry(entry, results)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()  # (entry, futures) in input order
+        in_flight = 0
+        for name, data in files:
+            entry = _new_entry(name)
+            report.append(entry)
+            try:
+                tasks = _plan_entry(entry, data, pages_per_task)
+            except Exception as e:
+                entry["error"] = str(e)
+                continue
+            futures = [pool.submit(_extract_task, *task) for task in tasks]
+            pending.append((entry, futures))
+            in_flight += len(futures)
+            # Hand finished files on, and wait for the oldest while too much is queued.
+            while pending and (in_flight > 2 * workers or all(future.done() for future in pending[0][1])):
+                entry, futures = pending.popleft()
+                in_flight -= len(futures)
+                text = drain(entry, futures)
+                if text:
+                    yield entry["name"], text
+        while pending:
+            entry, futures = pending.popleft()
+            text = drain(entry, futures)
+            if text:
+                yield entry["name"], text
+
+
+def extract_documents(files, max_workers=None, pages_per_task=DEFAULT_PAGES_PER_TASK):
+    """
+    Extract the text of several files in parallel.
+
+    Returns:
+        tuple: (texts, report) where ``texts`` maps file names to extracted
+        text and ``report`` is described in :func:`iter_documents`.
+    """
+    report = []
+    texts = dict(iter_documents(files, max_workers, pages_per_task, report))
+    return texts, report
+
+
+def _collapse_whitespace(text):
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _is_boilerplate(name, element, in_article, measure, holds_main):
+    """
+    Whether an lxml or BeautifulSoup element is navigation or other page chrome.
+
+    Class and id names are only a hint: a matching element is dropped when it
+    is short or mostly links, so a page-wide ``has-sidebar`` wrapper survives.
+    An element that is or holds the main content (``main``, ``article``,
+    ``role="main"``) is never dropped on a hint, however short the page.
+    ``measure(element)`` returns its (text length, link text length) and
+    ``holds_main(element)`` whether it contains a main-content element.
+    """
+    if name in _HTML_CHROME_TAGS:
+        return not in_article
+    if (element.get("role") or "").lower() in _HTML_DROP_ROLES or element.get("aria-hidden") == "true":
+        return True
+    if element.get("hidden") is not None:
+        return True
+    classes = element.get("class") or ""
+    if not isinstance(classes, str):
+        classes = " ".join(classes)  # BeautifulSoup splits the class attribute
+    if not _HTML_BOILERPLATE_RE.search(f"{element.get('id') or ''} {classes}"):
+        return False
+    if name in _HTML_MAIN_TAGS or (element.get("role") or "").lower() == "main" or holds_main(element):
+        return False
+    text_length, link_length = measure(element)
+    return text_length < _HTML_HINT_MAX_CHARS or link_length > _HTML_HINT_LINK_DENSITY * text_length
+
+
+def _html_links(hrefs, url):
+    links = []
+    for href in hrefs:
+        absolute_url = urldefrag(urljoin(url, href.strip()))[0]
+        if absolute_url.startswith(("http://", "https://")):
+            links.append(absolute_url)
+    return links
+
+
+def _lxml_measure(element):
+    return len(element.text_content().strip()), sum(len(a.text_content().strip()) for a in element.iter("a"))
+
+
+def _bs4_measure(element):
+    return len(element.get_text().strip()), sum(len(a.get_text().strip()) for a in element.find_all("a"))
+
+
+def _lxml_holds_main(element):
+    return bool(element.xpath(".//main | .//article | .//*[@role='main']"))
+
+
+def _bs4_holds_main(element):
+    return element.find(list(_HTML_MAIN_TAGS)) is not None or element.find(attrs={"role": "main"}) is not None
+
+
+def _extract_html_lxml(html, url):
+    try:
+        root = lxml.html.document_fromstring(html)
+    except ValueError:
+        # XHTML with an XML encoding declaration must be parsed from bytes.
+        root = lxml.html.document_fromstring(html.encode("utf-8"))
+    # Links are collected before pruning: navigation is boilerplate but still worth following.
+    links = _html_links((element.get("href") for element in root.iter("a") if element.get("href")), url)
+
+    title = root.findtext(".//title") or ""
+    etree.strip_elements(root, etree.Comment, *_HTML_DROP_TAGS, with_tail=False)
+    for element in list(root.iter()):
+        if not isinstance(element.tag, str) or element.tag in ("html", "head", "body"):
+            continue
+        in_article = element.tag in _HTML_CHROME_TAGS and any(
+            ancestor.tag in ("article", "main") for ancestor in element.iterancestors()
+        )
+        if _is_boilerplate(element.tag, element, in_article, _lxml_measure, _lxml_holds_main):
+            element.drop_tree()
+    for element in root.iter(*_HTML_BLOCK_TAGS):
+        element.tail = "\n" + (element.tail or "")
+
+    body = root.find("body")
+    body = root if body is None else body
+    body_text = body.text_content()
+    candidates = root.xpath("//main | //*[@role='main'] | //article")
+    main = max(candidates, key=lambda element: len(element.text_content()), default=None)
+    if main is not None and len(main.text_content().strip()) >= _HTML_MAIN_MIN_SHARE * len(body_text.strip()):
+        body_text = main.text_content()
+    text = _collapse_whitespace(body_text)
+    title = _collapse_whitespace(title)
+    if title and text.split("\n", 1)[0] != title:
+        text = f"{title}\n{text}" if text else title
+    return text, links
+
+
+def _extract_html_bs4(html, url):
+    soup = BeautifulSoup(html, "html.parser")
+    links = _html_links((link["href"] for link in soup.find_all("a", href=True)), url)
+    for element in soup.find_all(_HTML_DROP_TAGS):
+        element.decompose()
+    for element in soup.find_all(True):
+        if element.decomposed or element.name in ("html", "head", "body"):
+            continue
+        in_article = element.name in _HTML_CHROME_TAGS and element.find_parent(["article", "main"]) is not None
+        if _is_boilerplate(element.name, element, in_article, _bs4_measure, _bs4_holds_main):
+            element.decompose()
+    main = soup.find("main") or soup.find(attrs={"role": "main"}) or soup.find("article") or soup
+    return _collapse_whitespace(main.get_text("\n")), links
+
+
+def extract_html(html, url):
+    """
+    Extract the main text and the outgoing links of an HTML page in one parse.
+
+    Returns:
+        tuple: (text, links) where ``text`` has boilerplate removed and
+        whitespace collapsed, and ``links`` are absolute URLs without
+        fragments (navigation links included).
+    """
+    if not html or not html.strip():
+        return "", []
+    if lxml is not None:
+        try:
+            return _extract_html_lxml(html, url)
+        except etree.ParserError:
+            return "", []
+    if BeautifulSoup is None:
+        raise ImportError("lxml or beautifulsoup4 is required to read HTML pages")
+    return _extract_html_bs4(html, url)
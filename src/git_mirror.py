@@ -0,0 +1,232 @@
+"""
+Persistent bare mirrors of the Git repositories indexed by the GitHub tab.
+
+Each repository URL gets one ``git clone --mirror`` under ``git_mirrors/``
+that is kept between runs and refreshed with ``git remote update``, so only
+new objects are downloaded. Files are never checked out: the tree of a
+commit is listed with ``git ls-tree`` and file contents are streamed from
+one long-running ``git cat-file --batch`` process. Together with the commit
+recorded in the index, ``diff_blobs`` lets a re-index read only the files
+added, modified or deleted since the last run.
+
+Mirrors can be shallow (``depth``) and partial (``blob_limit``): blobs above
+the limit are never downloaded, are reported with a size of None and are
+never read, so they cannot trigger an on-demand fetch. A fetch keeps the
+filter the mirror was cloned with, so when the limit is raised (or removed)
+the mirror is cloned again to get the blobs it left out.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+MIRROR_DIR = "git_mirrors"
+# Symlinks and submodules have no text content to index.
+_SKIPPED_MODES = {"120000", "160000"}
+
+
+def _git(git_dir, *args):
+    return subprocess.run(
+        ["git", "--git-dir", git_dir, *args], check=True, capture_output=True
+    ).stdout
+
+
+def mirror_path(repo_url, mirror_dir=MIRROR_DIR):
+    """Directory of the mirror of ``repo_url``: readable name plus a hash of the URL."""
+    name = repo_url.rstrip("/").rsplit("/", 1)[-1]
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", name[:-4] if name.endswith(".git") else name)
+    digest = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(mirror_dir, f"{name}-{digest}.git")
+
+
+def _blob_limit(git_dir):
+    """Blob size limit a mirror was cloned with, in bytes, or None for a full clone."""
+    result = subprocess.run(
+        ["git", "--git-dir", git_dir, "config", "--get", "remote.origin.partialclonefilter"],
+        capture_output=True,
+    )
+    match = re.fullmatch(r"blob:limit=(\d+)([kmg]?)", result.stdout.decode().strip().lower())
+    if match is None:
+        return None
+    return int(match.group(1)) * 1024 ** " kmg".index(match.group(2) or " ")
+
+
+def _clone(repo_url, path, depth_args, blob_limit):
+    # Clone next to the final path so an interrupted clone never looks like a mirror.
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    filter_args = [f"--filter=blob:limit={int(blob_limit)}"] if blob_limit else []
+    subprocess.run(
+        ["git", "clone", "--mirror", "--quiet", *depth_args, *filter_args, repo_url, tmp_path],
+        check=True, capture_output=True,
+    )
+    if os.path.isdir(path):
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        os.rename(tmp_path, path)
+
+
+def update_mirror(repo_url, mirror_dir=MIRROR_DIR, depth=0, blob_limit=0):
+    """
+    Create the mirror of ``repo_url`` or fetch new commits into it.
+
+    Parameters:
+        depth (int): Commits of history to fetch; 0 fetches the full history.
+        blob_limit (int): Leave out blobs larger than this many bytes
+            (partial clone); 0 fetches every blob. A mirror cloned with a
+            lower limit is cloned again.
+
+    Returns:
+        str: Path of the bare mirror.
+
+    Raises:
+        subprocess.CalledProcessError: If git fails (bad URL, no network...).
+    """
+    path = mirror_path(repo_url, mirror_dir)
+    depth_args = ["--depth", str(int(depth))] if depth else []
+    if os.path.isdir(path):
+        limit = _blob_limit(path)
+        if limit is None or (blob_limit and int(blob_limit) <= limit):
+            if depth_args:
+                _git(path, "fetch", "--prune", *depth_args, "origin")
+            else:
+                _git(path, "remote", "update", "--prune")
+            return path
+        # Blobs between the old and the new limit were never fetched.
+    os.makedirs(mirror_dir, exist_ok=True)
+    _clone(repo_url, path, depth_args, blob_limit)
+    return path
+
+
+def head_commit(git_dir, ref="HEAD"):
+    """Full commit id of ``ref`` (the default branch for ``HEAD``)."""
+    return _git(git_dir, "rev-parse", "--verify", f"{ref}^{{commit}}").decode().strip()
+
+
+def has_commit(git_dir, commit):
+    """Whether ``commit`` exists in the repository (it may be gone after a force push)."""
+    result = subprocess.run(
+        ["git", "--git-dir", git_dir, "cat-file", "-e", f"{commit}^{{commit}}"], capture_output=True
+    )
+    return result.returncode == 0
+
+
+def missing_objects(git_dir, commit):
+    """Objects of the tree of ``commit`` left out of a partial clone."""
+    output = _git(git_dir, "rev-list", "--objects", "--no-object-names", "--missing=print", "--no-walk", commit)
+    return {line[1:] for line in output.decode().split() if line.startswith("?")}
+
+
+def _add_sizes(git_dir, commit, blobs):
+    """Set the ``size`` of every blob; None for blobs missing from a partial clone."""
+    missing = missing_objects(git_dir, commit)
+    present = list(dict.fromkeys(blob["sha"] for blob in blobs if blob["sha"] not in missing))
+    sizes = {}
+    if present:
+        output = subprocess.run(
+            ["git", "--git-dir", git_dir, "cat-file", "--batch-check"],
+            input="\n".join(present).encode() + b"\n", check=True, capture_output=True,
+        ).stdout
+        for line in output.decode().splitlines():
+            fields = line.split()
+            if len(fields) == 3:
+                sizes[fields[0]] = int(fields[2])
+    for blob in blobs:
+        blob["size"] = sizes.get(blob["sha"])
+    return blobs
+
+
+def list_blobs(git_dir, commit, sizes=True):
+    """
+    List the files of ``commit``.
+
+    Returns:
+        list: Dicts with ``path``, ``sha``, ``mode`` and, with ``sizes``,
+        ``size`` (bytes, or None if the blob was left out of a partial clone).
+    """
+    blobs = []
+    for entry in _git(git_dir, "ls-tree", "-r", "-z", commit).split(b"\0"):
+        if not entry:
+            continue
+        info, path = entry.split(b"\t", 1)
+        mode, kind, sha = info.decode().split()
+        if kind != "blob" or mode in _SKIPPED_MODES:
+            continue
+        blobs.append({"path": path.decode("utf-8", "surrogateescape"), "sha": sha, "mode": mode})
+    return _add_sizes(git_dir, commit, blobs) if sizes else blobs
+
+
+def diff_blobs(git_dir, old_commit, new_commit):
+    """
+    Compare two commits.
+
+    Returns:
+        tuple: (changed, deleted) where ``changed`` lists dicts with ``path``,
+        ``sha``, ``mode`` and ``size`` of added or modified files (see
+        :func:`list_blobs`), and ``deleted`` lists the paths of removed
+        files. Renames count as a delete plus an add.
+    """
+    output = _git(git_dir, "diff", "--raw", "-z", "--no-renames", "--no-abbrev", old_commit, new_commit)
+    fields = output.split(b"\0")
+    changed, deleted = [], []
+    for i in range(0, len(fields) - 1, 2):
+        _, new_mode, _, new_sha, status = fields[i].decode().lstrip(":").split()
+        path = fields[i + 1].decode("utf-8", "surrogateescape")
+        if status == "D":
+            deleted.append(path)
+        elif new_mode in _SKIPPED_MODES:
+            # A file replaced by a symlink or submodule no longer has content.
+            deleted.append(path)
+        else:
+            changed.append({"path": path, "sha": new_sha, "mode": new_mode})
+    return _add_sizes(git_dir, new_commit, changed), deleted
+
+
+def read_blobs(git_dir, shas):
+    """
+    Stream the contents of ``shas`` from one ``git cat-file --batch`` process.
+
+    Yields:
+        tuple: (sha, bytes), in the order of ``shas``; bytes is None for a
+        missing object.
+    """
+    shas = list(shas)
+    process = subprocess.Popen(
+        ["git", "--git-dir", git_dir, "cat-file", "--batch"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+
+    def write_requests():
+        # Fed from a thread so a large request list cannot deadlock on full pipes.
+        try:
+            for sha in shas:
+                process.stdin.write(sha.encode() + b"\n")
+            process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    writer = threading.Thread(target=write_requests, name="git-cat-file", daemon=True)
+    writer.start()
+    try:
+        for sha in shas:
+            header = process.stdout.readline().split()
+            if len(header) < 3:
+                yield sha, None
+                continue
+            size = int(header[2])
+            data = process.stdout.read(size)
+            process.stdout.read(1)  # trailing newline
+            yield sha, data
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+        writer.join()
@@ -0,0 +1,73 @@
+"""
+Persistent HTTP response cache for the crawler.
+
+For every crawled URL the cache keeps the ``ETag`` and ``Last-Modified``
+validators together with the extracted text and links. Re-crawls send them
+back as ``If-None-Match`` / ``If-Modified-Since``; a ``304 Not Modified``
+answer then reuses the cached text and links without downloading, parsing or
+re-embedding the page. Entries are stored in a size-bounded ``diskcache``
+that evicts least recently used entries first.
+"""
+
+import threading
+import time
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+HTTP_CACHE_DIR = "http_cache"
+DEFAULT_SIZE_LIMIT_MB = 1024
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class HttpCache:
+    """URL -> validators, extracted text and links of the last successful fetch."""
+
+    def __init__(self, directory=HTTP_CACHE_DIR, size_limit_mb=DEFAULT_SIZE_LIMIT_MB):
+        self._cache = diskcache.Cache(
+            directory,
+            size_limit=int(size_limit_mb) * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+
+    def get(self, url):
+        return self._cache.get(url)
+
+    def set(self, url, etag, last_modified, text, links):
+        """Store a fetch; responses without validators cannot be revalidated and are skipped."""
+        if not etag and not last_modified:
+            return
+        self._cache.set(url, {
+            "etag": etag,
+            "last_modified": last_modified,
+            "text": text,
+            "links": links,
+            "fetched_at": time.time(),
+        })
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Request headers revalidating a cached ``entry``."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def close(self):
+        self._cache.close()
+
+
+def get_http_cache(directory=HTTP_CACHE_DIR, size_limit_mb=DEFAULT_SIZE_LIMIT_MB):
+    """Return the process-wide cache for ``directory``, or None if diskcache is missing."""
+    if diskcache is None:
+        return None
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = HttpCache(directory, size_limit_mb)
+        return _caches[directory]
@@ -0,0 +1,118 @@
+"""
+Process-wide cache of opened indices.
+
+Streamlit re-runs the chat scripts on every interaction, but imported modules
+live for the whole server process, so every session shares this cache. An
+entry is reused while the index ``manifest.json`` keeps the same mtime, which
+costs one ``stat`` per query instead of re-reading the index. Entries are
+evicted least recently used first once their estimated size exceeds the
+memory budget.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from src.index_store import MANIFEST_FILE, index_path, open_index
+
+DEFAULT_BUDGET_MB = 4096
+
+
+def estimate_index_bytes(collection):
+    """Approximate resident size of an opened index once it has been paged in."""
+    total = 0
+    for segment in collection["segments"]:
+        if segment.get("quantized") is not None:
+            # Only rescored rows of the float32 matrix are paged in.
+            total += segment["quantized"].nbytes
+        else:
+            total += segment["embeddings"].nbytes
+        total += segment["documents"].nbytes
+        # Parsed metadata dicts take several times their JSON size.
+        total += 4 * segment["info"]["metadata_bytes"]
+        if segment.get("ann") is not None:
+            total += segment["ann"].nbytes
+        if segment.get("bm25") is not None:
+            total += segment["bm25"].nbytes
+    return total
+
+
+class IndexCache:
+    """LRU cache of ``open_index`` results keyed by index path, validated by manifest mtime."""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_bytes = int(budget_mb) * 1024 * 1024
+        self._entries = OrderedDict()  # key -> ((mtime_ns, inode), collection, size)
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size_bytes(self):
+        return sum(size for _, _, size in self._entries.values())
+
+    def get(self, index_dir, index_name, ef_search=None):
+        """
+        Return the opened index, loading it if it is missing or changed on disk.
+
+        Raises:
+            FileNotFoundError: If the index does not exist.
+        """
+        path = index_path(index_dir, index_name)
+        key = (os.path.abspath(path), ef_search)
+        stat = os.stat(os.path.join(path, MANIFEST_FILE))
+        mtime = (stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Concurrent sessions asking for the same index wait for one load.
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == mtime:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+            collection = open_index(index_dir, index_name, ef_search)
+            size = estimate_index_bytes(collection)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = (mtime, collection, size)
+                self._entries.move_to_end(key)
+                self._evict(keep=key)
+            return collection
+
+    def _evict(self, keep):
+        while self.size_bytes > self.budget_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            del self._entries[oldest]
+
+    def set_budget(self, budget_mb):
+        with self._lock:
+            self.budget_bytes = int(budget_mb) * 1024 * 1024
+            if self._entries:
+                self._evict(keep=next(reversed(self._entries)))
+
+    def invalidate(self, index_dir, index_name):
+        path = os.path.abspath(index_path(index_dir, index_name))
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+
+_index_cache = IndexCache()
+
+
+def get_cached_index(index_dir, index_name, ef_search=None, budget_mb=None):
+    """Open an index through the process-wide cache."""
+    if budget_mb is not None and int(budget_mb) * 1024 * 1024 != _index_cache.budget_bytes:
+        _index_cache.set_budget(budget_mb)
+    return _index_cache.get(index_dir, index_name, ef_search)
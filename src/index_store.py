@@ -0,0 +1,736 @@
+"""
+On-disk index format shared by the PDF Chat and GitHub & URL Chat tabs.
+
+An index lives in ``indices/<name>/`` and is a list of immutable segments
+plus a ``manifest.json``. Each segment directory holds:
+
+- ``embeddings.npy``: contiguous, L2-normalized float32 matrix, opened with ``np.memmap``
+- ``documents.jsonl``: one JSON-encoded document per line
+- ``offsets.npy``: byte offset of every line of ``documents.jsonl``
+- ``meta.json``: row count, dimension and the per-row metadata
+- ``ann.faiss`` / ``ann.hnsw``: optional ANN graph for large segments (see ``src.ann``)
+- ``codes.npy`` / ``codebook.npy``: optional quantized embeddings kept in RAM (see ``src.quantization``)
+- ``bm25_*``: BM25 postings of the documents for hybrid retrieval (see ``src.bm25``)
+
+The manifest lists the segments, the live row ranges of every document path
+and the tombstoned ranges of each segment. Adding, updating or deleting
+documents appends a new segment and tombstones the rows it replaces, so the
+cost is proportional to the change; ``compact_index`` later merges segments
+and drops tombstoned rows in the background.
+
+A rebuild that is committed in several steps writes its segments next to the
+live ones but lists them in ``staging.json`` instead of the manifest
+(``IndexWriter(..., staged=True)``). Readers keep seeing the old index until
+:func:`promote_staged` swaps the staged manifest in, and a rebuild that is
+abandoned leaves the live index untouched.
+
+Opening an index only reads the manifest and segment ``meta.json`` files;
+embeddings and documents are paged in by the OS when they are touched. Legacy
+``indices/<name>.pkl`` files are converted on first listing, or explicitly
+with ``python -m src.index_store``.
+"""
+
+import json
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from src.ann import build_ann, load_ann
+from src.bm25 import BM25Builder, load_bm25
+from src.quantization import build_quantized, load_quantized
+from src.retrieval import normalize
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+STAGING_FILE = "staging.json"
+LOCK_FILE = ".lock"
+META_FILE = "meta.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+OFFSETS_FILE = "offsets.npy"
+
+# Fixed size of the .npy header so the final shape can be patched in place.
+_NPY_HEADER_SIZE = 128
+# Rows copied at a time when compacting segments.
+_COPY_BATCH = 4096
+
+_lock = threading.RLock()
+_compacting = set()
+logger = logging.getLogger(__name__)
+
+
+class _NpyAppender:
+    """Append rows to a 2-D .npy file without knowing the row count up front."""
+
+    def __init__(self, path, dim, dtype=np.float32):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._file = open(path, "wb")
+        self._file.write(self._header(0))
+
+    def _header(self, rows):
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (rows, self.dim),
+        })
+        header = header.ljust(_NPY_HEADER_SIZE - 11) + "\n"
+        return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+    def append(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape(-1, self.dim)
+        self._file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header(self.rows))
+        self._file.close()
+
+
+def _ranges(rows):
+    """Collapse sorted row numbers into ``[start, end)`` ranges."""
+    rows = np.asarray(rows, dtype=np.int64)
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = np.concatenate(([rows[0]], rows[breaks]))
+    ends = np.concatenate((rows[breaks - 1], [rows[-1]])) + 1
+    return [[int(start), int(end)] for start, end in zip(starts, ends)]
+
+
+def _mask(count, ranges):
+    mask = np.zeros(count, dtype=bool)
+    for start, end in ranges:
+        mask[start:end] = True
+    return mask
+
+
+class SegmentWriter:
+    """
+    Stream rows into one immutable segment directory.
+
+    ``ann_config`` holds the settings used when the segment is closed: the
+    ANN keys of ``src.ann`` and the quantization keys of ``src.quantization``.
+    """
+
+    def __init__(self, path, ann_config=None):
+        self.path = path
+        self.ann_config = ann_config
+        self.metadata = []
+        self.path_ranges = {}
+        os.makedirs(path)
+        self._embeddings = None
+        self._documents = open(os.path.join(path, DOCUMENTS_FILE), "wb")
+        self._offsets = [0]
+        self._bm25 = BM25Builder()
+
+    @property
+    def rows(self):
+        return len(self.metadata)
+
+    def add_batch(self, embeddings, documents, metadata):
+        """Append a batch of rows; embeddings are L2-normalized before they are stored."""
+        embeddings = normalize(embeddings)
+        if embeddings.ndim != 2 or not len(embeddings) == len(documents) == len(metadata):
+            raise ValueError("embeddings, documents and metadata must have matching lengths")
+        if self._embeddings is None:
+            self._embeddings = _NpyAppender(os.path.join(self.path, EMBEDDINGS_FILE), embeddings.shape[1])
+        elif embeddings.shape[1] != self._embeddings.dim:
+            raise ValueError(
+                f"Embedding dimension {embeddings.shape[1]} does not match index dimension {self._embeddings.dim}"
+            )
+        self._embeddings.append(embeddings)
+        for document in documents:
+            line = json.dumps(document).encode("utf-8") + b"\n"
+            self._documents.write(line)
+            self._offsets.append(self._offsets[-1] + len(line))
+        self._bm25.add(str(document) for document in documents)
+        for meta in metadata:
+            row = len(self.metadata)
+            ranges = self.path_ranges.setdefault(meta["path"], [])
+            if ranges and ranges[-1][1] == row:
+                ranges[-1][1] = row + 1
+            else:
+                ranges.append([row, row + 1])
+            self.metadata.append(meta)
+
+    def close(self):
+        """Finish the segment files and build its ANN graph, codes and BM25 index; returns the segment meta."""
+        self._documents.close()
+        if self._embeddings is None:
+            self._embeddings = _NpyAppender(os.path.join(self.path, EMBEDDINGS_FILE), 0)
+        self._embeddings.close()
+        np.save(os.path.join(self.path, OFFSETS_FILE), np.asarray(self._offsets, dtype=np.int64))
+        ann = quantization = bm25 = None
+        if self._embeddings.rows:
+            embeddings = np.load(os.path.join(self.path, EMBEDDINGS_FILE), mmap_mode="r")
+            ann = build_ann(embeddings, self.path, self.ann_config)
+            if ann is None:  # segments with an ANN graph are never scanned
+                quantization = build_quantized(embeddings, self.path, self.ann_config)
+            del embeddings
+            bm25 = self._bm25.save(self.path)
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "count": self._embeddings.rows,
+            "dim": self._embeddings.dim,
+            "normalized": True,
+            "ann": ann,
+            "quantization": quantization,
+            "bm25": bm25,
+        }
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({**meta, "metadata": self.metadata}, f)
+        return meta
+
+    def abort(self):
+        """Discard everything written so far."""
+        self._documents.close()
+        if self._embeddings is not None:
+            self._embeddings._file.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class DocumentStore:
+    """Read-only sequence over ``documents.jsonl`` that decodes lines on demand."""
+
+    def __init__(self, path, offsets):
+        self._offsets = offsets
+        self._mmap = None
+        if len(offsets) > 1 and offsets[-1] > 0:
+            with open(path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    @property
+    def nbytes(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("document index out of range")
+        return json.loads(self._mmap[self._offsets[i]:self._offsets[i + 1]])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def open_segment(path, ef_search=None):
+    """
+    Open one segment without reading its embeddings or documents into memory.
+
+    Returns:
+        dict: ``embeddings`` (read-only float32 memmap), ``documents``
+        (:class:`DocumentStore`), ``metadata`` (list), ``info`` (dict),
+        ``ann`` (:class:`src.ann.AnnIndex` or None), ``quantized``
+        (:class:`src.quantization.QuantizedEmbeddings` or None) and ``bm25``
+        (:class:`src.bm25.BM25Index` or None for older segments).
+    """
+    with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+        info = json.load(f)
+    metadata = info.pop("metadata")
+    info["metadata_bytes"] = os.path.getsize(os.path.join(path, META_FILE))
+    if info["count"]:
+        embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+    else:
+        embeddings = np.empty((0, info["dim"]), dtype=np.float32)
+    offsets = np.load(os.path.join(path, OFFSETS_FILE))
+    return {
+        "embeddings": embeddings,
+        "documents": DocumentStore(os.path.join(path, DOCUMENTS_FILE), offsets),
+        "metadata": metadata,
+        "info": info,
+        "ann": load_ann(path, info, ef_search),
+        "quantized": load_quantized(path, info),
+        "bm25": load_bm25(path, info),
+    }
+
+
+# Manifest handling
+def index_path(index_dir, index_name):
+    return os.path.join(index_dir, index_name)
+
+
+def _new_segment_name():
+    return f"seg-{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:6]}"
+
+
+def _new_manifest(info=None):
+    return {"format_version": FORMAT_VERSION, "generation": 0, "info": dict(info or {}), "segments": [], "paths": {}}
+
+
+@contextmanager
+def _locked(path):
+    """Serialize manifest updates across threads and processes."""
+    with _lock:
+        with open(os.path.join(path, LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest(path, file_name=MANIFEST_FILE):
+    with open(os.path.join(path, file_name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(path, manifest, file_name=MANIFEST_FILE):
+    tmp_path = os.path.join(path, f".{file_name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(path, file_name))
+
+
+def _tombstone_paths(manifest, paths):
+    """Tombstone the live rows of ``paths`` and drop them from the path table."""
+    segments = {segment["name"]: segment for segment in manifest["segments"]}
+    for path in paths:
+        for name, start, end in manifest["paths"].pop(path, []):
+            segments[name]["tombstones"].append([start, end])
+            segments[name]["deleted"] += end - start
+
+
+def _remove_segments(path, names):
+    for name in names:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+class IndexWriter:
+    """
+    Write documents into an index as one new segment.
+
+    By default the segment replaces the whole index. With ``append=True`` it is
+    added to the existing segments instead: rows of any path written again, or
+    passed to :meth:`delete`, are tombstoned, so adding or updating a handful
+    of documents does not rewrite the rest of the index. The manifest is only
+    swapped on ``close()``, so readers never see a half-written index.
+
+    With ``staged=True`` the writer commits to the staged rebuild instead of
+    the live manifest (see :func:`promote_staged`); ``append`` then adds to
+    or replaces the staged segments.
+    """
+
+    def __init__(self, index_dir, index_name, info=None, ann_config=None, append=False, staged=False):
+        self.path = index_path(index_dir, index_name)
+        self.info = dict(info or {})
+        self.append = append
+        self.manifest_file = STAGING_FILE if staged else MANIFEST_FILE
+        self.segment_name = _new_segment_name()
+        os.makedirs(self.path, exist_ok=True)
+        self._tmp_path = os.path.join(self.path, f".{self.segment_name}.tmp")
+        self._segment = SegmentWriter(self._tmp_path, ann_config)
+        self._deleted = set()
+        self._dropped = []  # row ranges of this segment removed by delete()
+        self._aliases = {}
+
+    @property
+    def metadata(self):
+        return self._segment.metadata
+
+    def add(self, embedding, document, metadata):
+        """Append one row; ``embedding`` may be any 1-D float sequence."""
+        self.add_batch([embedding], [document], [metadata])
+
+    def add_batch(self, embeddings, documents, metadata):
+        """Append a batch of rows."""
+        self._segment.add_batch(embeddings, documents, metadata)
+
+    def delete(self, paths):
+        """
+        Remove every row of ``paths`` from the index when the writer is closed,
+        including rows this writer added so far; rows added afterwards are kept.
+        """
+        for path in paths:
+            self._deleted.add(path)
+            self._dropped.extend(self._segment.path_ranges.pop(path, ()))
+
+    def alias(self, path, original):
+        """Record ``path`` as a duplicate of ``original`` instead of indexing it; see :func:`open_index`."""
+        self._deleted.add(path)
+        self._aliases[path] = original
+
+    def close(self):
+        """Commit the new segment and tombstones to the manifest."""
+        segment_meta = None
+        if self._segment.rows:
+            segment_meta = self._segment.close()
+            os.rename(self._tmp_path, os.path.join(self.path, self.segment_name))
+        else:
+            self._segment.abort()
+
+        obsolete = []
+        with _locked(self.path):
+            try:
+                manifest = read_manifest(self.path, self.manifest_file)
+            except FileNotFoundError:
+                manifest = _new_manifest()
+            if not self.append:
+                obsolete = [segment["name"] for segment in manifest["segments"]]
+                manifest = {**_new_manifest(manifest["info"]), "generation": manifest["generation"]}
+            manifest["info"].update(self.info)
+            _tombstone_paths(manifest, self._deleted | set(self._segment.path_ranges))
+            aliases = {
+                path: original for path, original in manifest.get("aliases", {}).items()
+                if path not in self._deleted and path not in self._segment.path_ranges
+            }
+            aliases.update(self._aliases)
+            if segment_meta is not None:
+                manifest["segments"].append({
+                    "name": self.segment_name,
+                    "count": segment_meta["count"],
+                    "dim": segment_meta["dim"],
+                    "tombstones": sorted(self._dropped),
+                    "deleted": sum(end - start for start, end in self._dropped),
+                })
+                for doc_path, ranges in self._segment.path_ranges.items():
+                    manifest["paths"][doc_path] = [[self.segment_name, start, end] for start, end in ranges]
+            # Aliases of documents that are gone (deleted, or failed to embed) go too.
+            manifest["aliases"] = {path: original for path, original in aliases.items() if original in manifest["paths"]}
+            manifest["generation"] += 1
+            _write_manifest(self.path, manifest, self.manifest_file)
+        _remove_segments(self.path, obsolete)
+
+    def abort(self):
+        """Discard everything written so far."""
+        self._segment.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def list_indices(index_dir):
+    """Return the names of all indices stored in ``index_dir``."""
+    migrate_pickle_indices(index_dir)
+    names = []
+    for name in sorted(os.listdir(index_dir)):
+        path = os.path.join(index_dir, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        if not os.path.isfile(os.path.join(path, MANIFEST_FILE)) and os.path.isfile(os.path.join(path, META_FILE)):
+            _upgrade_single_segment_index(path)
+        if os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+            names.append(name)
+    return names
+
+
+def has_staged(index_dir, index_name):
+    """Whether an index has a staged rebuild waiting for :func:`promote_staged`."""
+    return os.path.isfile(os.path.join(index_path(index_dir, index_name), STAGING_FILE))
+
+
+def promote_staged(index_dir, index_name, info=None):
+    """
+    Make the staged rebuild of an index the live index in one manifest swap.
+
+    ``info`` is recorded in the new manifest. Segments of the old index are
+    removed afterwards; readers that still have them open keep working.
+
+    Returns:
+        bool: False if there was no staged rebuild.
+    """
+    path = index_path(index_dir, index_name)
+    with _locked(path):
+        try:
+            staged = read_manifest(path, STAGING_FILE)
+        except FileNotFoundError:
+            return False
+        try:
+            live = read_manifest(path)
+        except FileNotFoundError:
+            live = _new_manifest()
+        staged["info"].update(info or {})
+        # The generation keeps counting up across the swap.
+        staged["generation"] = live["generation"] + 1
+        _write_manifest(path, staged)
+        os.remove(os.path.join(path, STAGING_FILE))
+    kept = {segment["name"] for segment in staged["segments"]}
+    _remove_segments(path, [segment["name"] for segment in live["segments"] if segment["name"] not in kept])
+    return True
+
+
+def list_index_paths(index_dir, index_name):
+    """Return the document paths currently live in an index, duplicates recorded as aliases included."""
+    manifest = read_manifest(index_path(index_dir, index_name))
+    return sorted(set(manifest["paths"]) | set(manifest.get("aliases", {})))
+
+
+def write_index(index_dir, index_name, embeddings, documents, metadata, info=None, ann_config=None):
+    """Write a complete index in one call."""
+    with IndexWriter(index_dir, index_name, info, ann_config) as writer:
+        if len(documents):
+            writer.add_batch(embeddings, documents, metadata)
+
+
+def delete_documents(index_dir, index_name, paths):
+    """Tombstone every row of ``paths`` in an index."""
+    with IndexWriter(index_dir, index_name, append=True) as writer:
+        writer.delete(paths)
+
+
+def open_index(index_dir, index_name, ef_search=None):
+    """
+    Open every segment of an index without reading embeddings or documents.
+
+    Parameters:
+        ef_search (int): Overrides the HNSW search breadth stored with the segments.
+
+    Returns:
+        dict: ``name``, ``info`` (manifest info plus live ``count``, ``dim``
+        and ``generation``), ``segments``: the :func:`open_segment` dicts,
+        each with its ``name`` and a boolean ``deleted`` row mask (or None),
+        and ``aliases``: indexed path -> paths of its near-duplicates.
+
+    Raises:
+        FileNotFoundError: If the index does not exist.
+    """
+    path = index_path(index_dir, index_name)
+    for attempt in range(3):
+        manifest = read_manifest(path)
+        try:
+            segments = []
+            for entry in manifest["segments"]:
+                segment = open_segment(os.path.join(path, entry["name"]), ef_search)
+                segment["name"] = entry["name"]
+                segment["deleted"] = _mask(entry["count"], entry["tombstones"]) if entry["deleted"] else None
+                segments.append(segment)
+            break
+        except FileNotFoundError:
+            # A compaction removed a segment between reading the manifest and opening it.
+            if attempt == 2:
+                raise
+    info = {
+        **manifest["info"],
+        "count": sum(entry["count"] - entry["deleted"] for entry in manifest["segments"]),
+        "dim": manifest["segments"][0]["dim"] if manifest["segments"] else None,
+        "generation": manifest["generation"],
+    }
+    aliases = {}
+    for alias, original in manifest.get("aliases", {}).items():
+        aliases.setdefault(original, []).append(alias)
+    return {"name": index_name, "info": info, "segments": segments, "aliases": aliases}
+
+
+# Compaction
+def compact_index(index_dir, index_name, ann_config=None):
+    """
+    Merge all segments of an index into one and drop tombstoned rows.
+
+    The merged segment is written without holding the manifest lock; writes
+    committed meanwhile are kept, and rows they replaced are tombstoned in the
+    merged segment.
+
+    Returns:
+        bool: False if there was nothing to compact.
+    """
+    path = index_path(index_dir, index_name)
+    with _locked(path):
+        snapshot = read_manifest(path)
+    if len(snapshot["segments"]) < 2 and not any(entry["deleted"] for entry in snapshot["segments"]):
+        return False
+
+    new_name = _new_segment_name()
+    tmp_path = os.path.join(path, f".{new_name}.tmp")
+    writer = SegmentWriter(tmp_path, ann_config)
+    row_maps = {}
+    try:
+        for entry in snapshot["segments"]:
+            segment = open_segment(os.path.join(path, entry["name"]))
+            live_rows = np.flatnonzero(~_mask(entry["count"], entry["tombstones"]))
+            row_map = np.full(entry["count"], -1, dtype=np.int64)
+            row_map[live_rows] = writer.rows + np.arange(len(live_rows))
+            for start in range(0, len(live_rows), _COPY_BATCH):
+                rows = live_rows[start:start + _COPY_BATCH]
+                writer.add_batch(
+                    segment["embeddings"][rows],
+                    [segment["documents"][row] for row in rows],
+                    [segment["metadata"][row] for row in rows],
+                )
+            row_maps[entry["name"]] = row_map
+        segment_meta = writer.close() if writer.rows else None
+    except Exception:
+        writer.abort()
+        raise
+    if segment_meta is None:
+        writer.abort()
+    else:
+        os.rename(tmp_path, os.path.join(path, new_name))
+
+    with _locked(path):
+        manifest = read_manifest(path)
+        paths = {}
+        for doc_path, ranges in manifest["paths"].items():
+            moved = []
+            for name, start, end in ranges:
+                if name in row_maps:
+                    moved.extend([new_name, a, b] for a, b in _ranges(row_maps[name][start:end]))
+                else:
+                    moved.append([name, start, end])
+            paths[doc_path] = moved
+        segments = [entry for entry in manifest["segments"] if entry["name"] not in row_maps]
+        if segment_meta is not None:
+            live = _mask(segment_meta["count"], [
+                [start, end] for ranges in paths.values() for name, start, end in ranges if name == new_name
+            ])
+            segments.insert(0, {
+                "name": new_name,
+                "count": segment_meta["count"],
+                "dim": segment_meta["dim"],
+                "tombstones": _ranges(np.flatnonzero(~live)),
+                "deleted": int((~live).sum()),
+            })
+        manifest["segments"] = segments
+        manifest["paths"] = paths
+        manifest["generation"] += 1
+        _write_manifest(path, manifest)
+    _remove_segments(path, row_maps)
+    return True
+
+
+def needs_compaction(index_dir, index_name, max_segments=8, max_deleted_ratio=0.3):
+    """Whether an index has too many segments or too many tombstoned rows."""
+    manifest = read_manifest(index_path(index_dir, index_name))
+    total = sum(entry["count"] for entry in manifest["segments"])
+    deleted = sum(entry["deleted"] for entry in manifest["segments"])
+    return len(manifest["segments"]) > max_segments or (total > 0 and deleted / total > max_deleted_ratio)
+
+
+def maybe_compact(index_dir, index_name, ann_config=None, max_segments=8, max_deleted_ratio=0.3):
+    """
+    Start a background compaction thread if the index needs one.
+
+    Returns:
+        bool: True if a compaction was started.
+    """
+    key = os.path.abspath(index_path(index_dir, index_name))
+    with _lock:
+        if key in _compacting or not needs_compaction(index_dir, index_name, max_segments, max_deleted_ratio):
+            return False
+        _compacting.add(key)
+
+    def run():
+        try:
+            compact_index(index_dir, index_name, ann_config)
+        except Exception:
+            logger.exception("Compaction of index '%s' failed", index_name)
+        finally:
+            with _lock:
+                _compacting.discard(key)
+
+    threading.Thread(target=run, name=f"compact-{index_name}", daemon=True).start()
+    return True
+
+
+# Migration of older on-disk formats
+def _upgrade_single_segment_index(path):
+    """Move a format-1 index (segment files at the top level) into its first segment."""
+    with _locked(path):
+        if os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+            return
+        name = _new_segment_name()
+        segment_path = os.path.join(path, name)
+        os.makedirs(segment_path)
+        for file_name in os.listdir(path):
+            if file_name not in (name, LOCK_FILE):
+                os.rename(os.path.join(path, file_name), os.path.join(segment_path, file_name))
+        with open(os.path.join(segment_path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        segment_fields = ("format_version", "count", "dim", "normalized", "ann", "quantization", "bm25", "metadata")
+        manifest = _new_manifest({key: value for key, value in meta.items() if key not in segment_fields})
+        manifest["segments"].append({"name": name, "count": meta["count"], "dim": meta["dim"], "tombstones": [], "deleted": 0})
+        for row, row_meta in enumerate(meta["metadata"]):
+            ranges = manifest["paths"].setdefault(row_meta["path"], [])
+            if ranges and ranges[-1][2] == row:
+                ranges[-1][2] = row + 1
+            else:
+                ranges.append([name, row, row + 1])
+        manifest["generation"] = 1
+        _write_manifest(path, manifest)
+
+
+def migrate_pickle_index(index_dir, pickle_path):
+    """
+    Convert one legacy pickle index to the columnar format.
+
+    Rows whose embedding dimension differs from the first row are dropped, as
+    the old query code already ignored them. The pickle is kept with a
+    ``.migrated`` suffix.
+
+    Returns:
+        tuple: (index name, rows written, rows dropped)
+    """
+    index_name = os.path.basename(pickle_path)[:-len(".pkl")]
+    with open(pickle_path, "rb") as f:
+        collection = pickle.load(f)
+
+    embeddings, documents, metadata = [], [], []
+    dim = len(collection["embeddings"][0]) if collection["embeddings"] else 0
+    for embedding, document, meta in zip(
+        collection["embeddings"], collection["documents"], collection["metadata"]
+    ):
+        if len(embedding) == dim:
+            embeddings.append(embedding)
+            documents.append(document)
+            metadata.append(meta)
+
+    # A pickle without rows becomes an empty index.
+    write_index(
+        index_dir, index_name, np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), dim),
+        documents, metadata, info={"migrated_from": os.path.basename(pickle_path)},
+    )
+    os.rename(pickle_path, pickle_path + ".migrated")
+    return index_name, len(documents), len(collection["embeddings"]) - len(documents)
+
+
+def migrate_pickle_indices(index_dir):
+    """
+    Convert every ``<name>.pkl`` in ``index_dir``; returns the migration results.
+
+    A pickle that cannot be converted is logged and left in place, so it does
+    not keep the other indices from being listed or migrated.
+    """
+    results = []
+    for file_name in sorted(os.listdir(index_dir)):
+        if file_name.endswith(".pkl"):
+            try:
+                results.append(migrate_pickle_index(index_dir, os.path.join(index_dir, file_name)))
+            except Exception:
+                logger.exception("Migration of legacy index '%s' failed", file_name)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else "indices"
+    for name, written, dropped in migrate_pickle_indices(target_dir):
+        print(f"Migrated '{name}': {written} rows written, {dropped} rows dropped.")
@@ -0,0 +1,147 @@
+"""
+Indexing loop shared by the PDF Chat and GitHub & URL Chat tabs.
+
+Documents are chunked (source files at definition boundaries, see
+``src.code_chunking``), the chunks are embedded in batches through an
+``EmbeddingClient`` (consulting the shared embedding cache first) and the
+resulting rows are appended to an ``IndexWriter``. Near-duplicate documents
+are not embedded at all: ``src.dedup`` sets them aside and the writer records
+them as aliases of the copy that was kept.
+
+The stages are streamed: a background thread pulls documents (which may come
+straight from ``src.extraction.iter_documents``) and chunks them into
+batches, and a bounded queue hands the batches to the embedding stage. Only a
+few batches and the document being chunked are held in memory, whatever the
+size of the upload, and embedding overlaps extraction.
+"""
+
+import queue
+import threading
+
+from src.code_chunking import chunk_document
+from src.dedup import NearDuplicateIndex, dedup_documents
+from src.embedding_cache import embed_cached
+
+DEFAULT_PREFETCH = 2
+
+
+def prefetch(iterable, depth=DEFAULT_PREFETCH):
+    """
+    Iterate ``iterable`` in a background thread, buffering at most ``depth`` items.
+
+    Exceptions raised by the producer are re-raised in the consumer. If the
+    consumer stops early the producer is stopped at its next item.
+    """
+    items = queue.Queue(maxsize=max(1, int(depth)))
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((None, item)):
+                    return
+        except BaseException as e:
+            put((e, None))
+        finally:
+            put((None, done))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            error, item = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_chunk_batches(documents, config, batch_size, stats):
+    """Chunk (path, text) pairs and yield lists of ``batch_size`` (path, chunk) pairs."""
+    pending = []
+    for path, content in documents:
+        stats["documents"] += 1
+        chunks = chunk_document(
+            path, content, config["chunk_size"], config["chunk_overlap"], config.get("code_aware_chunking", True)
+        )
+        for chunk in chunks:
+            pending.append((path, chunk))
+            if len(pending) >= batch_size:
+                yield pending
+                pending = []
+    if pending:
+        yield pending
+
+
+def chunk_metadata(path, chunk):
+    """Metadata row of a chunk; source-file chunks also record their symbol and lines."""
+    metadata = {"path": path, "chunk": chunk["chunk"], "start": chunk["start"], "end": chunk["end"]}
+    for key in ("symbol", "start_line", "end_line"):
+        if chunk.get(key) is not None:
+            metadata[key] = chunk[key]
+    return metadata
+
+
+def index_documents(writer, data, client, config, cache=None, progress=None, near_duplicates=None):
+    """
+    Chunk, embed and write every document in ``data``.
+
+    Parameters:
+        writer (IndexWriter): Destination index.
+        data (dict or iterable): Document path or URL -> text, or an iterable
+            of (path, text) pairs consumed lazily.
+        client (EmbeddingClient): Client used for the embeddings.
+        config (dict): Settings providing ``chunk_size``, ``chunk_overlap``,
+            ``code_aware_chunking``, ``dedup_documents`` and ``dedup_threshold``.
+        cache (EmbeddingCache): Optional embedding cache.
+        progress (callable): Called with the running stats after every batch;
+            an exception it raises stops indexing.
+        near_duplicates (NearDuplicateIndex): Documents already seen, to
+            deduplicate across several calls; a new one is used by default.
+
+    Returns:
+        dict: ``documents`` and ``chunks`` written, ``cache_hits`` and
+        ``cache_misses``, ``failed`` paths with the error that prevented
+        them from being embedded (deleted from the index, so none of their
+        chunks are left), and ``duplicates``: paths recorded as
+        aliases of an identical or near-identical document instead of being
+        embedded (duplicate path -> path kept).
+    """
+    stats = {"documents": 0, "chunks": 0, "cache_hits": 0, "cache_misses": 0, "failed": {}, "duplicates": {}}
+    documents = data.items() if isinstance(data, dict) else data
+    if config.get("dedup_documents", True):
+        near_duplicates = near_duplicates or NearDuplicateIndex(config.get("dedup_threshold", 0.9))
+        documents = dedup_documents(documents, near_duplicates, stats["duplicates"])
+    flush_size = client.batch_size * client.concurrency
+
+    batches = iter_chunk_batches(documents, config, flush_size, stats)
+    for pending in prefetch(batches, config.get("ingest_prefetch_batches", DEFAULT_PREFETCH)):
+        texts = [chunk["text"] for _, chunk in pending]
+        try:
+            embeddings = embed_cached(client, texts, cache, stats)
+        except Exception as e:
+            for path, _ in pending:
+                stats["failed"][path] = str(e)
+        else:
+            writer.add_batch(embeddings, texts, [chunk_metadata(path, chunk) for path, chunk in pending])
+            stats["chunks"] += len(pending)
+        if progress is not None:
+            progress(stats)
+    # Earlier batches may have written part of a failed document; drop it all.
+    writer.delete(stats["failed"])
+    for path, original in stats["duplicates"].items():
+        writer.alias(path, original)
+    return stats
@@ -0,0 +1,513 @@
+"""
+Background indexing jobs.
+
+Indexing is submitted as a job instead of running inside the Streamlit
+script, so a large index no longer blocks the session and survives reruns
+and browser refreshes. Jobs live in a SQLite table (``jobs/jobs.db``) and are
+run in submission order by a small pool of worker threads in the server
+process; uploads are copied under ``jobs/uploads/`` at submission.
+
+A job commits what it has indexed every ``job_checkpoint_seconds`` as an
+appended index segment and records the documents it covered. A job that is
+interrupted (server restart, crash) is queued again at the next start and
+skips the documents of its checkpoints; the near-duplicate index is saved
+with every checkpoint, so later copies of documents indexed before the
+interruption are still recognised as duplicates. Counters written while the job runs
+give live throughput and an ETA (:func:`job_progress`). A job that rebuilds
+an index from scratch commits its checkpoints to a staged rebuild (see
+``src.index_store.promote_staged``); queries keep using the old index until
+the job completes, and a cancelled or failed rebuild leaves it untouched.
+
+Interactive queries take precedence: while one is running inside
+:func:`interactive_query`, jobs hold back their next embedding batch, job
+threads run at a lower CPU priority, and jobs use their own, smaller
+embedding concurrency (``job_embedding_concurrency``).
+
+Each job kind (uploads, repository, crawl) registers a planner with
+:func:`register_job_kind`. The planner is called with the job and the set of
+documents already done and returns a dict with ``documents`` (iterable of
+(path, text) pairs, done ones left out), ``total`` (number of documents, or
+None), ``append``, ``deleted`` (paths removed before the first checkpoint),
+``info`` (recorded in the index manifest once the job completes) and
+optionally ``state`` (persisted with the job for a resume) and ``messages``
+(a callable returning notes to show once the job ends: strings, or tables as
+dicts of column name -> values).
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from src.dedup import NearDuplicateIndex
+from src.embedding_cache import get_embedding_cache
+from src.embeddings import OLLAMA_API_URL, get_embedding_client
+from src.index_store import IndexWriter, has_staged, maybe_compact, promote_staged
+from src.indexing import index_documents
+
+JOBS_DIR = "jobs"
+JOBS_DB = os.path.join(JOBS_DIR, "jobs.db")
+UPLOADS_DIR = os.path.join(JOBS_DIR, "uploads")
+ACTIVE_STATUSES = ("queued", "running", "cancelling")
+DEFAULT_JOB_CONFIG = {
+    "jobs_max_concurrent": 1,
+    "job_checkpoint_seconds": 30,
+    "job_embedding_concurrency": 2,
+}
+# Niceness of job threads (Linux applies it per thread; child processes inherit it).
+JOB_NICENESS = 10
+# Longest a job waits for interactive queries before embedding its next batch.
+MAX_QUERY_WAIT = 30.0
+_PROGRESS_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    index_name TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    error TEXT,
+    messages TEXT NOT NULL DEFAULT '[]',
+    total INTEGER,
+    documents INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    duplicates INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    cache_misses INTEGER NOT NULL DEFAULT 0,
+    checkpoints INTEGER NOT NULL DEFAULT 0,
+    elapsed REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_documents (
+    job_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (job_id, path)
+);
+"""
+_JSON_FIELDS = ("params", "state", "messages")
+# Columns added after the first release, created on stores that predate them.
+_ADDED_COLUMNS = {
+    "cache_hits": "INTEGER NOT NULL DEFAULT 0",
+    "cache_misses": "INTEGER NOT NULL DEFAULT 0",
+}
+
+_kinds = {}
+_runners = {}
+_runners_lock = threading.Lock()
+_queries = threading.Condition()
+_active_queries = 0
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def register_job_kind(kind, planner):
+    """Register the planner of a job kind; see the module docstring."""
+    _kinds[kind] = planner
+
+
+@contextmanager
+def interactive_query():
+    """Mark an interactive query as running, so indexing jobs hold back meanwhile."""
+    global _active_queries
+    with _queries:
+        _active_queries += 1
+    try:
+        yield
+    finally:
+        with _queries:
+            _active_queries -= 1
+            _queries.notify_all()
+
+
+def _yield_to_queries(max_wait=MAX_QUERY_WAIT):
+    with _queries:
+        _queries.wait_for(lambda: _active_queries == 0, timeout=max_wait)
+
+
+def _lower_priority():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), JOB_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+class JobStore:
+    """The SQLite job table and per-job checkpoints."""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    @contextmanager
+    def _connect(self):
+        # Autocommit connections, one per call: the store is used from several threads.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in _JSON_FIELDS:
+            job[field] = json.loads(job[field])
+        return job
+
+    def submit(self, kind, index_name, params, files=()):
+        """
+        Queue a job.
+
+        Parameters:
+            params (dict): JSON-serialisable job parameters.
+            files (iterable): (file name, bytes) pairs copied to disk; their
+                names and paths are added to ``params["files"]``.
+
+        Returns:
+            int: The job id.
+        """
+        params = dict(params)
+        files = list(files)
+        if files:
+            upload_dir = os.path.join(UPLOADS_DIR, uuid.uuid4().hex)
+            os.makedirs(upload_dir)
+            params["upload_dir"] = upload_dir
+            params["files"] = []
+            for i, (name, data) in enumerate(files):
+                path = os.path.join(upload_dir, f"{i:06d}")
+                with open(path, "wb") as f:
+                    f.write(data)
+                params["files"].append([name, path])
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, index_name, params, created_at) VALUES (?, ?, ?, ?)",
+                (kind, index_name, json.dumps(params), time.time()),
+            )
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            return self._row(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, limit=20):
+        """Active jobs and the most recent finished ones, newest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?, ?) OR id IN "
+                "(SELECT id FROM jobs ORDER BY id DESC LIMIT ?) ORDER BY id DESC",
+                (*ACTIVE_STATUSES, int(limit)),
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def update(self, job_id, **fields):
+        for field in _JSON_FIELDS:
+            if field in fields:
+                fields[field] = json.dumps(fields[field])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self):
+        """Mark the oldest queued job as running and return it, or None."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?), updated_at = ? WHERE id = ?",
+                    (now, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        job = self._row(row)
+        if job is not None:
+            job["status"] = "running"
+        return job
+
+    def cancel(self, job_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+            conn.execute("UPDATE jobs SET status = 'cancelling' WHERE id = ? AND status = 'running'", (job_id,))
+
+    def retry(self, job_id):
+        """Queue a failed or cancelled job again; it resumes from its last checkpoint."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, finished_at = NULL WHERE id = ? AND status IN ('failed', 'cancelled')",
+                (job_id,),
+            )
+
+    def requeue_interrupted(self):
+        """Queue jobs left running by a server that stopped; they resume from their checkpoints."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE status = 'cancelling'", (time.time(),))
+
+    def dedup_path(self, job_id):
+        """File the near-duplicate index of a job is saved to at each checkpoint."""
+        return os.path.join(os.path.dirname(self.path) or ".", "dedup", f"{job_id}.npz")
+
+    def done_paths(self, job_id):
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT path FROM job_documents WHERE job_id = ?", (job_id,))}
+
+    def add_done_paths(self, job_id, paths):
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO job_documents (job_id, path) VALUES (?, ?)", [(job_id, path) for path in paths])
+
+    def status(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+
+def job_progress(job):
+    """
+    Throughput and ETA of a job.
+
+    Returns:
+        dict: ``fraction`` done (or None if the total is unknown),
+        ``documents_per_second``, ``embeddings_per_second`` and ``eta``
+        (seconds, or None).
+    """
+    elapsed = job["elapsed"]
+    docs_rate = job["documents"] / elapsed if elapsed > 0 else 0.0
+    chunk_rate = job["chunks"] / elapsed if elapsed > 0 else 0.0
+    fraction = eta = None
+    if job["total"]:
+        fraction = min(job["documents"] / job["total"], 1.0)
+        if docs_rate > 0:
+            eta = max(job["total"] - job["documents"], 0) / docs_rate
+    if job["status"] == "done":
+        fraction, eta = 1.0, 0.0
+    return {"fraction": fraction, "documents_per_second": docs_rate, "embeddings_per_second": chunk_rate, "eta": eta}
+
+
+def _take_for(documents, seconds, taken, exhausted):
+    """Yield from ``documents`` until ``seconds`` have passed, at a document boundary."""
+    deadline = time.monotonic() + seconds
+    for path, text in documents:
+        taken.append(path)
+        yield path, text
+        if time.monotonic() >= deadline:
+            return
+    exhausted.set()
+
+
+class JobRunner:
+    """Worker threads running the queued jobs of a :class:`JobStore`."""
+
+    def __init__(self, store, max_concurrent=1):
+        self.store = store
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = {}  # worker slot -> thread
+
+    def start(self):
+        self.store.requeue_interrupted()
+        self.resize(self.max_concurrent)
+
+    def resize(self, max_concurrent):
+        """Run up to ``max_concurrent`` jobs at once; surplus workers stop after their current job."""
+        with self._lock:
+            self.max_concurrent = max(1, int(max_concurrent))
+            for slot in range(self.max_concurrent):
+                if slot not in self._threads:
+                    thread = threading.Thread(target=self._work, args=(slot,), name=f"index-job-{slot}", daemon=True)
+                    self._threads[slot] = thread
+                    thread.start()
+        self.wake()
+
+    @property
+    def workers(self):
+        """Number of worker threads currently running."""
+        with self._lock:
+            return sum(thread.is_alive() for thread in self._threads.values())
+
+    def wake(self):
+        """Look for queued jobs now instead of at the next poll."""
+        self._wake.set()
+
+    def _work(self, slot):
+        _lower_priority()
+        while True:
+            with self._lock:
+                if slot >= self.max_concurrent:
+                    del self._threads[slot]
+                    return
+            job = self.store.claim()
+            if job is None:
+                self._wake.wait(2.0)
+                self._wake.clear()
+                continue
+            try:
+                self._run(job)
+            except JobCancelled:
+                self.store.update(job["id"], status="cancelled", finished_at=time.time())
+            except Exception as e:
+                self.store.update(job["id"], status="failed", error=str(e) or type(e).__name__, finished_at=time.time())
+
+    def _run(self, job):
+        job_id, params = job["id"], job["params"]
+        config = {**DEFAULT_JOB_CONFIG, **params["config"]}
+        if job["kind"] not in _kinds:
+            raise ValueError(f"Unknown job kind '{job['kind']}'")
+        done = self.store.done_paths(job_id)
+        plan = _kinds[job["kind"]](job, done)
+        if plan.get("state"):
+            self.store.update(job_id, state=plan["state"])
+        if plan.get("total") is not None:
+            self.store.update(job_id, total=plan["total"])
+
+        client = get_embedding_client(
+            params["embedding_model"], params.get("ollama_url", OLLAMA_API_URL),
+            batch_size=int(config["embedding_batch_size"]), concurrency=int(config["job_embedding_concurrency"]),
+        )
+        cache = get_embedding_cache(size_limit_mb=int(config["embedding_cache_mb"]))
+        near_duplicates = NearDuplicateIndex(config.get("dedup_threshold", 0.9))
+        dedup_path = self.store.dedup_path(job_id)
+        if done:
+            near_duplicates.load(dedup_path)
+        counters = {
+            field: job[field] for field in ("chunks", "duplicates", "failed", "cache_hits", "cache_misses", "elapsed")
+        }
+        # Live counts of an interrupted run may include documents that were never committed.
+        counters["documents"] = len(done)
+        failed = {}
+        base_info = {"embedding_model": params["embedding_model"]}
+        documents = iter(plan["documents"])
+        checkpoints = job["checkpoints"]
+        last_update = [time.monotonic()]
+        staged = not plan["append"]
+        if staged and checkpoints and not has_staged(params["index_dir"], job["index_name"]):
+            # Interrupted after the rebuild was promoted: its checkpoints are live already.
+            self.store.update(job_id, status="done", finished_at=time.time())
+            return
+
+        while True:
+            taken, exhausted = [], threading.Event()
+            started = time.monotonic()
+
+            def progress(stats):
+                _yield_to_queries()
+                now = time.monotonic()
+                if now - last_update[0] < _PROGRESS_INTERVAL:
+                    return
+                last_update[0] = now
+                if self.store.status(job_id) == "cancelling":
+                    raise JobCancelled()
+                self.store.update(
+                    job_id,
+                    documents=counters["documents"] + len(taken),
+                    chunks=counters["chunks"] + stats["chunks"],
+                    elapsed=counters["elapsed"] + now - started,
+                )
+
+            slice_documents = _take_for(documents, float(config["job_checkpoint_seconds"]), taken, exhausted)
+            # A rebuild starts a new staged index and appends its later checkpoints to it.
+            append = not staged or checkpoints > 0
+            with IndexWriter(
+                params["index_dir"], job["index_name"], info=base_info, ann_config=config, append=append, staged=staged,
+            ) as writer:
+                if checkpoints == 0:
+                    writer.delete(plan.get("deleted", ()))
+                stats = index_documents(writer, slice_documents, client, config, cache, progress, near_duplicates)
+            failed.update(stats["failed"])
+            near_duplicates.save(dedup_path)
+            self.store.add_done_paths(job_id, [path for path in taken if path not in stats["failed"]])
+            checkpoints += 1
+            counters["documents"] += len(taken)
+            counters["chunks"] += stats["chunks"]
+            counters["duplicates"] += len(stats["duplicates"])
+            counters["failed"] += len(stats["failed"])
+            counters["cache_hits"] += stats["cache_hits"]
+            counters["cache_misses"] += stats["cache_misses"]
+            counters["elapsed"] += time.monotonic() - started
+            self.store.update(job_id, checkpoints=checkpoints, **counters)
+            if exhausted.is_set():
+                break
+
+        info = dict(plan.get("info") or {})
+        if failed:
+            # Keep the previous commit so the next run retries the failed files.
+            info.pop("commit", None)
+        if staged:
+            promote_staged(params["index_dir"], job["index_name"], {**base_info, **info})
+        else:
+            with IndexWriter(params["index_dir"], job["index_name"], info={**base_info, **info}, append=True):
+                pass
+        messages = list(plan["messages"]()) if plan.get("messages") else []
+        if counters["cache_hits"] or counters["cache_misses"]:
+            messages.append(f"Embedding cache: {counters['cache_hits']} hits, {counters['cache_misses']} misses.")
+        messages += [f"Error generating embeddings for {path}: {error}" for path, error in failed.items()]
+        self.store.update(job_id, status="done", finished_at=time.time(), messages=messages)
+        if params.get("upload_dir"):
+            shutil.rmtree(params["upload_dir"], ignore_errors=True)
+        if os.path.exists(dedup_path):
+            os.remove(dedup_path)
+        maybe_compact(
+            params["index_dir"], job["index_name"], config,
+            int(config["compaction_max_segments"]), float(config["compaction_max_deleted_ratio"]),
+        )
+
+
+def get_job_store(path=JOBS_DB, max_concurrent=None):
+    """
+    Return the process-wide job store for ``path``, starting its runner on first use.
+
+    ``max_concurrent`` (``jobs_max_concurrent`` by default) resizes a runner
+    that is already running; None keeps its current size.
+    """
+    with _runners_lock:
+        if path not in _runners:
+            if max_concurrent is None:
+                max_concurrent = DEFAULT_JOB_CONFIG["jobs_max_concurrent"]
+            runner = JobRunner(JobStore(path), max_concurrent)
+            runner.start()
+            _runners[path] = runner
+        elif max_concurrent is not None and int(max_concurrent) != _runners[path].max_concurrent:
+            _runners[path].resize(max_concurrent)
+        return _runners[path].store
+
+
+def submit_job(kind, index_name, params, files=(), path=JOBS_DB):
+    """
+    Queue a job on the process-wide store and wake its runner.
+
+    Parameters:
+        params (dict): Must hold ``index_dir``, ``embedding_model`` and
+            ``config`` (the settings to index with), optionally
+            ``ollama_url``, plus whatever the planner of ``kind`` needs.
+
+    Returns:
+        int: The job id.
+    """
+    config = {**DEFAULT_JOB_CONFIG, **params["config"]}
+    store = get_job_store(path, int(config["jobs_max_concurrent"]))
+    job_id = store.submit(kind, index_name, params, files)
+    _runners[path].wake()
+    return job_id
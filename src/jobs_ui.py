@@ -0,0 +1,72 @@
+import time
+
+import streamlit as st
+
+from src.jobs import ACTIVE_STATUSES, get_job_store, job_progress
+
+STATUS_ICONS = {
+    "queued": "⏳", "running": "⚙️", "cancelling": "🛑", "done": "✅", "failed": "❌", "cancelled": "⏹️",
+}
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+# Reruns on its own every two seconds without rerunning the rest of the page.
+@st.fragment(run_every=2)
+def show_jobs(kinds=None, limit=10):
+    """Live list of the indexing jobs of ``kinds`` (all kinds if None) with throughput and ETA."""
+    store = get_job_store()
+    jobs = [job for job in store.list(limit) if kinds is None or job["kind"] in kinds]
+    if not jobs:
+        return
+    st.subheader("Indexing Jobs")
+    for job in jobs:
+        progress = job_progress(job)
+        with st.container(border=True):
+            label = f"{STATUS_ICONS.get(job['status'], '')} #{job['id']} · {job['kind']} → '{job['index_name']}' · {job['status']}"
+            st.markdown(label)
+            if progress["fraction"] is not None:
+                st.progress(progress["fraction"])
+            total = job["total"] if job["total"] is not None else "?"
+            details = [
+                f"{job['documents']}/{total} documents",
+                f"{job['chunks']} chunks",
+                f"{progress['documents_per_second']:.1f} docs/s",
+                f"{progress['embeddings_per_second']:.1f} embeddings/s",
+            ]
+            if job["status"] in ACTIVE_STATUSES:
+                details.append(f"ETA {format_duration(progress['eta'])}")
+            else:
+                details.append(f"took {format_duration(job['elapsed'])}")
+            if job["duplicates"]:
+                details.append(f"{job['duplicates']} near-duplicates skipped")
+            if job["cache_hits"] or job["cache_misses"]:
+                details.append(f"embedding cache: {job['cache_hits']} hits, {job['cache_misses']} misses")
+            if job["checkpoints"]:
+                details.append(f"{job['checkpoints']} checkpoints")
+            st.caption(" · ".join(details))
+            if job["error"]:
+                st.error(job["error"])
+            if job["messages"]:
+                with st.expander("Details"):
+                    for message in job["messages"]:
+                        if isinstance(message, dict):
+                            st.table(message)
+                        else:
+                            st.write(message)
+            if job["status"] in ("queued", "running"):
+                if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                    store.cancel(job["id"])
+            elif job["status"] in ("failed", "cancelled"):
+                if st.button("Resume", key=f"resume_job_{job['id']}"):
+                    store.retry(job["id"])
+    st.caption(f"Updated {time.strftime('%H:%M:%S')}")
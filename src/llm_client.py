@@ -0,0 +1,234 @@
+"""
+Shared Ollama generation client.
+
+Every tab generates text through one pooled keep-alive session per server,
+so connections are reused across requests and reruns instead of being opened
+for every answer. Requests have a connect and a read timeout, connection
+failures and 502/503/504 answers are retried before anything is streamed,
+and streamed answers are parsed incrementally: raw chunks are split into
+NDJSON lines as they arrive and decoded with ``orjson`` when it is installed.
+
+Streamed generations are :class:`Generation` handles: cancelling one shuts
+its connection down, so Ollama stops decoding and frees the model slot at
+once, while the text received so far stays available.
+"""
+
+import json
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+OLLAMA_API_URL = "http://localhost:11434"
+DEFAULT_POOL_SIZE = 8
+DEFAULT_RETRIES = 2
+DEFAULT_CONNECT_TIMEOUT = 5  # seconds to reach the server
+DEFAULT_READ_TIMEOUT = 300  # longest silence between two streamed chunks
+
+_clients = {}
+_clients_lock = threading.Lock()
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+class LLMError(requests.RequestException):
+    """The server answered with an error (bad model name, out of memory...)."""
+
+
+def iter_ndjson(chunks):
+    """
+    Parse a stream of NDJSON byte chunks incrementally.
+
+    Chunks may split or join lines arbitrarily; every complete line is
+    decoded as soon as its newline arrives.
+
+    Yields:
+        dict: One decoded object per non-empty line.
+    """
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        if b"\n" not in chunk:
+            continue
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+    if buffer.strip():
+        yield _loads(buffer)
+
+
+def _shutdown(response):
+    """Shut the socket of a streaming response down, waking a thread blocked reading it."""
+    connection = getattr(response.raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        response.close()
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class Generation:
+    """
+    A streamed generation that can be cancelled from any thread.
+
+    Iterating sends the request and yields the pieces of the answer; ``text``
+    accumulates them, so a cancelled or failed generation keeps its partial
+    output, and ``final`` is the closing object of the stream (token counts,
+    ``context``) once it completed. Used as a context manager, a generation
+    that is left before it completed (an exception, a rerun) is cancelled.
+    """
+
+    def __init__(self, client, path, payload, extract):
+        self._client = client
+        self._path = path
+        self._payload = {**payload, "stream": True}
+        self._extract = extract
+        self._lock = threading.Lock()
+        self._response = None  # set while the stream is being read
+        self._started = False
+        self.text = ""
+        self.final = None
+        self.cancelled = False
+
+    @property
+    def done(self):
+        return self.final is not None
+
+    def __iter__(self):
+        with self._lock:
+            if self.cancelled or self._started:
+                return
+            self._started = True
+        # Ollama sends the headers after the prompt is processed; cancel() must
+        # not wait for them, so the request is made outside the lock.
+        response = self._client._post(self._path, self._payload, stream=True)
+        with self._lock:
+            if self.cancelled:
+                response.close()
+                return
+            self._response = response
+        try:
+            for data in iter_ndjson(self._response.iter_content(chunk_size=None)):
+                if self.cancelled:
+                    break
+                if "error" in data:
+                    raise LLMError(data["error"], response=self._response)
+                piece = self._extract(data)
+                if piece:
+                    self.text += piece
+                    yield piece
+                if data.get("done"):
+                    self.final = data
+        except Exception:
+            # Reading a connection cancel() shut down fails; that is the expected end.
+            if not self.cancelled:
+                raise
+        finally:
+            # Once closed, a completed response's connection is back in the
+            # pool and must not be shut down by a late cancel().
+            with self._lock:
+                response, self._response = self._response, None
+            response.close()
+
+    def cancel(self):
+        """Stop the generation; safe to call from another thread and more than once."""
+        with self._lock:
+            if self.cancelled or self.done:
+                return
+            self.cancelled = True
+            response = self._response
+        if response is not None:
+            _shutdown(response)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cancel()
+        return False
+
+
+class LLMClient:
+    """Pooled client for the generation endpoints of one Ollama server."""
+
+    def __init__(self, base_url=OLLAMA_API_URL, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            read=0,  # a generation that timed out half-way is not replayed
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path, payload, stream):
+        response = self.session.post(f"{self.base_url}{path}", json=payload, stream=stream, timeout=self.timeout)
+        if response.status_code != 200:
+            try:
+                message = response.json().get("error") or response.text
+            except ValueError:
+                message = response.text
+            response.close()
+            raise LLMError(f"{response.status_code}: {message}", response=response)
+        return response
+
+    def generate_stream(self, model, prompt, options=None, **fields):
+        """
+        Stream a completion from ``/api/generate``.
+
+        Parameters:
+            options (dict): Model options such as ``temperature`` or ``num_ctx``.
+            fields: Other request fields (``images``, ``system``, ``context``...).
+
+        Returns:
+            Generation: Yields pieces of the response as they are generated.
+        """
+        payload = {"model": model, "prompt": prompt, **fields}
+        if options:
+            payload["options"] = options
+        return Generation(self, "/api/generate", payload, lambda data: data.get("response"))
+
+    def generate(self, model, prompt, options=None, **fields):
+        """Return a whole completion from ``/api/generate``; see :meth:`generate_stream`."""
+        payload = {"model": model, "prompt": prompt, "stream": False, **fields}
+        if options:
+            payload["options"] = options
+        with self._post("/api/generate", payload, stream=False) as response:
+            return _loads(response.content).get("response", "")
+
+    def chat_stream(self, model, messages, options=None, **fields):
+        """
+        Stream a reply from ``/api/chat`` to ``messages`` (dicts with ``role`` and ``content``).
+
+        Returns:
+            Generation: Yields pieces of the reply as they are generated.
+        """
+        payload = {"model": model, "messages": messages, **fields}
+        if options:
+            payload["options"] = options
+        return Generation(self, "/api/chat", payload, lambda data: data.get("message", {}).get("content"))
+
+
+def get_llm_client(base_url=OLLAMA_API_URL, **options):
+    """Return the process-wide client for ``base_url``, creating it on first use."""
+    key = (base_url, tuple(sorted(options.items())))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = LLMClient(base_url, **options)
+        return _clients[key]
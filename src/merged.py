@@ -1,9 +1,9 @@
 import streamlit as st
 import requests
-import json
 import base64
 import os
 import random
+from src.llm_client import get_llm_client
 
 # Configuration
 OLLAMA_API_URL = "http://localhost:11434"
@@ -28,23 +28,10 @@ if "session_emoji" not in st.session_state:
 def generate_text_response(prompt):
     """Generate a text response using the text model API."""
     try:
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            json={"model": TEXT_MODEL, "prompt": prompt},
-            stream=True,
-        )
-        if response.status_code == 200:
-            for chunk in response.iter_lines():
-                if chunk:
-                    try:
-                        chunk_data = json.loads(chunk.decode("utf-8"))
-                        if "response" in chunk_data:
-                            yield chunk_data["response"]
-                    except json.JSONDecodeError:
-                        st.error("Error parsing response chunk.")
-        else:
-            st.error(f"Error generating text response: {response.text}")
-            yield ""
+        yield from get_llm_client(OLLAMA_API_URL).generate_stream(TEXT_MODEL, prompt)
+    except requests.RequestException as e:
+        st.error(f"Error generating text response: {e}")
+        yield ""
     except Exception as e:
         st.error(f"Unexpected error: {e}")
         yield ""
@@ -54,22 +41,11 @@ def generate_image_response(prompt, image_data):
     """Generate a response using the image model API with an image."""
     try:
         encoded_image = base64.b64encode(image_data).decode("utf-8")
-        payload = {
-            "model": IMAGE_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "images": [encoded_image],
-        }
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            json=payload,
-        )
-        if response.status_code == 200:
-            response_data = response.json()
-            return response_data.get("response", "No response received.")
-        else:
-            st.error(f"Error generating image response: {response.text}")
-            return "Error in response."
+        response = get_llm_client(OLLAMA_API_URL).generate(IMAGE_MODEL, prompt, images=[encoded_image])
+        return response or "No response received."
+    except requests.RequestException as e:
+        st.error(f"Error generating image response: {e}")
+        return "Error in response."
     except Exception as e:
         st.error(f"Unexpected error during image response generation: {e}")
         return "Error in image response."
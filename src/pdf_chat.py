@@ -2,13 +2,19 @@
 
 import streamlit as st
 import os
-import pickle
-import numpy as np
 from pathlib import Path
-from PyPDF2 import PdfReader
-from docx import Document  # For handling Word documents
 import requests
-import json
+from src.index_store import delete_documents, list_index_paths, list_indices, maybe_compact
+from src.index_cache import get_cached_index
+from src.embeddings import get_embedding_client
+from src.extraction import iter_documents
+from src.jobs import interactive_query, register_job_kind, submit_job
+from src.jobs_ui import show_jobs
+from src.retrieval import format_passage, search
+from src.settings import load_config
+from src.llm_client import get_llm_client
+from src.response_cache import generate_cached, get_response_cache
+from src.context_budget import context_budget, rag_prompt
 
 # Default file paths
 INDEX_DIR = "indices"
@@ -21,113 +27,106 @@ GENERATION_MODEL = "qwen2.5:0.5b"
 
 # Helper function to get a list of available indices
 def get_indices():
-    return [f.split(".")[0] for f in os.listdir(INDEX_DIR) if f.endswith(".pkl")]
-
-# Step 1: Load Text Data from Files
-def load_text_from_file(file):
-    """Extract text from uploaded files (PDF, Word, Text)."""
-    file_extension = file.name.split('.')[-1].lower()
-    extracted_text = ""
-
-    if file_extension == "pdf":
-        pdf_reader = PdfReader(file)
-        for page in pdf_reader.pages:
-            text = page.extract_text()
-            if text:
-                extracted_text += text + " "
-    elif file_extension == "docx":
-        doc = Document(file)
-        for paragraph in doc.paragraphs:
-            if paragraph.text:
-                extracted_text += paragraph.text + " "
-    elif file_extension == "txt":
-        extracted_text = file.read().decode("utf-8")
-    else:
-        st.error(f"Unsupported file type: {file_extension}")
-        return None
-
-    return extracted_text.strip()
+    return list_indices(INDEX_DIR)
+
+# Step 1: Generate Embedding
+def get_embedder(config=None):
+    config = config or load_config()
+    return get_embedding_client(
+        EMBEDDING_MODEL, OLLAMA_API_URL,
+        batch_size=int(config["embedding_batch_size"]), concurrency=int(config["embedding_concurrency"]),
+    )
 
-# Step 2: Generate Embedding
 def generate_embedding(text):
-    response = requests.post(
-        f"{OLLAMA_API_URL}/api/embeddings",
-        json={"model": EMBEDDING_MODEL, "prompt": text}
-    )
-    if response.status_code == 200:
-        return response.json().get("embedding", [])
-    else:
-        st.error(f"Error generating embedding: {response.text}")
+    try:
+        return get_embedder().embed_one(text)
+    except requests.RequestException as e:
+        st.error(f"Error generating embedding: {e}")
         return None
 
-# Step 3: Index Data
-def index_data(data, index_name):
-    """Index data using embedding model."""
-    collection = {"embeddings": [], "documents": [], "metadata": []}
-    st.info("Indexing data...")
-
-    for path, content in data.items():
-        embedding = generate_embedding(content)
-        if embedding:
-            collection["embeddings"].append(embedding)
-            collection["documents"].append(content)
-            collection["metadata"].append({"path": path})
-
-    with open(os.path.join(INDEX_DIR, f"{index_name}.pkl"), "wb") as f:
-        pickle.dump(collection, f)
-    st.success(f"Index '{index_name}' saved.")
-
-# Step 4: Query Index
-def query_index(prompt, collection):
-    """Query the indexed data using embedding model."""
-    query_embedding = generate_embedding(prompt)
-    if not query_embedding:
-        return None, None
-
-    similarities = []
-    for embedding in collection["embeddings"]:
-        similarity = np.dot(query_embedding, embedding) / (
-            np.linalg.norm(query_embedding) * np.linalg.norm(embedding)
-        )
-        similarities.append(similarity)
-
-    if similarities:
-        max_index = np.argmax(similarities)
-        return collection["documents"][max_index], collection["metadata"][max_index]["path"]
-    else:
+# Step 2: Background Indexing Jobs
+def extraction_report_table(report):
+    """Per-file extraction report as a table for the job details."""
+    return {
+        "File": [entry["name"] for entry in report],
+        "Engine": [entry["engine"] or "" for entry in report],
+        "Pages": [entry["pages"] for entry in report],
+        "Seconds": [round(entry["seconds"], 2) for entry in report],
+        "Pages/s": [round(entry["pages_per_second"], 1) if entry["pages_per_second"] else "" for entry in report],
+        "Characters": [entry["characters"] for entry in report],
+        "Error": [entry["error"] or "" for entry in report],
+    }
+
+def plan_upload_job(job, done):
+    """Plan the indexing of files uploaded with a job; see ``src.jobs``."""
+    params = job["params"]
+    config = params["config"]
+    files = [(name, path) for name, path in params["files"] if name not in done]
+    report = []
+    documents = iter_documents(
+        ((name, Path(path).read_bytes()) for name, path in files),
+        max_workers=int(config["extraction_workers"]), pages_per_task=int(config["extraction_pages_per_task"]),
+        report=report,
+    )
+    return {
+        "documents": documents,
+        "total": len(params["files"]),
+        "append": params["append"],
+        "info": {},
+        "messages": lambda: [
+            *(f"Could not extract '{entry['name']}': {entry['error']}" for entry in report if entry["error"]),
+            *([extraction_report_table(report)] if report else []),
+        ],
+    }
+
+register_job_kind("uploads", plan_upload_job)
+
+# Step 3: Query Index
+def query_index(prompt, collection, top_k=None, query_embedding=None):
+    """Return the top-k most similar passages as a list of hits (best first)."""
+    if query_embedding is None:
+        query_embedding = generate_embedding(prompt)
+    if query_embedding is None:
+        return []
+
+    if collection["info"]["count"] == 0:
         st.info("The index is empty.")
-        return None, None
+        return []
+    config = load_config()
+    return search(
+        collection, query_embedding, top_k or config["retrieval_top_k"],
+        query_text=prompt if config["hybrid_search"] else None,
+        rrf_k=int(config["rrf_k"]), prefilter_min_rows=int(config["lexical_prefilter_min_rows"]),
+        rescore_factor=int(config["quantization_rescore_factor"]),
+    )
 
-# Step 5: Load an Existing Index
+# Step 4: Load an Existing Index
 def load_index(index_name):
     try:
-        with open(os.path.join(INDEX_DIR, f"{index_name}.pkl"), "rb") as f:
-            return pickle.load(f)
+        config = load_config()
+        return get_cached_index(INDEX_DIR, index_name, config["ann_ef_search"], config["index_cache_mb"])
     except FileNotFoundError:
         st.error(f"Index '{index_name}' not found.")
         return None
 
-# Step 6: Generate Response with Streaming
-def generate_response(prompt):
-    response = requests.post(
-        f"{OLLAMA_API_URL}/api/generate",
-        json={"model": GENERATION_MODEL, "prompt": prompt},
-        stream=True
-    )
-    if response.status_code == 200:
-        response_text = ""
-        for chunk in response.iter_lines():
-            if chunk:
-                try:
-                    chunk_data = json.loads(chunk.decode('utf-8'))
-                    if "response" in chunk_data:
-                        response_text += chunk_data["response"]
-                        yield response_text
-                except json.JSONDecodeError:
-                    st.error("Error parsing response chunk.")
-    else:
-        st.error(f"Error generating response: {response.text}")
-        yield ""
+# Step 5: Generate Response with Streaming
+def generate_response(prompt, context=None, query_embedding=None, options=None):
+    """
+    Stream the cumulative answer to ``prompt``. ``context`` (the retrieved
+    text) and ``query_embedding`` let a rephrased question reuse a cached answer.
+    """
+    cache = get_response_cache(load_config())
+    response_text = ""
+    try:
+        for piece in generate_cached(
+            get_llm_client(OLLAMA_API_URL), GENERATION_MODEL, prompt, cache, options=options,
+            context=context, query_embedding=query_embedding,
+        ):
+            response_text += piece
+            yield response_text
+    except requests.RequestException as e:
+        st.error(f"Error generating response: {e}")
+        yield response_text
 
 # Streamlit App for Document Upload, Indexing, and Chat
 def main_pdf_chat():
@@ -143,19 +142,34 @@ def main_pdf_chat():
         st.subheader("Upload Documents")
         uploaded_files = st.file_uploader("Upload PDF, Word, or Text files", type=["pdf", "docx", "txt"], accept_multiple_files=True)
         index_name = st.text_input("Index Name:", placeholder="Enter a unique name for this index")
+        append = st.checkbox("Add to the existing index (re-uploaded files replace their old version)", value=False)
 
         if st.button("Index Documents"):
             if uploaded_files and index_name:
-                data = {}
-                for file in uploaded_files:
-                    text = load_text_from_file(file)
-                    if text:
-                        data[file.name] = text
-                
-                index_data(data, index_name)
+                # Uploads are saved to disk; extraction, chunking and embedding run as a background job.
+                job_id = submit_job(
+                    "uploads", index_name,
+                    {"index_dir": INDEX_DIR, "embedding_model": EMBEDDING_MODEL, "ollama_url": OLLAMA_API_URL,
+                     "config": load_config(), "append": append},
+                    files=[(file.name, file.getvalue()) for file in uploaded_files],
+                )
+                st.success(f"Queued indexing job #{job_id} for {len(uploaded_files)} files.")
             else:
                 st.warning("Please upload files and provide an index name.")
 
+        show_jobs(["uploads"])
+
+        indices = get_indices()
+        if indices:
+            with st.expander("Remove Documents from an Index"):
+                remove_index = st.selectbox("Index", indices, key="pdf_remove_index")
+                remove_paths = st.multiselect("Documents to remove", list_index_paths(INDEX_DIR, remove_index))
+                if st.button("Remove Documents") and remove_paths:
+                    delete_documents(INDEX_DIR, remove_index, remove_paths)
+                    config = load_config()
+                    maybe_compact(INDEX_DIR, remove_index, config, int(config["compaction_max_segments"]), float(config["compaction_max_deleted_ratio"]))
+                    st.success(f"Removed {len(remove_paths)} documents from '{remove_index}'.")
+
     # Tab 2: Query and Chat
     with tab2:
         st.subheader("Query Indexed Data")
@@ -176,19 +190,31 @@ def main_pdf_chat():
                 with st.chat_message("user"):
                     st.markdown(user_query)
 
-                collection = load_index(selected_index)
-                if collection:
-                    retrieved_data, file_path = query_index(user_query, collection)
-                    if retrieved_data:
-                        with st.chat_message("assistant"):
-                            response_placeholder = st.empty()
-                            response_text = ""
-                            for response in generate_response(retrieved_data):
-                                response_text = response
-                                response_placeholder.markdown(response_text)
-                            st.session_state.messages.append({"role": "assistant", "content": response_text})
-                    else:
-                        st.info("No relevant documents found.")
+                # Indexing jobs hold back while the query and the answer run.
+                with interactive_query():
+                    collection = load_index(selected_index)
+                    if collection:
+                        query_embedding = generate_embedding(user_query)
+                        hits = query_index(user_query, collection, query_embedding=query_embedding) if query_embedding is not None else []
+                        if hits:
+                            prompt, retrieved_data, plan = rag_prompt(
+                                context_budget(load_config()), user_query, [format_passage(hit) for hit in hits]
+                            )
+                            options = {"num_ctx": plan["num_ctx"], "num_predict": plan["num_predict"]}
+                            with st.chat_message("assistant"):
+                                st.caption("Sources: " + ", ".join(
+                                    f"{hit['metadata']['path']} ({hit['score']:.3f})" for hit in hits
+                                ))
+                                if plan["dropped_passages"]:
+                                    st.caption(f"{plan['dropped_passages']} lower-ranked passages did not fit the context window.")
+                                response_placeholder = st.empty()
+                                response_text = ""
+                                for response in generate_response(prompt, retrieved_data, query_embedding, options):
+                                    response_text = response
+                                    response_placeholder.markdown(response_text)
+                                st.session_state.messages.append({"role": "assistant", "content": response_text})
+                        else:
+                            st.info("No relevant documents found.")
         else:
             st.warning("No indices available. Please create an index first.")
 
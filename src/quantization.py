@@ -0,0 +1,174 @@
+"""
+Compact in-memory embedding codes for brute-force search.
+
+A segment can keep a quantized copy of its embeddings next to the full
+``embeddings.npy``: float16 (2x smaller), int8 scalar-quantized (4x) or
+product-quantized codes (one byte per ``pq_subvector_dim`` dimensions, 32x
+for the default of 8). Only the codes are held in RAM. ``src.retrieval``
+scores every row against the codes, then rescores a shortlist of
+``quantization_rescore_factor * top_k`` rows exactly from the memory-mapped
+float32 matrix, so only those rows are paged in.
+"""
+
+import os
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional; k-means falls back to numpy
+    faiss = None
+
+DEFAULT_QUANTIZATION_CONFIG = {
+    "embedding_quantization": "none",  # Options: none, float16, int8, pq
+    "quantization_rescore_factor": 4,
+    "pq_subvector_dim": 8,
+}
+
+QUANTIZATION_TYPES = ["none", "float16", "int8", "pq"]
+CODES_FILE = "codes.npy"
+PARAMS_FILE = "codebook.npy"
+
+# Rows encoded at a time, to bound temporary float32 copies.
+_BLOCK = 65536
+# Rows scored at a time; small blocks keep the float32 copy in cache.
+_SCORE_BLOCK = 2048
+_PQ_CENTROIDS = 256
+_PQ_TRAIN_ROWS = 256 * 40
+_PQ_ITERATIONS = 10
+
+
+def _nearest(x, centroids):
+    """Index of the nearest centroid (squared L2) for every row of ``x``."""
+    distances = (centroids ** 2).sum(axis=1) - 2.0 * (x @ centroids.T)
+    return np.argmin(distances, axis=1)
+
+
+def _kmeans(x, k, rng):
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(_PQ_ITERATIONS):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        for d in range(x.shape[1]):
+            sums = np.bincount(assign, weights=x[:, d], minlength=k)
+            centroids[filled, d] = sums[filled] / counts[filled]
+        # Reseed empty clusters on random rows so every code stays usable.
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()))]
+    return centroids
+
+
+def _subvector_dim(dim, preferred):
+    """Largest sub-vector size not above ``preferred`` that divides ``dim``."""
+    for dsub in range(min(int(preferred), dim), 0, -1):
+        if dim % dsub == 0:
+            return dsub
+    return 1
+
+
+def build_quantized(embeddings, path, config=None):
+    """
+    Encode ``embeddings`` and save the codes inside the segment directory ``path``.
+
+    Returns:
+        dict or None: The quantization description stored in the segment
+        ``meta.json``, or None when quantization is disabled.
+    """
+    config = {**DEFAULT_QUANTIZATION_CONFIG, **(config or {})}
+    kind = config["embedding_quantization"]
+    if kind in (None, "none"):
+        return None
+    if kind not in QUANTIZATION_TYPES:
+        raise ValueError(f"Unknown embedding quantization '{kind}'")
+    rows, dim = embeddings.shape
+    info = {"type": kind, "file": CODES_FILE}
+
+    if kind == "float16":
+        codes = np.empty((rows, dim), dtype=np.float16)
+        for start in range(0, rows, _BLOCK):
+            codes[start:start + _BLOCK] = embeddings[start:start + _BLOCK]
+    elif kind == "int8":
+        scale = np.zeros(dim, dtype=np.float32)
+        for start in range(0, rows, _BLOCK):
+            scale = np.maximum(scale, np.abs(embeddings[start:start + _BLOCK]).max(axis=0))
+        scale = np.where(scale > 0, scale / 127.0, 1.0).astype(np.float32)
+        codes = np.empty((rows, dim), dtype=np.int8)
+        for start in range(0, rows, _BLOCK):
+            block = np.asarray(embeddings[start:start + _BLOCK], dtype=np.float32) / scale
+            codes[start:start + _BLOCK] = np.clip(np.rint(block), -127, 127)
+        np.save(os.path.join(path, PARAMS_FILE), scale)
+        info["params"] = PARAMS_FILE
+    else:
+        dsub = _subvector_dim(dim, config["pq_subvector_dim"])
+        m = dim // dsub
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, min(rows, _PQ_TRAIN_ROWS), replace=False))
+        train = np.asarray(embeddings[sample], dtype=np.float32)
+        k = min(_PQ_CENTROIDS, len(train))
+        codes = np.empty((rows, m), dtype=np.uint8)
+        if faiss is not None and k == _PQ_CENTROIDS:
+            pq = faiss.ProductQuantizer(dim, m, 8)
+            pq.cp.niter = _PQ_ITERATIONS
+            pq.train(train)
+            # Decoding code i in every subspace yields the i-th centroids. Unlike
+            # ``pq.centroids`` this does not go through the SWIG vector type,
+            # which PyMuPDF registers too when both are imported.
+            grid = np.repeat(np.arange(k, dtype=np.uint8)[:, None], m, axis=1)
+            centroids = pq.decode(grid).reshape(k, m, dsub).transpose(1, 0, 2)
+            for start in range(0, rows, _BLOCK):
+                block = np.ascontiguousarray(embeddings[start:start + _BLOCK], dtype=np.float32)
+                codes[start:start + _BLOCK] = pq.compute_codes(block)
+        else:
+            train = np.ascontiguousarray(train.reshape(len(train), m, dsub).transpose(1, 0, 2))
+            centroids = np.stack([_kmeans(train[j], k, rng) for j in range(m)])
+            for start in range(0, rows, _BLOCK):
+                block = np.asarray(embeddings[start:start + _BLOCK], dtype=np.float32)
+                block = np.ascontiguousarray(block.reshape(len(block), m, dsub).transpose(1, 0, 2))
+                for j in range(m):
+                    codes[start:start + _BLOCK, j] = _nearest(block[j], centroids[j])
+        np.save(os.path.join(path, PARAMS_FILE), centroids.astype(np.float32))
+        info.update({"params": PARAMS_FILE, "subvectors": m, "centroids": k})
+
+    np.save(os.path.join(path, CODES_FILE), codes)
+    return info
+
+
+class QuantizedEmbeddings:
+    """Quantized codes of a segment; ``scores`` approximates cosine similarity for all rows."""
+
+    def __init__(self, path, info):
+        self.type = info["type"]
+        self.codes = np.load(os.path.join(path, info["file"]))
+        self.params = np.load(os.path.join(path, info["params"])) if info.get("params") else None
+        self.nbytes = self.codes.nbytes + (self.params.nbytes if self.params is not None else 0)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def scores(self, query):
+        """Approximate inner products of the normalized ``query`` with every row."""
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        if self.type == "pq":
+            m = self.params.shape[0]
+            # Lookup table of each sub-query against every centroid of its subspace.
+            table = np.einsum("mkd,md->mk", self.params, query.reshape(m, -1))
+            subspaces = np.arange(m)
+            for start in range(0, len(self.codes), _SCORE_BLOCK):
+                block = self.codes[start:start + _SCORE_BLOCK]
+                scores[start:start + _SCORE_BLOCK] = table[subspaces, block].sum(axis=1)
+            return scores
+        if self.type == "int8":
+            query = query * self.params
+        for start in range(0, len(self.codes), _SCORE_BLOCK):
+            scores[start:start + _SCORE_BLOCK] = self.codes[start:start + _SCORE_BLOCK].astype(np.float32) @ query
+        return scores
+
+
+def load_quantized(path, info):
+    """Load the quantized codes described in ``info``, or return None if the segment has none."""
+    quantization = info.get("quantization")
+    if not quantization:
+        return None
+    return QuantizedEmbeddings(path, quantization)
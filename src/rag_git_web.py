@@ -1,189 +1,280 @@
 import streamlit as st
-import ollama
-import subprocess
-import shutil
-from pathlib import Path
-import os
-import pickle
-import numpy as np
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+import os
+from src.context_budget import context_budget, rag_prompt
+from src.crawler import crawl, unreached_pages
+from src.http_cache import get_http_cache
+from src.git_mirror import diff_blobs, has_commit, head_commit, list_blobs, mirror_path, read_blobs, update_mirror
+from src.index_store import index_path, list_indices, read_manifest
+from src.index_cache import get_cached_index
+from src.embeddings import get_embedding_client
+from src.jobs import interactive_query, register_job_kind, submit_job
+from src.jobs_ui import show_jobs
+from src.llm_client import get_llm_client
+from src.repo_filters import IgnoreRules, RepoFilter, parse_patterns
+from src.response_cache import generate_cached, get_response_cache
+from src.retrieval import format_passage, search, source_label
+from src.settings import load_config
 
 # Default file paths
 INDEX_DIR = "indices"
 os.makedirs(INDEX_DIR, exist_ok=True)
+EMBEDDING_MODEL = "mxbai-embed-large"
+REPO_FILE_EXTENSIONS = [".py", ".md", ".txt", ".js", ".java", ".c", ".cpp"]
 
 # Helper function to get a list of available indices
 def get_indices():
-    return [f.split(".")[0] for f in os.listdir(INDEX_DIR) if f.endswith(".pkl")]
-
-# Step 1: Clone the GitHub Repository
-def clone_repo(repo_url, clone_dir):
-    try:
-        if os.path.exists(clone_dir):
-            shutil.rmtree(clone_dir)
-        subprocess.run(["git", "clone", repo_url, clone_dir], check=True)
-        return f"Repository cloned to {clone_dir}"
-    except subprocess.CalledProcessError as e:
-        st.error(f"Failed to clone repository: {e}")
-        raise
+    return list_indices(INDEX_DIR)
 
-# Step 2: Crawl a URL Recursively
-def crawl_url(base_url, depth=2):
-    visited = set()
-    urls = [base_url]
-    for _ in range(depth):
-        new_urls = []
-        for url in urls:
-            if url not in visited:
-                visited.add(url)
-                try:
-                    response = requests.get(url)
-                    response.raise_for_status()
-                    soup = BeautifulSoup(response.content, "html.parser")
-                    for link in soup.find_all("a", href=True):
-                        absolute_url = urljoin(base_url, link["href"])
-                        if base_url in absolute_url and absolute_url not in visited:
-                            new_urls.append(absolute_url)
-                except requests.RequestException as e:
-                    st.warning(f"Failed to crawl {url}: {e}")
-        urls = new_urls
-    return visited
-
-# Step 3: Load Text Files from Directory or URLs
-def load_text_data(source, is_url=False):
+# Step 1: Select the Repository Files and Pages to Index
+def plan_repo_update(mirror, commit, repo_url, index_name, incremental):
     """
-    Load text data from a directory or URLs.
-
-    Parameters:
-        source (str or list): Directory path or list of URLs.
-        is_url (bool): If True, treat the source as URLs.
+    Decide what to index for ``commit``.
 
     Returns:
-        dict: A dictionary where keys are file paths or URLs and values are the text content.
+        tuple: (blobs to read, deleted paths, append). When ``incremental`` is
+        set and the index records an earlier commit of the same repository,
+        only the files changed since that commit are returned, plus the
+        duplicates of changed files that were indexed as their aliases.
     """
-    data = {}
-    if is_url:
-        st.info("Loading content from URLs...")
-        for url in source:
-            try:
-                response = requests.get(url)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.content, "html.parser")
-                text = soup.get_text()
-                data[url] = text
-            except requests.RequestException as e:
-                st.warning(f"Failed to load content from {url}: {e}")
-    else:
-        for file_path in Path(source).rglob("*.*"):
-            if file_path.suffix in [".py", ".md", ".txt", ".js", ".java", ".c", ".cpp"]:
-                try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        data[str(file_path)] = f.read()
-                except Exception as e:
-                    st.warning(f"Failed to read file {file_path}: {e}")
-    return data
-
-# Step 4: Index Data
-def index_data(data, index_name):
-    collection = {"embeddings": [], "documents": [], "metadata": []}
-    st.info("Generating embeddings...")
-    for path, content in data.items():
+    previous = None
+    aliases = {}
+    if incremental:
         try:
-            response = ollama.embeddings(model="mxbai-embed-large", prompt=content)
-            embedding = response["embedding"]
-            collection["embeddings"].append(embedding)
-            collection["documents"].append(content)
-            collection["metadata"].append({"path": path})
-        except Exception as e:
-            st.error(f"Error generating embeddings for {path}: {e}")
-    with open(os.path.join(INDEX_DIR, f"{index_name}.pkl"), "wb") as f:
-        pickle.dump(collection, f)
-    st.success(f"Index '{index_name}' saved.")
-    return collection
+            manifest = read_manifest(index_path(INDEX_DIR, index_name))
+        except FileNotFoundError:
+            manifest = {"info": {}}
+        info = manifest["info"]
+        if info.get("repo_url") == repo_url and info.get("commit") and has_commit(mirror, info["commit"]):
+            previous = info["commit"]
+            aliases = manifest.get("aliases", {})
+    if previous is None:
+        return list_blobs(mirror, commit), [], False
+    changed, deleted = diff_blobs(mirror, previous, commit)
+    replaced = set(deleted).union(blob["path"] for blob in changed)
+    orphaned = {path for path, original in aliases.items() if original in replaced and path not in replaced}
+    if orphaned:
+        # Duplicates of a changed or deleted file no longer have an indexed copy; read them again.
+        changed += [blob for blob in list_blobs(mirror, commit) if blob["path"] in orphaned]
+    return changed, deleted, True
+
+def get_repo_filter(mirror, commit, config=None):
+    """Build the ingestion filter for ``commit``, including the repository's .gitignore files."""
+    config = config or load_config()
+    gitignore = None
+    if config["repo_respect_gitignore"]:
+        ignore_files = [
+            blob for blob in list_blobs(mirror, commit, sizes=False)
+            if blob["path"].rsplit("/", 1)[-1] == ".gitignore"
+        ]
+        # Parent directories first, so deeper .gitignore files take precedence.
+        ignore_files.sort(key=lambda blob: blob["path"].count("/"))
+        gitignore = IgnoreRules()
+        for blob, (_, data) in zip(ignore_files, read_blobs(mirror, [blob["sha"] for blob in ignore_files])):
+            if data is not None:
+                gitignore.add(data.decode("utf-8", errors="ignore").splitlines(), blob["path"].rpartition("/")[0])
+    return RepoFilter(
+        REPO_FILE_EXTENSIONS, parse_patterns(config["repo_exclude_patterns"]),
+        int(config["repo_max_file_kb"]) * 1024, gitignore,
+    )
+
+def select_repo_blobs(blobs, repo_filter):
+    """The blobs that pass the tree-listing checks of ``repo_filter`` (extension, excludes, size)."""
+    return [blob for blob in blobs if repo_filter.check_entry(blob["path"], blob["size"]) is None]
+
+def read_repo_files(mirror, blobs, repo_filter):
+    """Yield (path, text) of ``blobs`` whose content passes ``repo_filter``."""
+    contents = read_blobs(mirror, [blob["sha"] for blob in blobs])
+    for blob, (_, data) in zip(blobs, contents):
+        if data is None:
+            continue
+        reason, text = repo_filter.check_content(data)
+        if reason is None:
+            yield blob["path"], text
+
+def ingest_report_summary(report):
+    skipped = ", ".join(f"{count} {reason.replace('_', ' ')}" for reason, count in report["skipped"].items() if count)
+    return f"Scanned {report['scanned']} files, indexed {report['indexed']}" + (f"; skipped: {skipped}." if skipped else ".")
+
+def ingest_report_table(report, indexed_before=0):
+    """The ingest report as a table for the job details; ``indexed_before`` counts files done by an earlier run."""
+    table = {
+        "Files": ["Scanned", *(f"Skipped: {reason.replace('_', ' ')}" for reason in report["skipped"]), "Indexed"],
+        "Count": [report["scanned"], *report["skipped"].values(), report["indexed"]],
+    }
+    if indexed_before:
+        table["Files"].append("Indexed by an earlier run")
+        table["Count"].append(indexed_before)
+    return table
+
+def changed_pages(result, index_name):
+    """Crawled pages minus those unchanged since the last crawl and already in ``index_name``."""
+    try:
+        manifest = read_manifest(index_path(INDEX_DIR, index_name))
+    except FileNotFoundError:
+        return dict(result["pages"])
+    aliases = manifest.get("aliases", {})
+    skip = set(manifest["paths"]).union(aliases).intersection(result["unchanged"])
+    # Near-duplicates of a page being re-indexed are re-checked against its new text.
+    skip = {url for url in skip if url not in aliases or aliases[url] in skip}
+    return {url: text for url, text in result["pages"].items() if url not in skip}
+
+def removed_pages(result, index_name, base_url):
+    """Pages of ``index_name`` under ``base_url`` that the crawl ``result`` no longer reaches."""
+    try:
+        manifest = read_manifest(index_path(INDEX_DIR, index_name))
+    except FileNotFoundError:
+        return []
+    return unreached_pages(result, set(manifest["paths"]).union(manifest.get("aliases", {})), base_url)
+
+# Step 2: Embedding Client
+def get_embedder(config=None):
+    config = config or load_config()
+    return get_embedding_client(
+        EMBEDDING_MODEL,
+        batch_size=int(config["embedding_batch_size"]), concurrency=int(config["embedding_concurrency"]),
+    )
 
 # Load an Existing Index
 def load_index(index_name):
     try:
-        with open(os.path.join(INDEX_DIR, f"{index_name}.pkl"), "rb") as f:
-            return pickle.load(f)
+        config = load_config()
+        return get_cached_index(INDEX_DIR, index_name, config["ann_ef_search"], config["index_cache_mb"])
     except FileNotFoundError:
         st.error(f"Index '{index_name}' not found.")
         raise
 
-# Step 5: Query the Index
-def query_index(prompt, collection):
+# Step 3: Query the Index
+def query_index(prompt, collection, top_k=None, query_embedding=None):
+    """Return the top-k most similar documents as a list of hits (best first)."""
     try:
         # Generate embedding for the query
-        response = ollama.embeddings(model="mxbai-embed-large", prompt=prompt)
-        query_embedding = response["embedding"]
-
-        # Validate embedding shapes
-        valid_embeddings = []
-        valid_documents = []
-        valid_metadata = []
-        for i, embedding in enumerate(collection["embeddings"]):
-            if len(embedding) == len(query_embedding):
-                valid_embeddings.append(embedding)
-                valid_documents.append(collection["documents"][i])
-                valid_metadata.append(collection["metadata"][i])
+        if query_embedding is None:
+            query_embedding = get_embedder().embed_one(prompt)
 
         # Handle case where no valid embeddings exist
-        if not valid_embeddings:
+        if collection["info"]["count"] == 0 or collection["info"]["dim"] != len(query_embedding):
             st.error("No valid embeddings found in the index.")
-            return None, None
+            return []
 
-        # Compute cosine similarity
-        similarities = [
-            np.dot(query_embedding, e) / (np.linalg.norm(query_embedding) * np.linalg.norm(e))
-            for e in valid_embeddings
-        ]
-        max_index = np.argmax(similarities)
-        return valid_documents[max_index], valid_metadata[max_index]["path"]
+        config = load_config()
+        return search(
+            collection, query_embedding, top_k or config["retrieval_top_k"],
+            query_text=prompt if config["hybrid_search"] else None,
+            rrf_k=int(config["rrf_k"]), prefilter_min_rows=int(config["lexical_prefilter_min_rows"]),
+            rescore_factor=int(config["quantization_rescore_factor"]),
+        )
     except Exception as e:
         st.error(f"Error querying index: {e}")
         raise
 
-# Step 6: Generate a Streaming Response
-def generate_response_stream(data, prompt):
-    full_prompt = f"Using this data: {data}. Respond to this prompt: {prompt}"
-    for response_chunk in ollama.generate(model="qwen2.5:0.5b", prompt=full_prompt, stream=True):
-        try:
-            if "response" in response_chunk:
-                yield response_chunk["response"]
-            else:
-                st.warning("No 'response' key in response chunk.")
-        except KeyError as e:
-            st.error(f"Error processing response chunk: {e}")
+# Step 4: Background Indexing Jobs
+def job_params(config, **params):
+    """Parameters shared by the indexing jobs of this tab; see ``src.jobs.submit_job``."""
+    return {"index_dir": INDEX_DIR, "embedding_model": EMBEDDING_MODEL, "config": config, **params}
+
+def plan_repo_job(job, done):
+    """
+    Plan a repository indexing job; see ``src.jobs``.
+
+    The commit is fixed the first time the job runs, so a resumed job
+    indexes the same tree.
+    """
+    params, state = job["params"], dict(job["state"])
+    config = params["config"]
+    repo_url = params["repo_url"]
+    mirror = mirror_path(repo_url)
+    if state.get("commit") and os.path.isdir(mirror) and has_commit(mirror, state["commit"]):
+        commit = state["commit"]
+    else:
+        mirror = update_mirror(
+            repo_url, depth=int(config["repo_clone_depth"]), blob_limit=int(config["repo_max_file_kb"]) * 1024
+        )
+        commit = state["commit"] = head_commit(mirror)
+    blobs, deleted, append = plan_repo_update(mirror, commit, repo_url, job["index_name"], params["incremental"])
+    repo_filter = get_repo_filter(mirror, commit, config)
+    selected = select_repo_blobs(blobs, repo_filter)
+    indexed_before = sum(blob["path"] in done for blob in selected)
+    return {
+        "documents": read_repo_files(mirror, [blob for blob in selected if blob["path"] not in done], repo_filter),
+        "total": len(selected),
+        "append": append,
+        # Modified files are removed too, in case they are now filtered out.
+        "deleted": deleted + [blob["path"] for blob in blobs] if append else [],
+        "info": {"repo_url": repo_url, "commit": commit},
+        "state": state,
+        "messages": lambda: [
+            f"Commit {commit[:12]}: " + ingest_report_summary(repo_filter.report),
+            ingest_report_table(repo_filter.report, indexed_before),
+        ],
+    }
+
+def plan_crawl_job(job, done):
+    """Plan a crawl-and-index job; see ``src.jobs``. A resumed job crawls again, mostly from the HTTP cache."""
+    params = job["params"]
+    config = params["config"]
+    cache = get_http_cache(size_limit_mb=int(config["http_cache_mb"]))
+    result = crawl(params["base_url"], params["depth"], config, cache)
+    pages = changed_pages(result, job["index_name"]) if params["incremental"] else result["pages"]
+    removed = removed_pages(result, job["index_name"], params["base_url"]) if params["incremental"] else []
+    return {
+        "documents": [(url, text) for url, text in pages.items() if url not in done],
+        "total": len(pages),
+        "append": params["incremental"],
+        "deleted": removed,
+        "info": {},
+        "messages": lambda: [
+            f"Fetched {len(result['pages'])} pages ({result['bytes'] / 1e6:.1f} MB) in {result['seconds']:.1f}s, "
+            f"{len(result['unchanged'])} unchanged since the last crawl, {len(removed)} removed from the index.",
+            *(f"Failed to crawl {url}: {error}" for url, error in result["errors"].items()),
+        ],
+    }
+
+register_job_kind("repo", plan_repo_job)
+register_job_kind("crawl", plan_crawl_job)
+
+# Step 5: Generate a Streaming Response
+def generate_response_stream(passages, prompt, query_embedding=None):
+    """
+    Stream the answer to ``prompt`` over the retrieved ``passages`` (best
+    first), as many as fit the context budget, from the answer cache when possible.
+    """
+    config = load_config()
+    full_prompt, data, plan = rag_prompt(context_budget(config), prompt, passages)
+    if plan["dropped_passages"]:
+        st.caption(f"{plan['dropped_passages']} lower-ranked passages did not fit the context window.")
+    options = {"num_ctx": plan["num_ctx"], "num_predict": plan["num_predict"]}
+    cache = get_response_cache(config)
+    try:
+        yield from generate_cached(
+            get_llm_client(), "qwen2.5:0.5b", full_prompt, cache, options=options,
+            context=data, query_embedding=query_embedding,
+        )
+    except requests.RequestException as e:
+        st.error(f"Error generating response: {e}")
 
 # Streamlit App
 def main_rag_git():
     st.title("🔍 RAG with Github & Web Chat")
     st.sidebar.header("Options")
 
-    if "indices" not in st.session_state:
-        st.session_state.indices = get_indices()
+    # Background jobs may have created indices since the last run.
+    st.session_state.indices = get_indices()
 
     # User inputs
     mode = st.sidebar.radio("Mode", ["GitHub Repository", "Web URL"])
     index_name = st.sidebar.text_input("Index Name", value="default_index")
     depth = st.sidebar.slider("Crawl Depth (for URLs)", 1, 5, 2)
     allow_new_index = st.sidebar.checkbox("Allow New Index Creation", value=True)
+    update_existing = st.sidebar.checkbox("Update Existing Index Incrementally", value=False)
 
     if mode == "GitHub Repository":
         repo_url = st.text_input("Enter GitHub Repository URL:")
-        clone_dir = "cloned_repo"
         if st.button("Process GitHub Repository"):
             if allow_new_index or index_name not in st.session_state.indices:
-                st.info("Cloning repository...")
-                clone_repo(repo_url, clone_dir)
-                st.info("Loading repository files...")
-                repo_files = load_text_data(clone_dir)
-                st.info("Indexing repository...")
-                index_data(repo_files, index_name)
-                shutil.rmtree(clone_dir)
-                st.session_state.indices = get_indices()
+                # Fetching, filtering and embedding run as a background job.
+                job_id = submit_job("repo", index_name, job_params(load_config(), repo_url=repo_url, incremental=update_existing))
+                st.success(f"Queued indexing job #{job_id} for {repo_url}.")
             else:
                 st.info(f"Index '{index_name}' already exists. Skipping indexing.")
 
@@ -191,31 +282,38 @@ def main_rag_git():
         base_url = st.text_input("Enter Base URL to Crawl:")
         if st.button("Crawl and Index"):
             if allow_new_index or index_name not in st.session_state.indices:
-                st.info("Crawling URLs...")
-                urls = crawl_url(base_url, depth)
-                st.info("Loading content from crawled URLs...")
-                url_data = load_text_data(urls, is_url=True)
-                st.info("Indexing content...")
-                index_data(url_data, index_name)
-                st.session_state.indices = get_indices()
+                job_id = submit_job("crawl", index_name, job_params(
+                    load_config(), base_url=base_url, depth=depth, incremental=update_existing,
+                ))
+                st.success(f"Queued crawl job #{job_id} for {base_url}.")
             else:
                 st.info(f"Index '{index_name}' already exists. Skipping indexing.")
 
+    show_jobs(["repo", "crawl"])
+
     # Query section
     st.header("Query the Index")
     if st.session_state.indices:
         selected_index = st.selectbox("Select an Index", st.session_state.indices)
         user_query = st.text_input("Enter your query:")
         if st.button("Query"):
-            collection = load_index(selected_index)
-            retrieved_data, file_path = query_index(user_query, collection)
-            st.write(f"Retrieved from: `{file_path}`")
-            st.write("### Response (Streaming):")
-            response_placeholder = st.empty()
-            response_text = ""
-            for chunk in generate_response_stream(retrieved_data, user_query):
-                response_text += chunk
-                response_placeholder.write(response_text)
+            # Indexing jobs hold back while the query and the answer run.
+            with interactive_query():
+                collection = load_index(selected_index)
+                query_embedding = get_embedder().embed_one(user_query)
+                hits = query_index(user_query, collection, query_embedding=query_embedding)
+                st.write("Retrieved from: " + ", ".join(
+                    f"`{source_label(hit['metadata'])}` ({hit['score']:.3f})" for hit in hits
+                ))
+                for hit in hits:
+                    if hit["aliases"]:
+                        st.caption(f"`{hit['metadata']['path']}` is also served at: " + ", ".join(f"`{path}`" for path in hit["aliases"]))
+                st.write("### Response (Streaming):")
+                response_placeholder = st.empty()
+                response_text = ""
+                for chunk in generate_response_stream([format_passage(hit) for hit in hits], user_query, query_embedding):
+                    response_text += chunk
+                    response_placeholder.write(response_text)
     else:
         st.warning("No indices found. Please create one first.")
 
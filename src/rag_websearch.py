@@ -1,9 +1,12 @@
 import streamlit as st
-from ollama import Client
 from duckduckgo_search import DDGS
-import json
 import os
 import requests
+from src.context_budget import context_budget, rag_prompt
+from src.embeddings import get_embedding_client
+from src.llm_client import get_llm_client
+from src.response_cache import generate_cached, get_response_cache
+from src.settings import load_config
 
 # Default file paths
 INDEX_DIR = "indices"
@@ -34,33 +37,41 @@ def perform_duckduckgo_search(query, result_count=10):
 def generate_rag_response(query, use_web_search=False):
     search_results = perform_duckduckgo_search(query, result_count=10) if use_web_search else []
     
-    # Construct prompt
-    prompt = f"User Query: {query}\n\n"
-    if search_results:
-        prompt += "Web Search Results:\n"
-        for result in search_results:
-            prompt += f"Title: {result['title']}\nLink: {result['link']}\nSnippet: {result['snippet']}\n\n"
-    prompt += "Based on the above information, provide a detailed and comprehensive answer."
-    
-    response = requests.post(
-        f"{OLLAMA_API_URL}/api/generate",
-        json={"model": GENERATION_MODEL, "prompt": prompt},
-        stream=True
-    )
-    if response.status_code == 200:
-        response_text = ""
-        for chunk in response.iter_lines():
-            if chunk:
-                try:
-                    chunk_data = json.loads(chunk.decode('utf-8'))
-                    if "response" in chunk_data:
-                        response_text += chunk_data["response"]
-                        yield response_text
-                except json.JSONDecodeError:
-                    st.error("Error parsing response chunk.")
-    else:
-        st.error(f"Error generating response: {response.text}")
-        yield ""
+    # Construct prompt from as many results as fit the context window
+    passages = [
+        f"Title: {result['title']}\nLink: {result['link']}\nSnippet: {result['snippet']}" for result in search_results
+    ]
+    config = load_config()
+    template = "User Query: {question}\n\n"
+    if passages:
+        template += "Web Search Results:\n{data}\n\n"
+    template += "Based on the above information, provide a detailed and comprehensive answer."
+    prompt, context, plan = rag_prompt(context_budget(config), query, passages, template)
+    options = {"num_ctx": plan["num_ctx"], "num_predict": plan["num_predict"]}
+
+    # Rephrased questions over the same search results reuse a cached answer.
+    # Without results there is no context to scope them by, so only the exact
+    # layer is used: unrelated questions must not share one semantic scope.
+    cache = get_response_cache(config)
+    context = context if plan["passages"] else None
+    query_embedding = None
+    if cache is not None and context is not None:
+        try:
+            query_embedding = get_embedding_client(EMBEDDING_MODEL, OLLAMA_API_URL).embed_one(query)
+        except requests.RequestException:
+            pass  # the exact layer still works without it
+
+    response_text = ""
+    try:
+        for piece in generate_cached(
+            get_llm_client(OLLAMA_API_URL), GENERATION_MODEL, prompt, cache, options=options,
+            context=context, query_embedding=query_embedding,
+        ):
+            response_text += piece
+            yield response_text
+    except requests.RequestException as e:
+        st.error(f"Error generating response: {e}")
+        yield response_text
 
 # Function to display AI response in Streamlit
 def display_response(response_text, sources, raw_search_results, related_queries):
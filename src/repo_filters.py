@@ -0,0 +1,174 @@
+"""
+File filters for repository ingestion.
+
+Decides which files of a repository are worth embedding. Cheap checks run on
+the tree listing before anything is read: file extension, the configurable
+exclude list, the repository's ``.gitignore`` files and a per-file size cap.
+Content checks then drop binary and minified files. Every decision is
+counted in an ingest report.
+
+Exclude patterns and ``.gitignore`` files share the gitignore syntax:
+``*``, ``?``, ``[...]``, ``**``, a leading ``/`` to anchor, a trailing ``/``
+for directories and ``!`` to re-include.
+"""
+
+import re
+
+DEFAULT_EXCLUDES = [
+    ".git/", "node_modules/", "vendor/", "third_party/", "dist/", "build/", "__pycache__/",
+    "*.min.js", "*.min.css", "*.map", "*.lock", "package-lock.json",
+]
+DEFAULT_MAX_FILE_KB = 512
+SKIP_REASONS = ["extension", "excluded", "gitignore", "too_large", "binary", "minified"]
+
+# Same heuristic as git: a NUL byte in the first 8000 bytes means binary.
+_BINARY_SNIFF_BYTES = 8000
+_MINIFIED_MIN_CHARS = 2000
+_MINIFIED_AVG_LINE = 300
+
+
+def _pattern_regex(pattern):
+    """Translate one gitignore pattern to a regex over paths relative to its directory."""
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            regex += "[" + ("^" + body[1:] if body.startswith("!") else body) + "]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    prefix = "" if anchored else "(?:.*/)?"
+    # Matching a directory also matches everything below it.
+    suffix = "/.*" if dir_only else "(?:/.*)?"
+    return re.compile(prefix + regex + suffix + r"\Z")
+
+
+class IgnoreRules:
+    """Ordered gitignore rules; the last matching rule decides, as in git."""
+
+    def __init__(self):
+        self._rules = []  # (base directory, regex, negated)
+
+    def add(self, lines, base=""):
+        """Add the patterns of one ignore file located in directory ``base``."""
+        base = base.strip("/")
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated or line.startswith("\\"):
+                line = line[1:]
+            if line:
+                self._rules.append((base, _pattern_regex(line), negated))
+
+    def ignored(self, path):
+        result = False
+        for base, regex, negated in self._rules:
+            if base:
+                if not path.startswith(base + "/"):
+                    continue
+                relative = path[len(base) + 1:]
+            else:
+                relative = path
+            if regex.match(relative):
+                result = not negated
+        return result
+
+
+def parse_patterns(text):
+    """Split a comma- or newline-separated exclude setting into patterns."""
+    return [pattern.strip() for pattern in re.split(r"[,\n]", text or "") if pattern.strip()]
+
+
+def is_binary(data):
+    return b"\0" in data[:_BINARY_SNIFF_BYTES]
+
+
+def is_minified(text):
+    """Long files made of very long lines (bundled or minified code)."""
+    if len(text) < _MINIFIED_MIN_CHARS:
+        return False
+    return len(text) / (text.count("\n") + 1) > _MINIFIED_AVG_LINE
+
+
+def new_report():
+    return {"scanned": 0, "indexed": 0, "indexed_bytes": 0, "skipped": {reason: 0 for reason in SKIP_REASONS}}
+
+
+class RepoFilter:
+    """
+    Apply the ingestion filters to repository files and count the outcome.
+
+    Parameters:
+        extensions (list): File suffixes to index, e.g. ``".py"``.
+        excludes (list): Gitignore-style patterns to leave out.
+        max_file_bytes (int): Larger files are skipped; 0 disables the cap.
+        gitignore (IgnoreRules): The repository's own ignore rules, if any.
+    """
+
+    def __init__(self, extensions, excludes=DEFAULT_EXCLUDES, max_file_bytes=DEFAULT_MAX_FILE_KB * 1024, gitignore=None):
+        self.extensions = {extension.lower() for extension in extensions}
+        self.excludes = IgnoreRules()
+        self.excludes.add(excludes)
+        self.max_file_bytes = int(max_file_bytes)
+        self.gitignore = gitignore
+        self.report = new_report()
+
+    def skip(self, reason):
+        self.report["skipped"][reason] += 1
+        return reason
+
+    def check_entry(self, path, size):
+        """
+        Filter a file from the tree listing; ``size`` is None for blobs left
+        out of a partial clone (they are over the clone's size limit).
+
+        Returns:
+            str or None: The skip reason, or None to read the file.
+        """
+        self.report["scanned"] += 1
+        name = path.rsplit("/", 1)[-1]
+        if "." not in name or "." + name.rsplit(".", 1)[-1].lower() not in self.extensions:
+            return self.skip("extension")
+        if self.excludes.ignored(path):
+            return self.skip("excluded")
+        if self.gitignore is not None and self.gitignore.ignored(path):
+            return self.skip("gitignore")
+        if size is None or (self.max_file_bytes and size > self.max_file_bytes):
+            return self.skip("too_large")
+        return None
+
+    def check_content(self, data):
+        """
+        Filter a file by its content.
+
+        Returns:
+            tuple: (skip reason or None, decoded text or None)
+        """
+        if is_binary(data):
+            return self.skip("binary"), None
+        text = data.decode("utf-8", errors="ignore")
+        if is_minified(text):
+            return self.skip("minified"), None
+        self.report["indexed"] += 1
+        self.report["indexed_bytes"] += len(data)
+        return None, text
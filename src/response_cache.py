@@ -0,0 +1,209 @@
+"""
+Response cache for generated answers.
+
+Two layers sit in front of the LLM. The exact layer is keyed by the whole
+request (model, final prompt, every option such as ``temperature`` or
+``seed``, and the other fields such as ``system`` or ``images``), so a
+repeated question over the same retrieved text is answered without
+generating. The semantic layer catches rephrasings: it keeps the query
+embeddings of recent answers per scope, where a scope is the same request
+with the retrieved context in place of the prompt, and answers a new query whose embedding
+is similar enough to one of them. Sharing the scope means a cached answer is
+only reused when it was written from the very same passages.
+
+Entries live in a size-bounded ``diskcache`` that evicts least recently used
+entries first and expires them after a TTL. Hits are replayed as a stream of
+word-sized pieces, so callers render them exactly like a live generation.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+RESPONSE_CACHE_DIR = "response_cache"
+DEFAULT_SIZE_LIMIT_MB = 256
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_MAX_PER_SCOPE = 32  # query embeddings kept per retrieved context
+
+_PIECE_RE = re.compile(r"\s*\S+\s*|\s+")
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _request(model, options, fields):
+    """The request fields an answer depends on; unset (None) values are left out."""
+    request = {name: value for name, value in (fields or {}).items() if value is not None}
+    request["model"] = model
+    options = {name: value for name, value in (options or {}).items() if value is not None}
+    if options:
+        request["options"] = options
+    return request
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ResponseCache:
+    """
+    Exact and semantic cache of complete answers.
+
+    Parameters:
+        ttl_seconds (float): Age after which an answer is no longer served.
+        threshold (float): Cosine similarity from which two queries over the
+            same context get the same answer.
+        max_per_scope (int): Query embeddings remembered per scope.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, size_limit_mb=DEFAULT_SIZE_LIMIT_MB, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 threshold=DEFAULT_SIMILARITY_THRESHOLD, max_per_scope=DEFAULT_MAX_PER_SCOPE):
+        self._cache = diskcache.Cache(
+            directory,
+            size_limit=int(size_limit_mb) * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+        self.ttl_seconds = float(ttl_seconds)
+        self.threshold = float(threshold)
+        self.max_per_scope = max_per_scope
+        self._stats_lock = threading.Lock()
+        self._stats = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0}
+
+    @staticmethod
+    def exact_key(model, options, prompt, fields=None):
+        return "exact:" + _digest(_request(model, options, fields), prompt)
+
+    @staticmethod
+    def scope_key(model, options, context, fields=None):
+        return "semantic:" + _digest(_request(model, options, fields), context)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, model, options, prompt, context=None, query_embedding=None, fields=None):
+        """
+        Cached answer to ``prompt``, or None.
+
+        The semantic layer is consulted when the exact one misses and both
+        a non-empty ``context`` and ``query_embedding`` are given. ``fields``
+        are the other request fields (``system``, ``images``...).
+        """
+        self._count("lookups")
+        text = self._cache.get(self.exact_key(model, options, prompt, fields))
+        if text is not None:
+            self._count("exact_hits")
+            return text
+        if not context or query_embedding is None:
+            return None
+        query = _unit(query_embedding)
+        oldest = time.time() - self.ttl_seconds
+        best, best_score = None, self.threshold
+        for entry in self._cache.get(self.scope_key(model, options, context, fields), ()):
+            embedding = np.frombuffer(entry["embedding"], dtype=np.float32)
+            if entry["created"] < oldest or embedding.shape != query.shape:
+                continue
+            score = float(embedding @ query)
+            if score >= best_score:
+                best, best_score = entry["text"], score
+        if best is not None:
+            self._count("semantic_hits")
+        return best
+
+    def set(self, model, options, prompt, text, context=None, query_embedding=None, fields=None):
+        """Store a complete answer in the exact layer and, given a context and query embedding, the semantic one."""
+        self._cache.set(self.exact_key(model, options, prompt, fields), text, expire=self.ttl_seconds)
+        # Answers written without retrieved text have nothing in common to scope them by.
+        if not context or query_embedding is None:
+            return
+        key = self.scope_key(model, options, context, fields)
+        now = time.time()
+        entry = {"embedding": _unit(query_embedding).tobytes(), "text": text, "created": now}
+        with self._cache.transact():
+            entries = [
+                other for other in self._cache.get(key, ())
+                if other["created"] >= now - self.ttl_seconds
+            ]
+            entries = [entry] + entries[:self.max_per_scope - 1]
+            self._cache.set(key, entries, expire=self.ttl_seconds)
+
+    def stats(self):
+        """Lookup and hit counters of this process, with the overall ``hit_rate``."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        stats["hit_rate"] = hits / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+    def clear(self):
+        self._cache.clear()
+
+    def close(self):
+        self._cache.close()
+
+
+def get_response_cache(config, directory=RESPONSE_CACHE_DIR):
+    """
+    Return the process-wide cache for ``directory`` configured from ``config``,
+    or None if caching is disabled or diskcache is missing.
+    """
+    if diskcache is None or not config["response_cache"]:
+        return None
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = ResponseCache(directory, int(config["response_cache_mb"]))
+        cache = _caches[directory]
+    cache.ttl_seconds = float(config["response_cache_ttl_hours"]) * 3600
+    cache.threshold = float(config["response_cache_similarity"])
+    return cache
+
+
+def replay(text):
+    """Yield ``text`` in word-sized pieces, the way a streamed generation arrives."""
+    for match in _PIECE_RE.finditer(text):
+        yield match.group(0)
+
+
+def generate_cached(client, model, prompt, cache, options=None, context=None, query_embedding=None, **fields):
+    """
+    Stream the answer to ``prompt``: replayed from ``cache`` on a hit,
+    generated otherwise and stored once it completed.
+
+    Parameters:
+        client (LLMClient): Client generating the misses.
+        cache (ResponseCache): Cache to consult; None disables caching.
+        context (str): Retrieved text the prompt was built from; scopes the
+            semantic layer, which is skipped when it is empty.
+        query_embedding: Embedding of the user's question for the semantic layer.
+        fields: Other request fields, see ``LLMClient.generate_stream``;
+            they are part of the cache keys.
+
+    Yields:
+        str: Pieces of the answer.
+    """
+    if cache is not None:
+        text = cache.get(model, options, prompt, context, query_embedding, fields)
+        if text is not None:
+            yield from replay(text)
+            return
+    generation = client.generate_stream(model, prompt, options, **fields)
+    with generation:
+        yield from generation
+    # Stopped or failed generations are not worth serving again.
+    if cache is not None and generation.done:
+        cache.set(model, options, prompt, generation.text, context, query_embedding, fields)
@@ -0,0 +1,193 @@
+"""
+Vectorized similarity search over indices opened with ``src.index_store``.
+
+Embeddings are L2-normalized when they are written, so cosine similarity is
+a single matrix-vector product over the (memory-mapped) embedding matrix.
+Segments that carry an ANN graph (see ``src.ann``) are searched through it
+instead of the brute-force scan, and tombstoned rows are filtered out before
+the per-segment results are merged. Segments with quantized codes (see
+``src.quantization``) are scanned over the codes and a shortlist is rescored
+at full precision.
+
+When the query text is given, segments with a BM25 index (see ``src.bm25``)
+are also searched lexically and the two rankings are merged with reciprocal
+rank fusion, so exact identifiers and error messages are not lost to the
+embedding. On large segments without an ANN graph the lexical candidates
+double as a pre-filter: only their rows are scored against the embedding.
+"""
+
+import numpy as np
+
+# Reciprocal rank fusion constant from Cormack et al.; larger values flatten the ranks.
+DEFAULT_RRF_K = 60
+DEFAULT_PREFILTER_MIN_ROWS = 50000
+DEFAULT_RESCORE_FACTOR = 4
+
+
+def normalize(vectors):
+    """L2-normalize the rows of ``vectors`` (float32), leaving zero rows untouched."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores, k):
+    """Return the indices of the ``k`` largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def score_all(segment, query_embedding):
+    """Cosine similarity of the query against every row of a segment."""
+    embeddings = segment["embeddings"]
+    query = normalize(query_embedding)
+    if embeddings.shape[1] != query.shape[0]:
+        raise ValueError(
+            f"Query dimension {query.shape[0]} does not match index dimension {embeddings.shape[1]}"
+        )
+    scores = embeddings @ query
+    if not segment["info"].get("normalized"):
+        norms = np.linalg.norm(embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        scores = scores / norms
+    return scores
+
+
+def score_rows(segment, query_embedding, rows):
+    """Cosine similarity of the query against the given rows of a segment only."""
+    embeddings = segment["embeddings"][rows]
+    scores = embeddings @ normalize(query_embedding)
+    if not segment["info"].get("normalized"):
+        norms = np.linalg.norm(embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        scores = scores / norms
+    return scores
+
+
+def search_segment(segment, query_embedding, top_k, rescore_factor=DEFAULT_RESCORE_FACTOR):
+    """Return (rows, scores) of the ``top_k`` live rows of one segment, best first."""
+    deleted = segment.get("deleted")
+    if segment.get("ann") is not None:
+        query = normalize(query_embedding)
+        k = top_k
+        while True:
+            rows, scores = segment["ann"].search(query, k)
+            if deleted is not None:
+                live = ~deleted[rows]
+                rows, scores = rows[live], scores[live]
+            # Tombstoned neighbours crowded out live ones: widen the search.
+            if len(rows) >= top_k or k >= len(segment["embeddings"]):
+                return rows[:top_k], scores[:top_k]
+            k *= 4
+    if segment.get("quantized") is not None:
+        scores = segment["quantized"].scores(normalize(query_embedding))
+        if deleted is not None:
+            scores[deleted] = -np.inf
+        shortlist = top_k_indices(scores, max(top_k, int(rescore_factor * top_k)))
+        shortlist = np.sort(shortlist[np.isfinite(scores[shortlist])])
+        exact = score_rows(segment, query_embedding, shortlist)
+        order = top_k_indices(exact, top_k)
+        return shortlist[order], exact[order]
+    scores = score_all(segment, query_embedding)
+    if deleted is not None:
+        scores[deleted] = -np.inf
+    rows = top_k_indices(scores, top_k)
+    rows = rows[np.isfinite(scores[rows])]
+    return rows, scores[rows]
+
+
+def search(collection, query_embedding, top_k, query_text=None, rrf_k=DEFAULT_RRF_K,
+           prefilter_min_rows=DEFAULT_PREFILTER_MIN_ROWS, rescore_factor=DEFAULT_RESCORE_FACTOR):
+    """
+    Return the ``top_k`` live rows most relevant to the query across all
+    segments of an index opened with ``src.index_store.open_index``.
+
+    Parameters:
+        query_text (str): Enables hybrid retrieval: BM25 and vector rankings
+            are fused with reciprocal rank fusion. Vector search only if None.
+        rrf_k (int): Reciprocal rank fusion constant.
+        prefilter_min_rows (int): Segments without an ANN graph and at least
+            this many rows only score the BM25 candidates against the embedding.
+        rescore_factor (int): Shortlist size, as a multiple of the number of
+            rows wanted, rescored at full precision on quantized segments.
+
+    Returns:
+        list: Hits as dicts with ``segment``, ``row``, ``score``, ``document``,
+        ``metadata`` and ``aliases`` (other paths of near-duplicates of the
+        document), sorted by descending score. ``score`` is the cosine
+        similarity, or the fused score for hybrid searches, in which case
+        ``vector_score`` and ``lexical_score`` are included when available.
+    """
+    hybrid = bool(query_text) and any(segment.get("bm25") is not None for segment in collection["segments"])
+    n_candidates = max(4 * top_k, 50) if hybrid else top_k
+    vector, lexical = [], []
+    for segment in collection["segments"]:
+        if len(segment["embeddings"]) == 0:
+            continue
+        lexical_rows = None
+        if hybrid and segment.get("bm25") is not None:
+            lexical_rows, scores = segment["bm25"].search(query_text, n_candidates, segment.get("deleted"))
+            lexical.extend((float(score), segment, int(row)) for row, score in zip(lexical_rows, scores))
+        if (
+            lexical_rows is not None and len(lexical_rows) >= n_candidates
+            and segment.get("ann") is None and segment.get("quantized") is None
+            and len(segment["embeddings"]) >= prefilter_min_rows
+        ):
+            rows = np.sort(lexical_rows)
+            scores = score_rows(segment, query_embedding, rows)
+        else:
+            rows, scores = search_segment(segment, query_embedding, n_candidates, rescore_factor)
+        vector.extend((float(score), segment, int(row)) for row, score in zip(rows, scores))
+    vector.sort(key=lambda candidate: -candidate[0])
+    lexical.sort(key=lambda candidate: -candidate[0])
+
+    if not lexical:
+        ranked = [(score, segment, row, {}) for score, segment, row in vector[:top_k]]
+    else:
+        fused = {}
+        for field, candidates in (("vector_score", vector), ("lexical_score", lexical)):
+            for rank, (score, segment, row) in enumerate(candidates[:n_candidates]):
+                entry = fused.setdefault((segment["name"], row), [0.0, segment, row, {}])
+                entry[0] += 1.0 / (rrf_k + rank + 1)
+                entry[3][field] = score
+        ranked = sorted(fused.values(), key=lambda entry: -entry[0])[:top_k]
+    aliases = collection.get("aliases", {})
+    return [
+        {
+            "segment": segment["name"],
+            "row": row,
+            "score": score,
+            "document": segment["documents"][row],
+            "metadata": segment["metadata"][row],
+            "aliases": aliases.get(segment["metadata"][row]["path"], []),
+            **scores,
+        }
+        for score, segment, row, scores in ranked
+    ]
+
+
+def source_label(metadata):
+    """``path``, or ``path:start-end symbol`` for chunks of source files."""
+    label = metadata["path"]
+    if metadata.get("start_line") is not None:
+        label += f":{metadata['start_line']}-{metadata['end_line']}"
+    if metadata.get("symbol"):
+        label += f" {metadata['symbol']}"
+    return label
+
+
+def format_passage(hit):
+    """A retrieved passage labelled with its source."""
+    return f"[{source_label(hit['metadata'])}]\n{hit['document']}"
+
+
+def format_context(hits):
+    """Join retrieved passages into a prompt context, each labelled with its source."""
+    return "\n\n".join(format_passage(hit) for hit in hits)
@@ -1,47 +1,100 @@
 import streamlit as st
+import ast
 import os
+from src.repo_filters import DEFAULT_EXCLUDES
+from src.response_cache import get_response_cache
 
 # Default configuration
 DEFAULT_CONFIG = {
     "llm_model": "openai-gpt-4",
     "embedding_model": "sentence-transformers/all-mpnet-base-v2",
     "temperature": 0.7,
-    "max_tokens": 1024,
+    "max_tokens": 1024,  # answer length; reserved in the context window
+    "context_max_tokens": 8192,  # largest num_ctx; smaller prompts get the smallest window that fits
     "top_p": 0.9,
+    "response_cache": True,  # reuse answers to repeated and rephrased questions
+    "response_cache_mb": 256,
+    "response_cache_ttl_hours": 24,
+    "response_cache_similarity": 0.95,  # query embedding cosine for a rephrased question over the same context
     "server_type": "TGI",  # Options: ollama, llamacpp, vLLM, TGI
     "server_endpoint": "http://localhost:8080",
     "api_token": "your-api-token",
     "vector_store_path": "./vectorstore",
     "retrieval_top_k": 10,
+    "hybrid_search": True,  # fuse BM25 keyword matches with vector similarity
+    "rrf_k": 60,
+    "lexical_prefilter_min_rows": 50000,  # score only BM25 candidates on larger brute-force segments
+    "extraction_workers": 0,  # processes extracting uploaded files; 0 uses every CPU
+    "extraction_pages_per_task": 32,  # PDF pages handed to one extraction process at a time
+    "crawl_max_connections": 32,  # pooled connections shared by the crawler
+    "crawl_connections_per_host": 4,
+    "crawl_timeout": 20,  # seconds per request
+    "crawl_max_pages": 1000,  # 0 = unlimited
+    "http_cache_mb": 1024,  # crawled pages kept for conditional revalidation
+    "repo_clone_depth": 1,  # commits of history kept in repository mirrors; 0 = full history
+    "repo_max_file_kb": 512,  # larger repository files are neither downloaded nor indexed
+    "repo_respect_gitignore": True,
+    "repo_exclude_patterns": ", ".join(DEFAULT_EXCLUDES),  # gitignore-style patterns
+    "ingest_prefetch_batches": 2,  # chunk batches buffered ahead of the embedding stage
+    "jobs_max_concurrent": 1,  # indexing jobs run at once (read at server start)
+    "job_checkpoint_seconds": 30,  # indexed documents committed this often, so jobs can resume
+    "job_embedding_concurrency": 2,  # embedding requests in flight per job; leaves room for queries
+    "chunk_size": 300,  # tokens per indexed chunk
+    "chunk_overlap": 50,
+    "code_aware_chunking": True,  # split source files at function/class boundaries
+    "dedup_documents": True,  # embed near-duplicate documents once, keeping every path
+    "dedup_threshold": 0.9,  # estimated Jaccard similarity of near-duplicates
+    "embedding_batch_size": 32,  # texts per /api/embed request
+    "embedding_concurrency": 4,  # embedding requests in flight
+    "embedding_cache_mb": 2048,  # on-disk embedding cache shared by all indices
+    "embedding_quantization": "none",  # Options: none, float16, int8, pq (codes kept in RAM)
+    "quantization_rescore_factor": 4,  # shortlist rescored at full precision, x top-k
+    "pq_subvector_dim": 8,
+    "ann_backend": "auto",  # Options: auto, faiss, hnswlib, brute
+    "ann_min_rows": 20000,
+    "ann_hnsw_m": 32,
+    "ann_ef_construction": 200,
+    "ann_ef_search": 128,
+    "index_cache_mb": 4096,  # memory budget for indices kept open across sessions
+    "compaction_max_segments": 8,  # merge index segments once there are more than this
+    "compaction_max_deleted_ratio": 0.3,  # ... or once this share of rows is tombstoned
 }
 
 CONFIG_FILE = "./config.py"
 
 
 def save_config(config):
-    """Saves the configuration to a Python file."""
+    """Saves the configuration to a Python file, one ``key = repr(value)`` line per setting."""
     with open(CONFIG_FILE, "w") as f:
         f.write("# Configuration for the RAG system\n\n")
         for key, value in config.items():
-            if isinstance(value, str):
-                f.write(f'{key} = "{value}"\n')
-            else:
-                f.write(f"{key} = {value}\n")
+            # repr keeps multi-line strings (exclude patterns) on one line.
+            f.write(f"{key} = {value!r}\n")
     st.success(f"Configuration saved to {CONFIG_FILE}")
 
 
+def parse_config_value(value):
+    """Parse a value written by :func:`save_config`, or by its older unquoted-string format."""
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value.strip('"')
+
+
 def load_config():
     """Loads the configuration from the Python file if it exists."""
     if os.path.exists(CONFIG_FILE):
         config = {}
         with open(CONFIG_FILE, "r") as f:
             for line in f:
-                if line.strip() and not line.strip().startswith("#"):
-                    key, value = line.strip().split(" = ", 1)
-                    value = value.strip('"') if value.startswith('"') else eval(value)
-                    config[key] = value
-        return config
-    return DEFAULT_CONFIG
+                line = line.strip()
+                # Skip comments and the stray continuation lines older versions wrote for multi-line values.
+                if not line or line.startswith("#") or " = " not in line:
+                    continue
+                key, value = line.split(" = ", 1)
+                config[key] = parse_config_value(value)
+        return {**DEFAULT_CONFIG, **config}
+    return dict(DEFAULT_CONFIG)
 
 
 def main_settings():
@@ -73,12 +126,43 @@ def main_settings():
     config["max_tokens"] = st.number_input(
         "Max Tokens:", min_value=1, max_value=4096, value=int(config["max_tokens"])
     )
+    config["context_max_tokens"] = st.number_input(
+        "Max Context Window (tokens):", min_value=2048, max_value=131072, value=int(config["context_max_tokens"])
+    )
     config["top_p"] = st.slider(
         "Top-p (Nucleus Sampling):", 0.0, 1.0, float(config["top_p"]), step=0.01
     )
+    config["response_cache"] = st.checkbox(
+        "Cache Answers", value=bool(config["response_cache"])
+    )
+    config["response_cache_mb"] = st.number_input(
+        "Answer Cache Size (MB):", min_value=0, value=int(config["response_cache_mb"])
+    )
+    config["response_cache_ttl_hours"] = st.number_input(
+        "Answer Cache Lifetime (hours):", min_value=0.0, value=float(config["response_cache_ttl_hours"]), step=1.0
+    )
+    config["response_cache_similarity"] = st.slider(
+        "Rephrased Question Similarity Threshold:", 0.5, 1.0, float(config["response_cache_similarity"]), step=0.01
+    )
+    response_cache = get_response_cache(config)
+    if response_cache is not None:
+        stats = response_cache.stats()
+        st.caption(
+            f"Answer cache since start: {stats['lookups']} lookups, {stats['exact_hits']} exact and "
+            f"{stats['semantic_hits']} rephrased hits ({stats['hit_rate']:.0%} hit rate)"
+        )
     config["retrieval_top_k"] = st.number_input(
         "Retrieval Top-K:", min_value=1, max_value=100, value=int(config["retrieval_top_k"])
     )
+    config["hybrid_search"] = st.checkbox(
+        "Hybrid Search (BM25 + vectors)", value=bool(config["hybrid_search"])
+    )
+    config["rrf_k"] = st.number_input(
+        "Rank Fusion Constant (k):", min_value=1, max_value=1000, value=int(config["rrf_k"])
+    )
+    config["lexical_prefilter_min_rows"] = st.number_input(
+        "Keyword Pre-filter Above (rows):", min_value=0, value=int(config["lexical_prefilter_min_rows"])
+    )
 
     # Inference Server Configuration
     st.subheader("Inference Server")
@@ -95,6 +179,108 @@ def main_settings():
     config["vector_store_path"] = st.text_input(
         "Vector Store Path:", config["vector_store_path"]
     )
+    config["embedding_batch_size"] = st.number_input(
+        "Embedding Batch Size:", min_value=1, max_value=512, value=int(config["embedding_batch_size"])
+    )
+    config["embedding_concurrency"] = st.number_input(
+        "Concurrent Embedding Requests:", min_value=1, max_value=32, value=int(config["embedding_concurrency"])
+    )
+    config["embedding_cache_mb"] = st.number_input(
+        "Embedding Cache Size (MB):", min_value=0, value=int(config["embedding_cache_mb"])
+    )
+    config["extraction_workers"] = st.number_input(
+        "Extraction Processes (0 = all CPUs):", min_value=0, max_value=256, value=int(config["extraction_workers"])
+    )
+    config["extraction_pages_per_task"] = st.number_input(
+        "PDF Pages per Extraction Task:", min_value=1, max_value=10000, value=int(config["extraction_pages_per_task"])
+    )
+    config["crawl_max_connections"] = st.number_input(
+        "Crawler Connections:", min_value=1, max_value=512, value=int(config["crawl_max_connections"])
+    )
+    config["crawl_connections_per_host"] = st.number_input(
+        "Crawler Connections per Host:", min_value=1, max_value=64, value=int(config["crawl_connections_per_host"])
+    )
+    config["crawl_timeout"] = st.number_input(
+        "Crawler Request Timeout (s):", min_value=1, max_value=600, value=int(config["crawl_timeout"])
+    )
+    config["crawl_max_pages"] = st.number_input(
+        "Crawler Page Limit (0 = unlimited):", min_value=0, value=int(config["crawl_max_pages"])
+    )
+    config["http_cache_mb"] = st.number_input(
+        "Crawler HTTP Cache Size (MB):", min_value=0, value=int(config["http_cache_mb"])
+    )
+    config["repo_clone_depth"] = st.number_input(
+        "Repository History Depth (0 = full):", min_value=0, value=int(config["repo_clone_depth"])
+    )
+    config["repo_max_file_kb"] = st.number_input(
+        "Repository File Size Cap (KB, 0 = none):", min_value=0, value=int(config["repo_max_file_kb"])
+    )
+    config["repo_respect_gitignore"] = st.checkbox(
+        "Honour .gitignore Files", value=bool(config["repo_respect_gitignore"])
+    )
+    config["repo_exclude_patterns"] = st.text_area(
+        "Repository Exclude Patterns (comma or newline separated):", config["repo_exclude_patterns"]
+    )
+    config["ingest_prefetch_batches"] = st.number_input(
+        "Prefetched Chunk Batches:", min_value=1, max_value=64, value=int(config["ingest_prefetch_batches"])
+    )
+    config["jobs_max_concurrent"] = st.number_input(
+        "Concurrent Indexing Jobs (applies after a restart):", min_value=1, max_value=16, value=int(config["jobs_max_concurrent"])
+    )
+    config["job_checkpoint_seconds"] = st.number_input(
+        "Indexing Job Checkpoint Interval (s):", min_value=5, max_value=3600, value=int(config["job_checkpoint_seconds"])
+    )
+    config["job_embedding_concurrency"] = st.number_input(
+        "Embedding Requests in Flight per Job:", min_value=1, max_value=64, value=int(config["job_embedding_concurrency"])
+    )
+    config["chunk_size"] = st.number_input(
+        "Chunk Size (tokens):", min_value=32, max_value=8192, value=int(config["chunk_size"])
+    )
+    config["chunk_overlap"] = st.number_input(
+        "Chunk Overlap (tokens):", min_value=0, max_value=int(config["chunk_size"]) - 1, value=min(int(config["chunk_overlap"]), int(config["chunk_size"]) - 1)
+    )
+    config["code_aware_chunking"] = st.checkbox(
+        "Chunk Source Files by Function/Class", value=bool(config["code_aware_chunking"])
+    )
+    config["dedup_documents"] = st.checkbox(
+        "Skip Near-Duplicate Documents", value=bool(config["dedup_documents"])
+    )
+    config["dedup_threshold"] = st.slider(
+        "Near-Duplicate Similarity Threshold:", 0.5, 1.0, float(config["dedup_threshold"]), step=0.01
+    )
+    config["index_cache_mb"] = st.number_input(
+        "Index Cache Budget (MB):", min_value=0, value=int(config["index_cache_mb"])
+    )
+    config["compaction_max_segments"] = st.number_input(
+        "Compact Index Above (segments):", min_value=1, max_value=256, value=int(config["compaction_max_segments"])
+    )
+    config["compaction_max_deleted_ratio"] = st.slider(
+        "Compact Index Above (deleted row share):", 0.0, 1.0, float(config["compaction_max_deleted_ratio"]), step=0.05
+    )
+    config["embedding_quantization"] = st.selectbox(
+        "Embedding Quantization:", ["none", "float16", "int8", "pq"], index=["none", "float16", "int8", "pq"].index(config["embedding_quantization"])
+    )
+    config["quantization_rescore_factor"] = st.number_input(
+        "Rescore Shortlist (x Top-K):", min_value=1, max_value=100, value=int(config["quantization_rescore_factor"])
+    )
+    config["pq_subvector_dim"] = st.number_input(
+        "PQ Sub-vector Dimensions:", min_value=1, max_value=64, value=int(config["pq_subvector_dim"])
+    )
+    config["ann_backend"] = st.selectbox(
+        "ANN Backend:", ["auto", "faiss", "hnswlib", "brute"], index=["auto", "faiss", "hnswlib", "brute"].index(config["ann_backend"])
+    )
+    config["ann_min_rows"] = st.number_input(
+        "Build ANN Graph Above (rows):", min_value=0, value=int(config["ann_min_rows"])
+    )
+    config["ann_hnsw_m"] = st.number_input(
+        "HNSW M (graph degree):", min_value=4, max_value=128, value=int(config["ann_hnsw_m"])
+    )
+    config["ann_ef_construction"] = st.number_input(
+        "HNSW efConstruction:", min_value=8, max_value=2048, value=int(config["ann_ef_construction"])
+    )
+    config["ann_ef_search"] = st.number_input(
+        "HNSW efSearch:", min_value=8, max_value=2048, value=int(config["ann_ef_search"])
+    )
 
     # Save Config Button
     if st.button("Save Configuration"):
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules are imported as ``src.<module>`` from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
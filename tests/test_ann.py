@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src import ann
+from src.ann import build_ann, load_ann, resolve_backend
+
+
+def unit_rows(rng, rows, dim=16):
+    vectors = rng.normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_small_indices_stay_on_brute_force():
+    assert resolve_backend({"ann_backend": "auto", "ann_min_rows": 100}, 99) is None
+    assert resolve_backend({"ann_backend": "brute", "ann_min_rows": 0}, 10 ** 6) is None
+
+
+@pytest.mark.parametrize("backend", ["faiss", "hnswlib"])
+def test_concurrent_searches_with_different_k(backend, tmp_path, rng):
+    if getattr(ann, backend) is None:
+        pytest.skip(f"{backend} is not installed")
+    embeddings = unit_rows(rng, 500)
+    config = {"ann_backend": backend, "ann_min_rows": 0, "ann_hnsw_m": 8, "ann_ef_construction": 64, "ann_ef_search": 16}
+    info = {"ann": build_ann(embeddings, str(tmp_path), config), "dim": embeddings.shape[1]}
+    index = load_ann(str(tmp_path), info)
+    queries = unit_rows(rng, 40)
+
+    def search(i):
+        k = 5 if i % 2 else 100
+        rows, scores = index.search(queries[i], k)
+        exact = np.argsort(-(embeddings @ queries[i]))[:k]
+        return k, rows, scores, exact
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(search, range(len(queries))))
+    recalls = []
+    for k, rows, scores, exact in results:
+        assert len(rows) == k
+        assert np.all(np.diff(scores) <= 1e-5)
+        recalls.append(len(set(rows.tolist()) & set(exact.tolist())) / k)
+    assert np.mean(recalls) > 0.9
@@ -0,0 +1,39 @@
+import pytest
+
+from src.chunking import chunk_text, count_tokens, token_spans
+
+
+def test_chunks_cover_the_text_with_overlap():
+    text = " ".join(f"word{i}" for i in range(500))
+    chunks = chunk_text(text, chunk_size=100, chunk_overlap=20)
+    assert len(chunks) > 1
+    assert [chunk["chunk"] for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert text[chunk["start"]:chunk["end"]] == chunk["text"]
+        assert count_tokens(chunk["text"]) <= 100
+    assert chunks[0]["start"] == 0
+    assert chunks[-1]["end"] == len(text)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # Consecutive windows overlap, so no passage is lost at a boundary.
+        assert chunk["start"] < previous["end"]
+
+
+def test_short_and_empty_text():
+    assert chunk_text("", 10, 2) == []
+    assert chunk_text("   \n  ", 10, 2) == []
+    chunks = chunk_text("  just a few words  ", 10, 2)
+    assert [chunk["text"] for chunk in chunks] == ["just a few words"]
+    assert chunks[0]["start"] == 2
+
+
+def test_overlap_must_be_smaller_than_size():
+    with pytest.raises(ValueError):
+        chunk_text("text", 10, 10)
+
+
+def test_token_spans_are_offsets():
+    text = "Hello, world! Ünïcode text."
+    spans = token_spans(text)
+    assert len(spans) == count_tokens(text)
+    assert spans == sorted(spans)
+    assert all(0 <= start < end <= len(text) for start, end in spans)
@@ -0,0 +1,145 @@
+from src.code_chunking import chunk_code, chunk_document, language
+
+PYTHON = '''import os
+
+
+def small():
+    return 1
+
+
+class Store:
+    """A store."""
+
+    def get(self, key):
+        return self.data[key]
+
+    def put(self, key, value):
+        self.data[key] = value
+
+
+@decorator
+def decorated():
+    pass
+'''
+
+JAVASCRIPT = '''const x = "{ not a brace";
+
+function add(a, b) {
+  // } not a brace either
+  return a + b;
+}
+
+class Counter {
+  increment() {
+    this.count += 1;
+  }
+}
+'''
+
+MARKDOWN = '''# Title
+
+Intro text.
+
+## Install
+
+Run the installer.
+
+## Usage
+
+Call the tool.
+'''
+
+
+def by_symbol(chunks):
+    return {chunk["symbol"]: chunk for chunk in chunks}
+
+
+def test_language():
+    assert language("pkg/mod.py") == "python"
+    assert language("https://example.com/app.js?v=2") == "brace"
+    assert language("README.md") == "markdown"
+    assert language("notes.txt") is None
+
+
+def test_python_chunks_are_whole_definitions():
+    chunks = chunk_code(PYTHON, "python", chunk_size=20, chunk_overlap=2)
+    symbols = by_symbol(chunks)
+    # The import is merged into the first definition.
+    assert symbols["small"]["text"] == "import os\n\n\ndef small():\n    return 1"
+    assert (symbols["small"]["start_line"], symbols["small"]["end_line"]) == (1, 5)
+    assert symbols["Store.get"]["text"] == "def get(self, key):\n        return self.data[key]"
+    # The class is too large for one chunk and is split into its methods.
+    assert any("Store.get" in symbol for symbol in symbols if symbol)
+    assert any("Store.put" in symbol for symbol in symbols if symbol)
+    decorated = next(chunk for chunk in chunks if chunk["symbol"] and "decorated" in chunk["symbol"])
+    assert decorated["text"].startswith("@decorator")
+    for chunk in chunks:
+        assert PYTHON[chunk["start"]:chunk["end"]] == chunk["text"]
+
+
+def test_small_definitions_are_merged():
+    chunks = chunk_code(PYTHON, "python", chunk_size=500, chunk_overlap=50)
+    assert len(chunks) == 1
+    assert chunks[0]["symbol"] == "small, Store, decorated"
+
+
+def test_brace_scanner_skips_strings_and_comments():
+    chunks = chunk_code(JAVASCRIPT, "brace", chunk_size=25, chunk_overlap=2)
+    symbols = by_symbol(chunks)
+    assert symbols["add"]["text"] == JAVASCRIPT[JAVASCRIPT.index("function add"):JAVASCRIPT.index("}\n\nclass") + 1]
+    assert (symbols["add"]["start_line"], symbols["add"]["end_line"]) == (3, 6)
+    assert any(symbol and "Counter" in symbol for symbol in symbols)
+
+
+def test_brace_scanner_skips_block_comments_and_template_literals():
+    source = (
+        "/* don't */ const a = 'b';\n"
+        "function first() {\n"
+        "  return 1;\n"
+        "}\n"
+        "\n"
+        "function second() {\n"
+        "  const html = `\n"
+        "    <div>{</div>\n"
+        "  `;\n"
+        "  return html;\n"
+        "}\n"
+        "\n"
+        "function third() {\n"
+        "  return 3;\n"
+        "}\n"
+    )
+    symbols = by_symbol(chunk_code(source, "brace", chunk_size=30, chunk_overlap=0))
+    assert (symbols["first"]["start_line"], symbols["first"]["end_line"]) == (1, 4)
+    assert (symbols["second"]["start_line"], symbols["second"]["end_line"]) == (6, 11)
+    assert (symbols["third"]["start_line"], symbols["third"]["end_line"]) == (13, 15)
+
+
+def test_markdown_is_cut_at_headings():
+    chunks = chunk_code(MARKDOWN, "markdown", chunk_size=8, chunk_overlap=1)
+    texts = [chunk["text"] for chunk in chunks]
+    assert any(text.startswith("## Install") and "Usage" not in text for text in texts)
+    assert any(text.startswith("## Usage") for text in texts)
+
+
+def test_unparsable_python_falls_back_to_indentation():
+    source = "def ok():\n    return 1\n\n\ndef broken(:\n    pass\n"
+    chunks = chunk_code(source, "python", chunk_size=8, chunk_overlap=1)
+    assert [(chunk["symbol"], chunk["text"]) for chunk in chunks] == [
+        ("ok", "def ok():\n    return 1"), ("broken", "def broken(:\n    pass"),
+    ]
+
+
+def test_oversized_definition_is_windowed():
+    body = "\n".join(f"    x{i} = {i}" for i in range(200))
+    source = f"def big():\n{body}\n"
+    chunks = chunk_code(source, "python", chunk_size=50, chunk_overlap=10)
+    assert len(chunks) > 1
+    assert {chunk["symbol"] for chunk in chunks} == {"big"}
+
+
+def test_chunk_document_uses_plain_windows_for_text():
+    chunks = chunk_document("notes.txt", "def looks_like_code(): pass", 50, 5)
+    assert "symbol" not in chunks[0]
+    chunks = chunk_document("mod.py", "def f(): pass", 50, 5, code_aware=False)
+    assert "symbol" not in chunks[0]
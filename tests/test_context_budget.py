@@ -0,0 +1,93 @@
+from src.chunking import count_tokens
+from src.context_budget import (
+    NUM_CTX_STEPS, SAFETY_MARGIN, TRUNCATION_MARKER, ContextBudget, fit_num_ctx, rag_prompt, truncate_tokens,
+)
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def room(budget):
+    return int((budget.max_ctx - budget.answer_tokens) / (1 + SAFETY_MARGIN))
+
+
+def test_truncate_tokens_counts_the_marker():
+    text = words(200)
+    cut = truncate_tokens(text, 50)
+    assert cut.endswith(TRUNCATION_MARKER)
+    assert count_tokens(cut) <= 50
+    assert truncate_tokens("short text", 50) == "short text"
+    assert truncate_tokens(text, 1) == ""
+
+
+def test_fit_num_ctx_steps():
+    assert fit_num_ctx(100) == NUM_CTX_STEPS[0]
+    assert fit_num_ctx(3000) == 4096
+    assert fit_num_ctx(5000, max_ctx=4096) == 4096
+    assert fit_num_ctx(10 ** 6, max_ctx=32768) == 32768
+
+
+def test_everything_fits():
+    budget = ContextBudget(max_ctx=4096, answer_tokens=512)
+    plan = budget.pack("question?", "instructions", ["one", "two"], [{"content": "hi"}])
+    assert plan["passages"] == ["one", "two"]
+    assert plan["history"] == [{"content": "hi"}]
+    assert plan["dropped_passages"] == 0
+    assert plan["num_predict"] == 512
+    assert plan["num_ctx"] == 2048
+
+
+def test_passages_are_cut_best_first():
+    budget = ContextBudget(max_ctx=2048, answer_tokens=512)
+    passages = [words(800, "a"), words(800, "b"), words(800, "c")]
+    plan = budget.pack("question?", "instructions", passages)
+    assert plan["passages"][0] == passages[0]
+    assert len(plan["passages"]) == 2
+    assert plan["passages"][1].endswith(TRUNCATION_MARKER)
+    assert plan["dropped_passages"] == 1
+    assert plan["tokens"] + budget.answer_tokens <= budget.max_ctx
+    assert plan["num_ctx"] == 2048
+
+
+def test_answer_reserve_is_at_most_half_the_window():
+    assert ContextBudget(max_ctx=2048, answer_tokens=4096).answer_tokens == 1024
+
+
+def test_long_question_is_truncated():
+    budget = ContextBudget(max_ctx=2048, answer_tokens=512)
+    plan = budget.pack(words(5000))
+    assert plan["question"].endswith(TRUNCATION_MARKER)
+    assert plan["tokens"] + budget.answer_tokens <= budget.max_ctx
+
+
+def test_history_drops_oldest_turns_in_one_go_and_keeps_the_prefix():
+    budget = ContextBudget(max_ctx=2048, answer_tokens=512)
+    history = [{"content": words(100, f"t{i}_")} for i in range(20)]
+    plan = budget.pack("next?", history=history)
+    start = plan["history_start"]
+    assert start > 0
+    assert plan["history"] == history[start:]
+    # Cut to the low-water mark, so the next turns fit without dropping again.
+    assert sum(count_tokens(m["content"]) for m in plan["history"]) <= room(budget) * 0.5
+    history.append({"content": words(100, "new")})
+    again = budget.pack("next?", history=history, history_start=start)
+    assert again["history_start"] == start
+
+
+def test_history_yields_to_passages():
+    budget = ContextBudget(max_ctx=2048, answer_tokens=512)
+    history = [{"content": words(100, f"t{i}_")} for i in range(20)]
+    plan = budget.pack("next?", passages=[words(2000)], history=history)
+    kept = sum(count_tokens(m["content"]) + 4 for m in plan["history"])
+    assert kept <= room(budget) * 0.5
+    assert plan["passages"]
+
+
+def test_same_inputs_give_the_same_prompt():
+    budget = ContextBudget(max_ctx=2048, answer_tokens=256)
+    passages = [words(400, "a"), words(400, "b"), words(400, "c")]
+    first = rag_prompt(budget, "question?", passages)
+    assert rag_prompt(budget, "question?", passages) == first
+    prompt, data, plan = first
+    assert data in prompt and "question?" in prompt
@@ -0,0 +1,93 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+
+from src.crawler import crawl, unreached_pages  # noqa: E402
+
+SITE = {
+    "/docs/": '<html><body><main><p>Index page.</p><a href="a.html">A</a> <a href="gone.html">Gone</a>'
+              '<a href="/blog/">Blog</a></main></body></html>',
+    "/docs/a.html": '<html><head><link rel="stylesheet" href="style.css"><script src="app.js"></script></head>'
+                    '<body><main><p>Page A.</p><a href="b.html">B</a> <a href="notes">Notes</a></main></body></html>',
+    "/docs/b.html": "<html><body><main><p>Page B.</p></main></body></html>",
+    "/docs/style.css": "main { color: red; }",
+    "/docs/app.js": "console.log('app');",
+    "/docs/notes": "Plain text notes.",
+}
+CONTENT_TYPES = {"/docs/style.css": "text/css", "/docs/app.js": "text/javascript", "/docs/notes": "text/plain"}
+
+
+@pytest.fixture
+def requested():
+    return []
+
+
+@pytest.fixture
+def site(requested):
+    async def handler(request):
+        requested.append(request.path)
+        if request.path not in SITE:
+            raise web.HTTPNotFound()
+        return web.Response(text=SITE[request.path], content_type=CONTENT_TYPES.get(request.path, "text/html"))
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{port}/docs/"
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_crawl_follows_links_below_base_url(site):
+    result = crawl(site, depth=3, config={"crawl_max_connections": 4})
+    assert sorted(result["pages"]) == [site, site + "a.html", site + "b.html"]
+    assert "Page B." in result["pages"][site + "b.html"]
+    assert result["gone"] == [site + "gone.html"]
+    assert list(result["errors"]) == [site + "gone.html"]
+    assert not result["truncated"]
+
+
+def test_crawl_only_indexes_html(site, requested):
+    result = crawl(site, depth=3, config={"crawl_max_connections": 4})
+    assert site + "notes" not in result["pages"]
+    assert "/docs/notes" in requested
+    assert "/docs/style.css" not in requested and "/docs/app.js" not in requested
+
+
+def test_crawl_reports_truncation(site):
+    result = crawl(site, depth=3, config={"crawl_max_connections": 4, "crawl_max_pages": 2})
+    assert result["truncated"]
+
+
+def test_unreached_pages_after_a_complete_crawl():
+    base = "https://example.com/docs/"
+    indexed = [base, base + "a.html", base + "b.html", base + "old.html", "http://elsewhere/docs/x.html"]
+    result = {"pages": {base: "", base + "a.html": ""}, "errors": {}, "gone": [], "truncated": False}
+    assert unreached_pages(result, indexed, base) == [base + "b.html", base + "old.html"]
+
+
+def test_incomplete_crawl_only_removes_gone_pages():
+    base = "https://example.com/docs/"
+    indexed = [base, base + "a.html", base + "b.html", base + "gone.html"]
+    result = {
+        "pages": {base: ""}, "errors": {base + "a.html": "timeout", base + "gone.html": "404"},
+        "gone": [base + "gone.html"], "truncated": False,
+    }
+    assert unreached_pages(result, indexed, base) == [base + "gone.html"]
+    result = {"pages": {base: ""}, "errors": {}, "gone": [], "truncated": True}
+    assert unreached_pages(result, indexed, base) == []
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("mmh3")
+
+from src.dedup import NearDuplicateIndex, dedup_documents  # noqa: E402
+
+
+def page(seed, n=300):
+    return " ".join(f"word{(seed * 7919 + i * 104729) % 5003}" for i in range(n))
+
+
+def test_exact_and_near_duplicates_are_collapsed():
+    base = page(1)
+    near = base.replace("word", "word", 1) + " footer"
+    documents = [("a", base), ("b", base.upper()), ("c", near), ("d", page(2)), ("e", "too short")]
+    duplicates = {}
+    kept = [path for path, _ in dedup_documents(documents, NearDuplicateIndex(0.9), duplicates)]
+    assert kept == ["a", "d", "e"]
+    assert duplicates == {"b": "a", "c": "a"}
+
+
+def test_threshold_separates_edited_pages():
+    base = page(3).split()
+    edited = " ".join(base[:150] + [f"new{i}" for i in range(150)])
+    index = NearDuplicateIndex(0.9)
+    assert index.add("a", " ".join(base)) is None
+    assert index.add("b", edited) is None
+
+
+def test_saved_index_finds_duplicates_after_loading(tmp_path):
+    path = str(tmp_path / "dedup" / "1.npz")
+    index = NearDuplicateIndex(0.9)
+    assert index.add("a", page(5)) is None
+    assert index.add("b", "too short") is None
+    index.save(path)
+
+    loaded = NearDuplicateIndex(0.9)
+    assert loaded.load(path)
+    assert loaded.add("c", page(5) + " footer") == "a"
+    assert loaded.add("d", "Too short.") == "b"
+    # A document added again under its own key is not its own duplicate.
+    assert loaded.add("a", page(5)) is None
+    assert not NearDuplicateIndex(0.9).load(str(tmp_path / "missing.npz"))
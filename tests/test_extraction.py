@@ -0,0 +1,76 @@
+import pytest
+
+import src.extraction as extraction
+from src.extraction import extract_html
+
+SHORT_PAGE = """
+<html><head><title>Install</title></head><body>
+<div id="page" class="layout has-sidebar">
+  <div class="sidebar"><a href="/a">Home</a> <a href="/b">Docs</a></div>
+  <main><h1>Install</h1><p>Run pip install example.</p></main>
+  <div class="cookie-banner">We use cookies.</div>
+</div>
+</body></html>
+"""
+
+
+@pytest.fixture(params=["lxml", "bs4"])
+def parser(request, monkeypatch):
+    if request.param == "lxml":
+        pytest.importorskip("lxml")
+    else:
+        pytest.importorskip("bs4")
+        monkeypatch.setattr(extraction, "lxml", None)
+    return request.param
+
+
+def test_short_page_keeps_its_hinted_wrapper(parser):
+    text, links = extract_html(SHORT_PAGE, "https://example.com/install")
+    assert "Run pip install example." in text
+    assert "Home" not in text
+    assert "cookies" not in text
+    assert links == ["https://example.com/a", "https://example.com/b"]
+
+
+def test_article_inside_hinted_wrapper_is_kept(parser):
+    html = '<html><body><div class="content-with-sidebar"><article><p>Short note.</p></article></div></body></html>'
+    text, _ = extract_html(html, "https://example.com/")
+    assert "Short note." in text
+
+
+def test_navigation_is_dropped(parser):
+    html = (
+        "<html><body><nav><a href='/x'>Menu</a></nav><div role='navigation'>Jump</div>"
+        "<header>Site header</header><article><header>Byline</header><p>Body text.</p></article>"
+        "<footer>Copyright</footer></body></html>"
+    )
+    text, links = extract_html(html, "https://example.com/")
+    assert "Body text." in text
+    assert "Byline" in text
+    for chrome in ("Menu", "Jump", "Site header", "Copyright"):
+        assert chrome not in text
+    assert links == ["https://example.com/x"]
+
+
+def make_pdf(pages):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {i} text")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_report_has_wall_time_and_page_rate(workers):
+    files = [("a.pdf", make_pdf(6)), ("b.txt", b"plain text"), ("c.xyz", b"?")]
+    report = []
+    texts = dict(extraction.iter_documents(files, max_workers=workers, pages_per_task=2, report=report))
+    assert "Page 5 text" in texts["a.pdf"]
+    assert texts["b.txt"] == "plain text"
+    entries = {entry["name"]: entry for entry in report}
+    pdf = entries["a.pdf"]
+    assert pdf["pages"] == 6 and pdf["seconds"] > 0
+    assert pdf["pages_per_second"] == pytest.approx(6 / pdf["seconds"])
+    assert entries["c.xyz"]["error"]
@@ -0,0 +1,134 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from src.git_mirror import (
+    diff_blobs, has_commit, head_commit, list_blobs, mirror_path, read_blobs, update_mirror,
+)
+
+if shutil.which("git") is None:
+    pytest.skip("git is not installed", allow_module_level=True)
+
+
+def git(repo, *args):
+    return subprocess.run(
+        ["git", "-C", str(repo), "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+
+def write(repo, path, text):
+    target = repo / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(text)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "main")
+    git(repo, "config", "uploadpack.allowFilter", "true")
+    write(repo, "keep.py", "print('keep')\n")
+    write(repo, "change.py", "x = 1\n")
+    write(repo, "remove.md", "# gone soon\n")
+    write(repo, "old/name.txt", "renamed file\n")
+    write(repo, "big.txt", "x" * 5000)
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "first")
+    return repo
+
+
+def second_commit(repo):
+    write(repo, "change.py", "x = 2\n")
+    write(repo, "added.js", "const a = 1;\n")
+    git(repo, "rm", "-q", "remove.md")
+    (repo / "new").mkdir()
+    git(repo, "mv", "old/name.txt", "new/name.txt")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "second")
+
+
+def url(repo):
+    return f"file://{repo}"
+
+
+def test_mirror_lists_and_reads_files(repo, tmp_path):
+    mirrors = str(tmp_path / "mirrors")
+    mirror = update_mirror(url(repo), mirrors)
+    assert mirror == mirror_path(url(repo), mirrors)
+    assert os.path.basename(mirror).startswith("repo-")
+    commit = head_commit(mirror)
+    assert commit == git(repo, "rev-parse", "HEAD")
+    blobs = {blob["path"]: blob for blob in list_blobs(mirror, commit)}
+    assert sorted(blobs) == ["big.txt", "change.py", "keep.py", "old/name.txt", "remove.md"]
+    assert blobs["keep.py"]["size"] == len("print('keep')\n")
+    contents = dict(read_blobs(mirror, [blobs["keep.py"]["sha"], "0" * 40]))
+    assert contents[blobs["keep.py"]["sha"]] == b"print('keep')\n"
+    assert contents["0" * 40] is None
+
+
+def test_update_fetches_new_commits_and_diffs_them(repo, tmp_path):
+    mirrors = str(tmp_path / "mirrors")
+    mirror = update_mirror(url(repo), mirrors)
+    first = head_commit(mirror)
+    second_commit(repo)
+    assert update_mirror(url(repo), mirrors) == mirror
+    second = head_commit(mirror)
+    assert second != first
+    changed, deleted = diff_blobs(mirror, first, second)
+    assert sorted(blob["path"] for blob in changed) == ["added.js", "change.py", "new/name.txt"]
+    # A rename is a delete of the old path plus an add of the new one.
+    assert sorted(deleted) == ["old/name.txt", "remove.md"]
+    sizes = {blob["path"]: blob["size"] for blob in changed}
+    assert sizes["change.py"] == len("x = 2\n")
+
+
+def test_incremental_plan_falls_back_to_a_full_rebuild(repo, tmp_path, monkeypatch):
+    pytest.importorskip("streamlit")
+    from src import rag_git_web
+    from src.index_store import IndexWriter
+
+    monkeypatch.setattr(rag_git_web, "INDEX_DIR", str(tmp_path / "indices"))
+    mirror = update_mirror(url(repo), str(tmp_path / "mirrors"))
+    first = head_commit(mirror)
+    second_commit(repo)
+    update_mirror(url(repo), str(tmp_path / "mirrors"))
+    second = head_commit(mirror)
+
+    def index_at(commit):
+        with IndexWriter(rag_git_web.INDEX_DIR, "idx", info={"repo_url": url(repo), "commit": commit}):
+            pass
+
+    index_at(first)
+    blobs, deleted, append = rag_git_web.plan_repo_update(mirror, second, url(repo), "idx", True)
+    assert append and sorted(deleted) == ["old/name.txt", "remove.md"]
+    assert sorted(blob["path"] for blob in blobs) == ["added.js", "change.py", "new/name.txt"]
+    # The indexed commit is gone (history rewritten): everything is indexed again.
+    index_at("0" * 40)
+    assert not has_commit(mirror, "0" * 40)
+    blobs, deleted, append = rag_git_web.plan_repo_update(mirror, second, url(repo), "idx", True)
+    assert not append and deleted == []
+    assert len(blobs) == len(list_blobs(mirror, second))
+
+
+def test_partial_clone_leaves_out_large_blobs(repo, tmp_path):
+    mirror = update_mirror(url(repo), str(tmp_path / "mirrors"), blob_limit=1000)
+    blobs = {blob["path"]: blob for blob in list_blobs(mirror, head_commit(mirror))}
+    assert blobs["big.txt"]["size"] is None
+    assert blobs["keep.py"]["size"] is not None
+
+
+def test_raising_the_blob_limit_fetches_the_left_out_blobs(repo, tmp_path):
+    mirrors = str(tmp_path / "mirrors")
+    mirror = update_mirror(url(repo), mirrors, blob_limit=1000)
+    update_mirror(url(repo), mirrors, blob_limit=500)
+    sizes = {blob["path"]: blob["size"] for blob in list_blobs(mirror, head_commit(mirror))}
+    assert sizes["big.txt"] is None
+    update_mirror(url(repo), mirrors, blob_limit=10000)
+    sizes = {blob["path"]: blob["size"] for blob in list_blobs(mirror, head_commit(mirror))}
+    assert sizes["big.txt"] == 5000
+    update_mirror(url(repo), mirrors, blob_limit=0)
+    assert not os.path.exists(mirror + ".old")
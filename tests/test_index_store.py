@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from src.index_store import (
+    IndexWriter, compact_index, has_staged, list_index_paths, open_index, promote_staged, read_manifest, index_path,
+)
+
+
+def write(index_dir, name, docs, rng, append=False, staged=False, deleted=(), info=None):
+    """Write ``docs`` (path -> number of chunks) with random embeddings."""
+    with IndexWriter(index_dir, name, info=info, append=append, staged=staged) as writer:
+        writer.delete(deleted)
+        for path, chunks in docs.items():
+            writer.add_batch(
+                rng.normal(size=(chunks, 8)).astype(np.float32),
+                [f"{path} chunk {i}" for i in range(chunks)],
+                [{"path": path, "chunk": i} for i in range(chunks)],
+            )
+
+
+def live_documents(index_dir, name):
+    collection = open_index(index_dir, name)
+    documents = []
+    for segment in collection["segments"]:
+        for row, document in enumerate(segment["documents"]):
+            if segment["deleted"] is None or not segment["deleted"][row]:
+                documents.append(document)
+    return sorted(documents)
+
+
+def test_append_replaces_rewritten_paths(tmp_path, rng):
+    write(tmp_path, "i", {"a": 2, "b": 3}, rng)
+    write(tmp_path, "i", {"b": 1, "c": 1}, rng, append=True)
+    assert list_index_paths(tmp_path, "i") == ["a", "b", "c"]
+    assert live_documents(tmp_path, "i") == ["a chunk 0", "a chunk 1", "b chunk 0", "c chunk 0"]
+    assert open_index(tmp_path, "i")["info"]["count"] == 4
+
+
+def test_delete_tombstones_rows(tmp_path, rng):
+    write(tmp_path, "i", {"a": 2, "b": 3}, rng)
+    write(tmp_path, "i", {}, rng, append=True, deleted=["b"])
+    manifest = read_manifest(index_path(tmp_path, "i"))
+    assert manifest["segments"][0]["deleted"] == 3
+    assert live_documents(tmp_path, "i") == ["a chunk 0", "a chunk 1"]
+
+
+def test_compaction_drops_tombstones_and_keeps_documents(tmp_path, rng):
+    write(tmp_path, "i", {"a": 2, "b": 3}, rng)
+    write(tmp_path, "i", {"b": 2}, rng, append=True)
+    write(tmp_path, "i", {}, rng, append=True, deleted=["a"])
+    before = live_documents(tmp_path, "i")
+    assert compact_index(tmp_path, "i")
+    manifest = read_manifest(index_path(tmp_path, "i"))
+    assert len(manifest["segments"]) == 1
+    assert manifest["segments"][0]["deleted"] == 0
+    assert live_documents(tmp_path, "i") == before
+    assert not compact_index(tmp_path, "i")
+
+
+def test_aliases_follow_their_original(tmp_path, rng):
+    with IndexWriter(tmp_path, "i") as writer:
+        writer.add_batch(rng.normal(size=(1, 8)), ["a"], [{"path": "a"}])
+        writer.alias("a-copy", "a")
+    assert open_index(tmp_path, "i")["aliases"] == {"a": ["a-copy"]}
+    write(tmp_path, "i", {}, rng, append=True, deleted=["a"])
+    assert open_index(tmp_path, "i")["aliases"] == {}
+
+
+def test_staged_rebuild_leaves_live_index_until_promoted(tmp_path, rng):
+    write(tmp_path, "i", {"old": 2}, rng)
+    write(tmp_path, "i", {"new1": 1}, rng, staged=True)
+    write(tmp_path, "i", {"new2": 1}, rng, append=True, staged=True)
+    assert has_staged(tmp_path, "i")
+    assert list_index_paths(tmp_path, "i") == ["old"]
+
+    generation = read_manifest(index_path(tmp_path, "i"))["generation"]
+    assert promote_staged(tmp_path, "i", {"source": "rebuild"})
+    assert not has_staged(tmp_path, "i")
+    assert list_index_paths(tmp_path, "i") == ["new1", "new2"]
+    collection = open_index(tmp_path, "i")
+    assert collection["info"]["source"] == "rebuild"
+    assert collection["info"]["generation"] == generation + 1
+    # The old segment is gone from disk.
+    live = {entry["name"] for entry in read_manifest(index_path(tmp_path, "i"))["segments"]}
+    on_disk = {p.name for p in (tmp_path / "i").iterdir() if p.name.startswith("seg-")}
+    assert on_disk == live
+
+
+def test_abandoned_rebuild_is_replaced_by_the_next_one(tmp_path, rng):
+    write(tmp_path, "i", {"old": 1}, rng)
+    write(tmp_path, "i", {"partial": 1}, rng, staged=True)
+    write(tmp_path, "i", {"fresh": 1}, rng, staged=True)
+    assert promote_staged(tmp_path, "i")
+    assert list_index_paths(tmp_path, "i") == ["fresh"]
+    assert not promote_staged(tmp_path, "i")
+
+
+def test_failed_writer_commits_nothing(tmp_path, rng):
+    write(tmp_path, "i", {"a": 1}, rng)
+    with pytest.raises(RuntimeError):
+        with IndexWriter(tmp_path, "i", append=True) as writer:
+            writer.add_batch(rng.normal(size=(1, 8)), ["b"], [{"path": "b"}])
+            raise RuntimeError
+    assert list_index_paths(tmp_path, "i") == ["a"]
+
+
+def test_delete_drops_rows_the_writer_already_added(tmp_path, rng):
+    write(tmp_path, "i", {"a": 2, "b": 1}, rng)
+    with IndexWriter(tmp_path, "i", append=True) as writer:
+        writer.add_batch(rng.normal(size=(2, 8)), ["a new 0", "b new 0"], [{"path": "a"}, {"path": "b"}])
+        writer.delete(["a"])
+        writer.add_batch(rng.normal(size=(1, 8)), ["c new 0"], [{"path": "c"}])
+        writer.delete(["c"])
+        writer.add_batch(rng.normal(size=(1, 8)), ["c new 1"], [{"path": "c"}])
+    assert list_index_paths(tmp_path, "i") == ["b", "c"]
+    assert live_documents(tmp_path, "i") == ["b new 0", "c new 1"]
+    assert open_index(tmp_path, "i")["info"]["count"] == 2
+    compact_index(tmp_path, "i")
+    assert live_documents(tmp_path, "i") == ["b new 0", "c new 1"]
+
+
+def test_legacy_pickles_are_migrated(tmp_path, rng):
+    import pickle
+
+    from src.index_store import list_indices
+
+    legacy = {
+        "embeddings": [[1.0, 0.0], [0.0, 1.0], [1.0, 0.0, 0.0]],
+        "documents": ["one", "two", "bad"],
+        "metadata": [{"path": "a"}, {"path": "b"}, {"path": "c"}],
+    }
+    for name, collection in (("empty", {"embeddings": [], "documents": [], "metadata": []}), ("full", legacy)):
+        with open(tmp_path / f"{name}.pkl", "wb") as f:
+            pickle.dump(collection, f)
+    (tmp_path / "broken.pkl").write_bytes(b"not a pickle")
+    assert list_indices(tmp_path) == ["empty", "full"]
+    assert open_index(tmp_path, "empty")["info"]["count"] == 0
+    assert list_index_paths(tmp_path, "full") == ["a", "b"]
+    assert (tmp_path / "broken.pkl").exists()
+    assert (tmp_path / "empty.pkl.migrated").exists()
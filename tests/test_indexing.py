@@ -0,0 +1,56 @@
+import numpy as np
+
+from src.index_store import IndexWriter, list_index_paths, open_index
+from src.indexing import index_documents, prefetch
+
+CONFIG = {"chunk_size": 20, "chunk_overlap": 0, "code_aware_chunking": False, "dedup_documents": False}
+
+
+class FakeEmbeddingClient:
+    model = "fake"
+    batch_size = 2
+    concurrency = 1
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+
+    def embed(self, texts):
+        if self.fail_on and any(self.fail_on in text for text in texts):
+            raise RuntimeError("embedding failed")
+        return np.array([[len(text), sum(map(ord, text)) % 97, 1.0] for text in texts], dtype=np.float32)
+
+
+def long_document(name, tail=""):
+    return " ".join(f"{name} word{i}" for i in range(60)) + tail
+
+
+def test_failed_document_is_removed_completely(tmp_path):
+    data = {"ok": long_document("ok"), "bad": long_document("bad", " POISON"), "after": long_document("after")}
+    with IndexWriter(tmp_path, "i") as writer:
+        stats = index_documents(writer, data, FakeEmbeddingClient(fail_on="POISON"), CONFIG)
+    # The failing batch may hold the first chunks of the next document too.
+    assert "bad" in stats["failed"]
+    assert list_index_paths(tmp_path, "i") == sorted(set(data) - set(stats["failed"]))
+    collection = open_index(tmp_path, "i")
+    live = [
+        meta["path"] for segment in collection["segments"] for row, meta in enumerate(segment["metadata"])
+        if segment["deleted"] is None or not segment["deleted"][row]
+    ]
+    assert not set(live) & set(stats["failed"])
+    assert collection["info"]["count"] == len(live)
+
+
+def test_prefetch_reraises_producer_errors():
+    def produce():
+        yield 1
+        raise ValueError("boom")
+
+    items = []
+    try:
+        for item in prefetch(produce()):
+            items.append(item)
+    except ValueError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("the error was swallowed")
+    assert items == [1]
@@ -0,0 +1,241 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+import src.jobs as jobs
+from src.index_store import has_staged, index_path, list_index_paths, open_index, read_manifest
+from src.jobs import JobRunner, JobStore, register_job_kind
+
+CONFIG = {
+    "chunk_size": 50, "chunk_overlap": 5, "embedding_batch_size": 4, "embedding_cache_mb": 1,
+    "compaction_max_segments": 100, "compaction_max_deleted_ratio": 1.0, "job_checkpoint_seconds": 0,
+    "ann_backend": "brute",
+}
+
+
+class FakeEmbeddingClient:
+    model = "fake"
+    batch_size = 4
+    concurrency = 1
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+
+    def embed(self, texts):
+        if self.fail_on and any(self.fail_on in text for text in texts):
+            raise RuntimeError("embedding failed")
+        return np.array([[len(text), sum(map(ord, text)) % 97, 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    client = FakeEmbeddingClient()
+    monkeypatch.setattr(jobs, "get_embedding_client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(jobs, "get_embedding_cache", lambda *args, **kwargs: None)
+    store = JobStore(str(tmp_path / "jobs.db"))
+    return store
+
+
+def documents(names):
+    return [(name, f"document {name} " + " ".join(f"{name}{i}" for i in range(30))) for name in names]
+
+
+def register(kind, docs, append, fail_after=None):
+    def plan(job, done):
+        def generate():
+            for i, (path, text) in enumerate(docs):
+                if fail_after is not None and i == fail_after:
+                    raise RuntimeError("source went away")
+                if path not in done:
+                    yield path, text
+        return {"documents": generate(), "total": len(docs), "append": append, "info": {"kind": kind}}
+    register_job_kind(kind, plan)
+
+
+def run(store, tmp_path, kind):
+    store.submit(kind, "idx", {"index_dir": str(tmp_path), "embedding_model": "fake", "config": CONFIG})
+    job = store.claim()
+    JobRunner(store)._run(job)
+    return job["id"]
+
+
+def test_rebuild_replaces_index_when_done(store, tmp_path):
+    register("seed", documents(["old1", "old2"]), append=False)
+    run(store, tmp_path, "seed")
+    register("rebuild", documents(["new1", "new2", "new3"]), append=False)
+    job_id = run(store, tmp_path, "rebuild")
+    assert store.get(job_id)["status"] == "done"
+    assert store.get(job_id)["checkpoints"] >= 2
+    assert list_index_paths(tmp_path, "idx") == ["new1", "new2", "new3"]
+    assert open_index(tmp_path, "idx")["info"]["kind"] == "rebuild"
+    assert not has_staged(tmp_path, "idx")
+
+
+def test_failed_rebuild_keeps_old_index_and_resumes(store, tmp_path):
+    register("seed", documents(["old1", "old2"]), append=False)
+    run(store, tmp_path, "seed")
+    register("rebuild", documents(["new1", "new2", "new3"]), append=False, fail_after=2)
+    with pytest.raises(RuntimeError):
+        run(store, tmp_path, "rebuild")
+    # The checkpoints of the failed rebuild are staged, not live.
+    assert list_index_paths(tmp_path, "idx") == ["old1", "old2"]
+    assert has_staged(tmp_path, "idx")
+
+    job_id = store.list()[0]["id"]
+    assert store.done_paths(job_id) == {"new1", "new2"}
+    register("rebuild", documents(["new1", "new2", "new3"]), append=False)
+    store.update(job_id, status="queued")
+    JobRunner(store)._run(store.claim())
+    assert list_index_paths(tmp_path, "idx") == ["new1", "new2", "new3"]
+
+
+def test_resumed_job_still_finds_duplicates_of_earlier_checkpoints(store, tmp_path):
+    docs = documents(["a", "b"])
+    copy = [("copy-of-a", docs[0][1])]
+    register("dups", docs + copy, append=True, fail_after=2)
+    with pytest.raises(RuntimeError):
+        run(store, tmp_path, "dups")
+    job_id = store.list()[0]["id"]
+    assert store.done_paths(job_id) == {"a", "b"}
+
+    register("dups", docs + copy, append=True)
+    store.update(job_id, status="queued")
+    JobRunner(store)._run(store.claim())
+    assert store.get(job_id)["duplicates"] == 1
+    assert read_manifest(index_path(tmp_path, "idx"))["aliases"] == {"copy-of-a": "a"}
+    assert not os.path.exists(store.dedup_path(job_id))
+
+
+def test_incremental_job_appends(store, tmp_path):
+    register("seed", documents(["a", "b"]), append=False)
+    run(store, tmp_path, "seed")
+    register("more", documents(["c"]), append=True)
+    run(store, tmp_path, "more")
+    assert list_index_paths(tmp_path, "idx") == ["a", "b", "c"]
+
+
+def test_requeue_interrupted(store):
+    running = store.submit("seed", "idx", {})
+    cancelling = store.submit("seed", "idx", {})
+    store.claim()
+    store.claim()
+    store.cancel(cancelling)
+    store.requeue_interrupted()
+    assert store.status(running) == "queued"
+    assert store.status(cancelling) == "cancelled"
+
+
+def test_messages_keep_tables(store, tmp_path):
+    table = {"Files": ["Scanned", "Indexed"], "Count": [3, 2]}
+
+    def plan(job, done):
+        return {
+            "documents": iter(documents(["a"])), "total": 1, "append": False, "info": {},
+            "messages": lambda: ["Commit abc: scanned 3 files.", table],
+        }
+    register_job_kind("report", plan)
+    job_id = run(store, tmp_path, "report")
+    assert store.get(job_id)["messages"] == ["Commit abc: scanned 3 files.", table]
+
+
+def test_cancel_and_retry_transitions(store):
+    queued = store.submit("seed", "idx", {})
+    store.cancel(queued)
+    assert store.status(queued) == "cancelled"
+    store.retry(queued)
+    assert store.status(queued) == "queued"
+    assert store.claim()["id"] == queued
+    store.cancel(queued)
+    assert store.status(queued) == "cancelling"
+    # Only failed or cancelled jobs can be retried.
+    store.retry(queued)
+    assert store.status(queued) == "cancelling"
+
+
+def test_cancelled_job_resumes_after_its_last_checkpoint(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "_PROGRESS_INTERVAL", 0)
+    docs = documents(["a", "b", "c", "d"])
+    seen, cancelled = [], []
+
+    def plan(job, done):
+        def generate():
+            for path, text in docs:
+                if path in done:
+                    continue
+                seen.append(path)
+                if path == "c" and not cancelled:
+                    cancelled.append(path)
+                    store.cancel(job["id"])
+                yield path, text
+        return {"documents": generate(), "total": len(docs), "append": True, "info": {}}
+    register_job_kind("cancel", plan)
+
+    with pytest.raises(jobs.JobCancelled):
+        run(store, tmp_path, "cancel")
+    job_id = store.list()[0]["id"]
+    done = store.done_paths(job_id)
+    assert done and "d" not in done
+    assert set(list_index_paths(tmp_path, "idx")) == done
+
+    store.update(job_id, status="cancelled")
+    store.retry(job_id)
+    seen.clear()
+    JobRunner(store)._run(store.claim())
+    assert not set(seen) & done
+    assert store.get(job_id)["status"] == "done"
+    assert list_index_paths(tmp_path, "idx") == ["a", "b", "c", "d"]
+
+
+def test_submit_resizes_a_runner_started_with_the_default(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "_runners", {})
+    path = str(tmp_path / "runner.db")
+    jobs.get_job_store(path)
+    runner = jobs._runners[path]
+    assert runner.max_concurrent == 1
+    register("noop", [], append=True)
+    config = {**CONFIG, "jobs_max_concurrent": 2}
+    job_id = jobs.submit_job("noop", "idx", {"index_dir": str(tmp_path), "embedding_model": "fake", "config": config}, path=path)
+    assert runner.max_concurrent == 2
+    assert runner.workers == 2
+    runner.resize(1)
+    deadline = time.monotonic() + 10
+    while (runner.workers > 1 or runner.store.status(job_id) != "done") and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert runner.workers == 1
+    assert runner.store.status(job_id) == "done"
+
+
+class FakeEmbeddingCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, model, text):
+        return self.entries.get((model, text))
+
+    def set(self, model, text, embedding):
+        self.entries[(model, text)] = embedding
+
+
+def test_jobs_count_embedding_cache_hits(store, tmp_path, monkeypatch):
+    cache = FakeEmbeddingCache()
+    monkeypatch.setattr(jobs, "get_embedding_cache", lambda *args, **kwargs: cache)
+    register("cached", documents(["a", "b"]), append=False)
+    first = store.get(run(store, tmp_path, "cached"))
+    assert first["cache_hits"] == 0 and first["cache_misses"] == first["chunks"] > 0
+    second = store.get(run(store, tmp_path, "cached"))
+    assert second["cache_hits"] == second["chunks"] and second["cache_misses"] == 0
+    assert f"Embedding cache: {second['chunks']} hits, 0 misses." in second["messages"]
+
+
+def test_old_job_stores_gain_the_new_columns(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY, kind TEXT, index_name TEXT, params TEXT, "
+                     "state TEXT DEFAULT '{}', status TEXT DEFAULT 'queued', messages TEXT DEFAULT '[]', created_at REAL)")
+    store = JobStore(path)
+    job_id = store.submit("seed", "idx", {})
+    assert store.get(job_id)["cache_hits"] == 0
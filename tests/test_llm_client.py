@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from src.llm_client import LLMClient, iter_ndjson  # noqa: E402
+
+OBJECTS = [{"response": "Hé", "done": False}, {"response": "llo ✓", "done": False}, {"done": True}]
+STREAM = b"".join(json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n" for obj in OBJECTS)
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, len(STREAM)])
+def test_chunks_split_anywhere(size):
+    # One-byte chunks also split multi-byte UTF-8 characters.
+    chunks = [STREAM[i:i + size] for i in range(0, len(STREAM), size)]
+    assert list(iter_ndjson(chunks)) == OBJECTS
+
+
+def test_blank_lines_and_missing_final_newline():
+    chunks = [b'\n{"a": 1}\n\n', b'  \n{"b"', b': 2}']
+    assert list(iter_ndjson(chunks)) == [{"a": 1}, {"b": 2}]
+
+
+def test_lines_are_decoded_as_they_complete():
+    def chunks():
+        yield b'{"a": 1}\n{"b":'
+        raise AssertionError("read past the first complete line")
+
+    assert next(iter_ndjson(chunks())) == {"a": 1}
+
+
+class SlowStream:
+    """Local stub of /api/generate that sends two pieces, then one every 0.1 s for 30 s."""
+
+    def __init__(self):
+        import http.server
+
+        stub = self
+        self.disconnected = threading.Event()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # chunked, like Ollama
+
+            def send_line(self, data):
+                line = json.dumps(data).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for piece in ("Hello", " world"):
+                        self.send_line({"response": piece, "done": False})
+                    for _ in range(300):
+                        time.sleep(0.1)
+                        self.send_line({"response": ".", "done": False})
+                except OSError:
+                    stub.disconnected.set()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def slow_stream():
+    stub = SlowStream()
+    yield stub
+    stub.close()
+
+
+def test_cancel_stops_the_stream_and_keeps_the_partial_text(slow_stream):
+    generation = LLMClient(slow_stream.url).generate_stream("model", "prompt")
+    pieces, errors = [], []
+    first_pieces = threading.Event()
+
+    def read():
+        try:
+            for piece in generation:
+                pieces.append(piece)
+                if len(pieces) == 2:
+                    first_pieces.set()
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    assert first_pieces.wait(5)
+    started = time.monotonic()
+    generation.cancel()
+    reader.join(5)
+    assert not reader.is_alive()
+    # The reader was blocked on the socket; cancelling woke it at once.
+    assert time.monotonic() - started < 2
+    assert errors == []
+    assert generation.cancelled and not generation.done
+    assert generation.text.startswith("Hello world")
+    assert generation.text == "".join(pieces)
+    # The server sees the connection go away, which is what makes Ollama stop decoding.
+    assert slow_stream.disconnected.wait(5)
+    generation.cancel()  # a second cancel is harmless
+
+
+def test_cancel_before_iterating_sends_nothing(slow_stream):
+    generation = LLMClient(slow_stream.url).generate_stream("model", "prompt")
+    generation.cancel()
+    assert list(generation) == []
+    assert generation.text == ""
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.index_store import IndexWriter, open_index
+from src.quantization import build_quantized, load_quantized
+from src.retrieval import search
+
+
+def clustered(rng, rows=2000, dim=32, clusters=40):
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=rows)] + 0.3 * rng.normal(size=(rows, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.mark.parametrize("kind, min_correlation", [("float16", 0.999), ("int8", 0.99), ("pq", 0.8)])
+def test_code_scores_track_exact_scores(kind, min_correlation, tmp_path, rng):
+    embeddings = clustered(rng)
+    info = build_quantized(embeddings, str(tmp_path), {"embedding_quantization": kind, "pq_subvector_dim": 4})
+    codes = load_quantized(str(tmp_path), {"quantization": info})
+    assert len(codes) == len(embeddings)
+    query = embeddings[7]
+    assert np.corrcoef(codes.scores(query), embeddings @ query)[0, 1] >= min_correlation
+
+
+def test_none_keeps_full_precision_only(tmp_path, rng):
+    assert build_quantized(clustered(rng, rows=10), str(tmp_path), {"embedding_quantization": "none"}) is None
+
+
+@pytest.mark.parametrize("kind", ["float16", "int8", "pq"])
+def test_rescored_search_recall(kind, tmp_path, rng):
+    embeddings = clustered(rng)
+    config = {"ann_backend": "brute", "embedding_quantization": kind, "pq_subvector_dim": 4}
+    with IndexWriter(tmp_path, "q", ann_config=config) as writer:
+        writer.add_batch(embeddings, [f"doc {i}" for i in range(len(embeddings))],
+                         [{"path": f"p{i}"} for i in range(len(embeddings))])
+    collection = open_index(tmp_path, "q")
+    assert collection["segments"][0]["quantized"] is not None
+    recalls = []
+    for query in clustered(rng, rows=20):
+        exact = set(np.argsort(-(embeddings @ query))[:10].tolist())
+        hits = search(collection, query, 10, rescore_factor=8)
+        recalls.append(len(exact & {hit["row"] for hit in hits}) / 10)
+        scores = [hit["score"] for hit in hits]
+        # Scores of the returned rows are exact, not approximations.
+        assert np.allclose(scores, [float(embeddings[hit["row"]] @ query) for hit in hits], atol=1e-5)
+    assert np.mean(recalls) >= 0.95
+
+
+def test_pq_builds_next_to_pymupdf(tmp_path, rng):
+    pytest.importorskip("faiss")
+    pytest.importorskip("pymupdf")
+    info = build_quantized(clustered(rng, rows=300), str(tmp_path), {"embedding_quantization": "pq"})
+    assert load_quantized(str(tmp_path), {"quantization": info}).params.shape == (4, 256, 8)
@@ -0,0 +1,55 @@
+from src.repo_filters import IgnoreRules, RepoFilter, is_binary, is_minified, parse_patterns
+
+
+def rules(*lines, base=""):
+    ignore = IgnoreRules()
+    ignore.add(lines, base)
+    return ignore
+
+
+def test_gitignore_patterns():
+    ignore = rules("*.log", "/build/", "docs/**/draft.md", "cache/", "!keep.log")
+    assert ignore.ignored("a/b/debug.log")
+    assert not ignore.ignored("a/b/keep.log")
+    assert ignore.ignored("build/out.js")
+    assert not ignore.ignored("src/build/out.js")
+    assert ignore.ignored("docs/draft.md")
+    assert ignore.ignored("docs/a/b/draft.md")
+    assert ignore.ignored("x/cache/file.py")
+    assert not ignore.ignored("x/cache.py")
+
+
+def test_nested_gitignore_applies_below_its_directory():
+    ignore = rules("*.tmp", base="pkg")
+    assert ignore.ignored("pkg/a.tmp")
+    assert not ignore.ignored("other/a.tmp")
+
+
+def test_parse_patterns_accepts_commas_and_newlines():
+    assert parse_patterns("a/, *.min.js\n\nvendor/ ,") == ["a/", "*.min.js", "vendor/"]
+
+
+def test_repo_filter_counts_every_decision():
+    repo_filter = RepoFilter([".py", ".js"], excludes=["vendor/"], max_file_bytes=100, gitignore=rules("gen_*.py"))
+    assert repo_filter.check_entry("README", 10) == "extension"
+    assert repo_filter.check_entry("image.png", 10) == "extension"
+    assert repo_filter.check_entry("vendor/lib.js", 10) == "excluded"
+    assert repo_filter.check_entry("gen_api.py", 10) == "gitignore"
+    assert repo_filter.check_entry("big.py", 101) == "too_large"
+    assert repo_filter.check_entry("partial.py", None) == "too_large"
+    assert repo_filter.check_entry("ok.py", 100) is None
+    assert repo_filter.check_content(b"x = 1\x00") == ("binary", None)
+    assert repo_filter.check_content(b"print('hi')\n") == (None, "print('hi')\n")
+    report = repo_filter.report
+    assert report["scanned"] == 7
+    assert report["indexed"] == 1
+    assert report["skipped"]["extension"] == 2
+    assert report["skipped"]["too_large"] == 2
+    assert report["skipped"]["binary"] == 1
+
+
+def test_binary_and_minified_heuristics():
+    assert is_binary(b"abc\x00def")
+    assert not is_binary(b"abc" * 10000 + b"\x00")
+    assert is_minified("var a=1;" * 500)
+    assert not is_minified("x = 1\n" * 500)
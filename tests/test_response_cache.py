@@ -0,0 +1,87 @@
+import pytest
+
+pytest.importorskip("diskcache")
+
+from src.response_cache import ResponseCache, generate_cached, replay  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"), threshold=0.9)
+    yield cache
+    cache.close()
+
+
+def test_exact_hit(cache):
+    cache.set("m", {"num_ctx": 2048}, "prompt", "answer")
+    assert cache.get("m", {"num_ctx": 2048}, "prompt") == "answer"
+    assert cache.get("m", {"num_ctx": 4096}, "prompt") is None
+
+
+def test_keys_cover_the_whole_request(cache):
+    cache.set("m", {"temperature": 0.2, "seed": 1}, "prompt", "answer", fields={"system": "Be brief."})
+    assert cache.get("m", {"seed": 1, "temperature": 0.2, "top_k": None}, "prompt", fields={"system": "Be brief."}) == "answer"
+    assert cache.get("m", {"temperature": 0.2, "seed": 2}, "prompt", fields={"system": "Be brief."}) is None
+    assert cache.get("m", {"temperature": 0.8, "seed": 1}, "prompt", fields={"system": "Be brief."}) is None
+    assert cache.get("m", {"temperature": 0.2, "seed": 1}, "prompt", fields={"system": "Be thorough."}) is None
+    assert cache.get("m", {"temperature": 0.2, "seed": 1}, "prompt") is None
+
+
+def test_semantic_hit_needs_the_same_context(cache):
+    cache.set("m", None, "q1 over ctx", "answer", context="ctx", query_embedding=[1.0, 0.0])
+    assert cache.get("m", None, "q2 over ctx", context="ctx", query_embedding=[0.99, 0.05]) == "answer"
+    assert cache.get("m", None, "q2 over other", context="other", query_embedding=[0.99, 0.05]) is None
+    assert cache.get("m", None, "q3 over ctx", context="ctx", query_embedding=[0.0, 1.0]) is None
+
+
+def test_no_semantic_scope_without_context(cache):
+    cache.set("m", None, "What is Rust?", "a language", context="", query_embedding=[1.0, 0.0])
+    assert cache.get("m", None, "What is rust used for?", context="", query_embedding=[1.0, 0.0]) is None
+    assert cache.get("m", None, "What is Rust?", context="", query_embedding=[1.0, 0.0]) == "a language"
+
+
+def test_replay_keeps_the_text():
+    text = "  Hello,  world!\nSecond line. "
+    assert "".join(replay(text)) == text
+
+
+class FakeGeneration:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.text = "".join(pieces)
+        self.done = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        yield from self.pieces
+        self.done = True
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_stream(self, model, prompt, options=None, **fields):
+        self.calls += 1
+        return FakeGeneration(["an ", "answer"])
+
+
+def test_generate_cached_stores_complete_answers(cache):
+    client = FakeClient()
+    assert "".join(generate_cached(client, "m", "p", cache)) == "an answer"
+    assert "".join(generate_cached(client, "m", "p", cache)) == "an answer"
+    assert client.calls == 1
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_generate_cached_keys_on_request_fields(cache):
+    client = FakeClient()
+    "".join(generate_cached(client, "m", "p", cache, images=["a.png"]))
+    "".join(generate_cached(client, "m", "p", cache, images=["b.png"]))
+    "".join(generate_cached(client, "m", "p", cache, images=["a.png"]))
+    assert client.calls == 2
@@ -0,0 +1,79 @@
+import numpy as np
+
+from src.bm25 import BM25Builder, BM25Index, tokenize
+from src.index_store import IndexWriter, delete_documents, open_index
+from src.retrieval import search, top_k_indices
+
+DOCUMENTS = [
+    "def parse_config(path): read the settings file",
+    "class HttpCache stores etags for revalidation",
+    "the quick brown fox jumps over the lazy dog",
+    "getUserName returns the current user name",
+    "bananas and apples are fruit",
+]
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("getUserName") == ["getusername", "get", "user", "name"]
+    assert tokenize("parse_config HTTPServer v2") == [
+        "parse_config", "parse", "config", "httpserver", "http", "server", "v2", "v", "2",
+    ]
+
+
+def test_bm25_ranks_matching_rows(tmp_path):
+    builder = BM25Builder()
+    builder.add(DOCUMENTS)
+    builder.save(str(tmp_path))
+    index = BM25Index(str(tmp_path))
+    rows, scores = index.search("user name", 3)
+    assert rows.tolist() == [3]
+    assert scores[0] > 0
+    rows, _ = index.search("the", 5)
+    assert set(rows.tolist()) == {0, 2, 3}
+    deleted = np.zeros(len(DOCUMENTS), dtype=bool)
+    deleted[3] = True
+    assert index.search("user name", 3, deleted)[0].tolist() == []
+
+
+def test_top_k_indices_orders_by_score():
+    scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+    assert top_k_indices(scores, 2).tolist() == [1, 3]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 0]
+
+
+def write_documents(tmp_path, rng):
+    embeddings = rng.normal(size=(len(DOCUMENTS), 8)).astype(np.float32)
+    with IndexWriter(tmp_path, "h", ann_config={"ann_backend": "brute"}) as writer:
+        writer.add_batch(embeddings, DOCUMENTS, [{"path": f"doc{i}"} for i in range(len(DOCUMENTS))])
+    return embeddings
+
+
+def test_hybrid_search_fuses_lexical_and_vector_ranks(tmp_path, rng):
+    embeddings = write_documents(tmp_path, rng)
+    collection = open_index(tmp_path, "h")
+    # The query embedding points at the fruit row, the text at the user row.
+    hits = search(collection, embeddings[4], 2, query_text="getUserName", rrf_k=60)
+    assert {hit["row"] for hit in hits} == {3, 4}
+    by_row = {hit["row"]: hit for hit in hits}
+    assert "lexical_score" in by_row[3]
+    assert by_row[4]["vector_score"] > 0.99
+    # Each list contributes 1 / (k + rank); a row first in both wins outright.
+    hits = search(collection, embeddings[3], 2, query_text="getUserName", rrf_k=60)
+    assert hits[0]["row"] == 3
+    assert np.isclose(hits[0]["score"], 2 / 61)
+
+
+def test_vector_search_only_without_text(tmp_path, rng):
+    embeddings = write_documents(tmp_path, rng)
+    hits = search(open_index(tmp_path, "h"), embeddings[1], 1)
+    assert hits[0]["row"] == 1
+    assert np.isclose(hits[0]["score"], 1.0, atol=1e-5)
+    assert "lexical_score" not in hits[0]
+
+
+def test_search_skips_deleted_rows(tmp_path, rng):
+    embeddings = write_documents(tmp_path, rng)
+    delete_documents(tmp_path, "h", ["doc3"])
+    hits = search(open_index(tmp_path, "h"), embeddings[3], 5, query_text="user name")
+    assert 3 not in {hit["row"] for hit in hits}
+    assert len(hits) == 4
@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("streamlit")
+
+from src import settings  # noqa: E402
+
+
+def test_config_round_trip_keeps_multiline_values(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CONFIG_FILE", str(tmp_path / "config.py"))
+    config = settings.load_config()
+    config["repo_exclude_patterns"] = "vendor/\n*.min.js\n# not a comment"
+    config["api_token"] = 'quote " and backslash \\'
+    config["temperature"] = 0.3
+    settings.save_config(config)
+    loaded = settings.load_config()
+    assert loaded["repo_exclude_patterns"] == config["repo_exclude_patterns"]
+    assert loaded["api_token"] == config["api_token"]
+    assert loaded["temperature"] == 0.3
+
+
+def test_config_written_by_older_versions_still_loads(tmp_path, monkeypatch):
+    path = tmp_path / "config.py"
+    path.write_text('# Configuration\n\nllm_model = "llama"\nrepo_exclude_patterns = "vendor/\nbuild/"\nchunk_size = 200\n')
+    monkeypatch.setattr(settings, "CONFIG_FILE", str(path))
+    config = settings.load_config()
+    assert config["llm_model"] == "llama"
+    assert config["chunk_size"] == 200